@@ -1,25 +1,33 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, render_template, jsonify, request, send_from_directory, send_file
+from flask_socketio import SocketIO
 from src.core.benchmark_runner import BenchmarkRunner
+from src.core.job_manager import JobManager
 from src.core.logger import get_logger
+from src.core.load_engine import CLOSED_LOOP, OPEN_LOOP
+from src.core import result_store
+from src.core.catalog import get_catalog
+from src.core.scenario import ScenarioError, list_scenarios, load_scenario
+from src.core.compare import compare_runs, render_chart
+import io
 import os
 import json
-import asyncio
 from src.core.config import settings
 from datetime import datetime
 import requests
 from statistics import mean
 import time
+import yaml
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key'
 
+# Threading mode so the job manager's event-loop thread can emit progress
+socketio = SocketIO(app, async_mode="threading")
+
 benchmark_runner = BenchmarkRunner()
+job_manager = JobManager(benchmark_runner, publish=lambda event, payload: socketio.emit(event, payload))
 logger = get_logger(__name__)
 
-# Create event loop for async operations
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
-
 @app.route('/')
 def index():
     """Render main dashboard"""
@@ -45,7 +53,7 @@ def get_logs():
 
 @app.route('/api/benchmark/run', methods=['POST'])
 def run_benchmark():
-    """Start a new benchmark test"""
+    """Queue a new benchmark test and return its job id immediately"""
     try:
         data = request.get_json()
         
@@ -53,11 +61,28 @@ def run_benchmark():
         try:
             num_requests = int(data.get("num_requests", 0))
             concurrent_requests = int(data.get("concurrent_requests", 0))
+            arrival_rate = float(data["arrival_rate"]) if data.get("arrival_rate") else None
         except (ValueError, TypeError):
-            return jsonify({"error": "num_requests and concurrent_requests must be valid integers"}), 400
+            return jsonify({"error": "num_requests, concurrent_requests and arrival_rate must be valid numbers"}), 400
 
-        # Validate required fields
-        if not all([data.get("test_type"), num_requests, concurrent_requests, data.get("base_url")]):
+        mode = data.get("mode", CLOSED_LOOP)
+        if mode not in (CLOSED_LOOP, OPEN_LOOP):
+            return jsonify({"error": f"mode must be '{CLOSED_LOOP}' or '{OPEN_LOOP}'"}), 400
+        if mode == OPEN_LOOP and not arrival_rate:
+            return jsonify({"error": "arrival_rate is required for open-loop tests"}), 400
+
+        # Validate required fields; scenarios size themselves from their stages
+        scenario = data.get("scenario") or None
+        scenario_yaml = data.get("scenario_yaml") or None
+        if data.get("test_type") == "scenario":
+            # A bundled scenario by name, or an explicit YAML definition
+            if not data.get("base_url") or not (scenario or scenario_yaml):
+                return jsonify({"error": "Missing required fields"}), 400
+            try:
+                load_scenario(scenario, scenario_yaml)
+            except (ScenarioError, yaml.YAMLError) as e:
+                return jsonify({"error": f"Invalid scenario: {str(e)}"}), 400
+        elif not all([data.get("test_type"), num_requests, concurrent_requests, data.get("base_url")]):
             return jsonify({"error": "Missing required fields"}), 400
 
         # For login/decrypt tests, get the most recent register test results
@@ -65,41 +90,34 @@ def run_benchmark():
         if data["test_type"] == "login":
             register_result = benchmark_runner.get_most_recent_test_result("register")
             if register_result:
-                previous_test_file = os.path.join(settings.RESULTS_DIR, f"{register_result['test_id']}.json")
+                previous_test_file = result_store.summary_path(register_result['test_id'])
             else:
                 return jsonify({"error": "No register test results found. Please run register test first."}), 400
         elif data["test_type"] == "decrypt":
             login_result = benchmark_runner.get_most_recent_test_result("login")
             if login_result:
-                previous_test_file = os.path.join(settings.RESULTS_DIR, f"{login_result['test_id']}.json")
+                previous_test_file = result_store.summary_path(login_result['test_id'])
             else:
                 return jsonify({"error": "No login test results found. Please run login test first."}), 400
         
-        # Run the benchmark
-        result = loop.run_until_complete(
-            benchmark_runner.run_test(
-                test_type=data["test_type"],
-                num_requests=num_requests,
-                concurrent_requests=concurrent_requests,
-                base_url=data["base_url"],
-                previous_test_file=previous_test_file
-            )
-        )
-
-        if not result or "test_id" not in result:
-            return jsonify({"error": "Invalid test result"}), 500
-
-        response = {
-            "message": "Benchmark completed" if result.get("status") == "completed" else "Benchmark failed",
-            "test_id": result["test_id"],
-            "status": result.get("status", "unknown")
-        }
-
-        if result.get("status") == "failed":
-            response["error"] = result.get("error", "Unknown error")
-            return jsonify(response), 500
+        job = job_manager.submit({
+            "test_type": data["test_type"],
+            "num_requests": num_requests,
+            "concurrent_requests": concurrent_requests,
+            "base_url": data["base_url"],
+            "previous_test_file": previous_test_file,
+            "mode": mode,
+            "arrival_rate": arrival_rate,
+            "keep_responses": bool(data.get("keep_responses", False)),
+            "scenario": scenario,
+            "scenario_yaml": scenario_yaml
+        })
 
-        return jsonify(response)
+        return jsonify({
+            "message": "Benchmark queued",
+            "job_id": job.job_id,
+            "status": job.status
+        }), 202
 
     except Exception as e:
         logger.error(f"Failed to run benchmark: {str(e)}")
@@ -109,41 +127,87 @@ def run_benchmark():
             "status": "failed"
         }), 500
 
+@app.route('/api/benchmark/jobs')
+def list_jobs():
+    """List submitted benchmark jobs with their live progress"""
+    return jsonify(job_manager.list_jobs())
+
+@app.route('/api/benchmark/jobs/<job_id>')
+def get_job_status(job_id):
+    """Get status and progress of a submitted benchmark job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/benchmark/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running benchmark job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if not job_manager.cancel(job_id):
+        return jsonify({"error": f"Job is already {job.status}"}), 409
+    return jsonify({"message": "Cancellation requested", "job_id": job_id})
+
+@app.route('/api/scenarios')
+def get_scenarios():
+    """Scenario files available to run by name"""
+    return jsonify(list_scenarios())
+
 @app.route('/api/benchmark/history')
 def get_history():
     """Get history of all benchmark tests"""
     try:
+        limit = request.args.get("limit", 100, type=int)
+        offset = request.args.get("offset", 0, type=int)
+
         results = []
-        for filename in os.listdir(settings.RESULTS_DIR):
-            if filename.endswith('.json'):
-                with open(os.path.join(settings.RESULTS_DIR, filename), 'r') as f:
-                    test_result = json.load(f)
-                    
-                    if test_result["test_type"] == "register":
-                            test_result["test_type"] = "encrypt"
-                    
-                    try:              
-                            
-                        results.append({
-                                "test_id": test_result["test_id"],
-                                "timestamp": test_result["start_time"].split('T')[0],
-                                "test_type": test_result["test_type"],
-                                "num_requests": test_result["total_requests"],
-                                "successful_requests": test_result.get("successful_requests", 0),
-                                "failed_requests": test_result.get("failed_requests", 0),
-                                "avg_duration": test_result.get("avg_duration", 0),
-                                "requests_per_second": test_result.get("requests_per_second", 0)
-                            })
-                        
-                        
-                    except Exception as e:
-                        pass
+        for run in get_catalog().history_page(limit=limit, offset=offset):
+            results.append({
+                "test_id": run["test_id"],
+                "timestamp": run["start_time"].split('T')[0],
+                "test_type": "encrypt" if run["test_type"] == "register" else run["test_type"],
+                "num_requests": run["total_requests"],
+                "successful_requests": run["successful_requests"] or 0,
+                "failed_requests": run["failed_requests"] or 0,
+                "avg_duration": run["avg_duration"] or 0,
+                "percentiles": {"p50": run["p50"], "p90": run["p90"], "p99": run["p99"], "p99.9": run["p999"]},
+                "requests_per_second": run["requests_per_second"] or 0
+            })
 
-        return jsonify(sorted(results, key=lambda x: x["timestamp"], reverse=True))
+        return jsonify(results)
     except Exception as e:
         logger.error(f"Failed to get history: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/benchmark/compare', methods=['POST'])
+def compare_benchmarks():
+    """Compare stored runs against a baseline; ?format=png returns the chart"""
+    data = request.json or {}
+    candidates = data.get("candidates") or []
+    if not data.get("baseline") or not candidates:
+        return jsonify({"error": "baseline and candidates are required"}), 400
+    if any(os.sep in run for run in [data["baseline"], *candidates]):
+        return jsonify({"error": "Runs are referenced by test id"}), 400
+
+    try:
+        report = compare_runs(
+            data["baseline"], candidates,
+            threshold=data.get("threshold"), alpha=data.get("alpha")
+        )
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if request.args.get("format") == "png":
+        chart = io.BytesIO()
+        render_chart(report, chart)
+        chart.seek(0)
+        return send_file(chart, mimetype="image/png")
+    return jsonify(report)
+
 @app.route('/api/benchmark/result/<test_id>')
 def get_test_result(test_id):
     """Get detailed results for a specific test"""
@@ -160,9 +224,11 @@ def get_test_result(test_id):
             if os.path.exists(result_file):
                 with open(result_file, 'r') as f:
                     test_result = json.load(f)
-                    if test_result["test_type"] == "register":
-                        test_result["test_type"] = "encrypt"
-                    return jsonify(test_result)
+                if "detailed_results" not in test_result:
+                    test_result["detailed_results"] = result_store.load_detailed_results(test_result["test_id"])
+                if test_result["test_type"] == "register":
+                    test_result["test_type"] = "encrypt"
+                return jsonify(test_result)
 
         return jsonify({"error": "Test result not found"}), 404
     except Exception as e:
@@ -174,7 +240,7 @@ def get_metrics():
     """Get combined metrics for encrypt/decrypt operations"""
     try:
         # Test server latency (ping)
-        target_server = "http://13.212.32.5:8000"  # Hardcoded server
+        target_server = settings.PING_TARGET
         ping_times = []
         for _ in range(3):  # Take average of 3 pings
             start = time.time()
@@ -185,65 +251,24 @@ def get_metrics():
                 ping_times.append(0)
         avg_ping = mean(ping_times) if any(ping_times) else 0
 
-        # Get all test results
-        encrypt_tests = []
-        decrypt_tests = []
-        
-        for filename in os.listdir(settings.RESULTS_DIR):
-            if not filename.endswith('.json'):
-                continue
-                
-            with open(os.path.join(settings.RESULTS_DIR, filename), 'r') as f:
-                test = json.load(f)
-                if test["test_type"] == "register":  # This is encrypt
-                    encrypt_tests.append(test)
-                elif test["test_type"] == "decrypt":
-                    decrypt_tests.append(test)
-
-        # Calculate metrics
-        def calculate_test_metrics(tests):
-            if not tests:
-                return {
-                    "success_rate": 0,
-                    "avg_response_time": 0,
-                    "requests_per_second": 0,
-                    "total_requests": 0,
-                    "total_tests": 0,
-                    "test_durations": []  # For timeline graph
+        # Aggregates come from indexed catalog queries, not result files
+        def calculate_test_metrics(test_type):
+            catalog = get_catalog()
+            metrics = catalog.type_stats(test_type)
+            metrics["test_durations"] = [  # Last 10 tests, for timeline graph
+                {
+                    "name": run["test_id"],
+                    "duration": run["total_duration"] or 0,
+                    "requests": run["total_requests"],
+                    "timestamp": run["start_time"],
+                    "percentiles": {"p50": run["p50"], "p90": run["p90"], "p99": run["p99"], "p99.9": run["p999"]}
                 }
+                for run in catalog.last_n(test_type, 10)
+            ]
+            return metrics
 
-            success_rates = []
-            response_times = []
-            req_per_second = []
-            test_durations = []  # For timeline graph
-
-            for test in tests:
-                total = test.get("total_requests", 0)
-                success = test.get("successful_requests", 0)
-                if total > 0:
-                    success_rates.append((success / total) * 100)
-                response_times.append(test.get("avg_duration", 0))
-                req_per_second.append(test.get("requests_per_second", 0))
-                
-                # Add test duration data
-                test_durations.append({
-                    "name": test["test_id"],
-                    "duration": test.get("total_duration", 0),
-                    "requests": total,
-                    "timestamp": test["start_time"]
-                })
-
-            return {
-                "success_rate": mean(success_rates) if success_rates else 0,
-                "avg_response_time": mean(response_times) if response_times else 0,
-                "requests_per_second": mean(req_per_second) if req_per_second else 0,
-                "total_requests": sum(t.get("total_requests", 0) for t in tests),
-                "total_tests": len(tests),
-                "test_durations": sorted(test_durations, key=lambda x: x["timestamp"])[-10:]  # Last 10 tests
-            }
-
-        encrypt_metrics = calculate_test_metrics(encrypt_tests)
-        decrypt_metrics = calculate_test_metrics(decrypt_tests)
+        encrypt_metrics = calculate_test_metrics("register")
+        decrypt_metrics = calculate_test_metrics("decrypt")
 
         return jsonify({
             "server_latency": avg_ping,
@@ -256,9 +281,11 @@ def get_metrics():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(
+    socketio.run(
+        app,
         debug=True,
         host='0.0.0.0',
         port=5000,
-        use_reloader=True
+        use_reloader=False,  # The reloader would start a second job loop
+        allow_unsafe_werkzeug=True
     ) 
\ No newline at end of file
@@ -2,9 +2,12 @@ import asyncio
 from datetime import datetime
 from typing import Optional, Dict
 import os
-import json
+import uuid
 from src.core.logger import get_logger
 from src.core.config import settings
+from src.core.load_engine import CLOSED_LOOP
+from src.core import result_store
+from src.core.catalog import get_catalog
 
 logger = get_logger(__name__)
 
@@ -16,15 +19,25 @@ class BenchmarkRunner:
         if not os.path.exists(settings.RESULTS_DIR):
             os.makedirs(settings.RESULTS_DIR)
 
-    def generate_test_id(self, test_type: str) -> str:
+    def generate_test_id(self, test_type: str, suffix: str = None) -> str:
+        """<type>_<timestamp>_<suffix>. Jobs run concurrently, so the suffix
+        (the job id, or a random one) keeps ids of the same second apart."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return f"{test_type}_{timestamp}"
+        return f"{test_type}_{timestamp}_{suffix or uuid.uuid4().hex[:8]}"
 
     async def run_test(self, test_type: str, num_requests: int, concurrent_requests: int, 
-                      base_url: str, previous_test_file: str = None) -> Dict:
-        """Run a benchmark test"""
+                      base_url: str, previous_test_file: str = None,
+                      mode: str = CLOSED_LOOP, arrival_rate: float = None,
+                      test_id: str = None, progress=None, keep_responses: bool = False,
+                      scenario: str = None, scenario_yaml: str = None) -> Dict:
+        """Run a benchmark test on the asyncio load engine.
+
+        The summary is stored as <test_id>.json and per-request data in
+        columnar companion files (see result_store); full response bodies
+        are only written when keep_responses is set.
+        """
         # Generate test ID first
-        test_id = self.generate_test_id(test_type)
+        test_id = test_id or self.generate_test_id(test_type)
         self.current_test_id = test_id
         
         # Create initial test state
@@ -34,30 +47,38 @@ class BenchmarkRunner:
             "start_time": datetime.now().isoformat(),
             "total_requests": num_requests,
             "status": "running",
-            "base_url": base_url
+            "base_url": base_url,
+            "mode": mode,
+            "arrival_rate": arrival_rate,
+            "keep_responses": keep_responses
         }
 
-       
-        result_file = os.path.join(settings.RESULTS_DIR, f"{test_id}.json")
-
         try:
             # Save initial state
-            with open(result_file, 'w') as f:
-                json.dump(test_state, f, indent=2)
+            result_store.save_summary(test_state)
 
             
+            load_options = {"mode": mode, "arrival_rate": arrival_rate, "progress": progress}
             if test_type == "register":
                 from src.tests.register_test import run_register_test
-                results = await run_register_test(num_requests, concurrent_requests, base_url)
+                results = await run_register_test(num_requests, concurrent_requests, base_url, **load_options)
             elif test_type == "login":
                 from src.tests.login_test import run_login_test
-                results = await run_login_test(num_requests, concurrent_requests, base_url, previous_test_file)
+                results = await run_login_test(num_requests, concurrent_requests, base_url, previous_test_file, **load_options)
             elif test_type == "decrypt":
                 from src.tests.decrypt_test import run_decrypt_test
-                results = await run_decrypt_test(num_requests, concurrent_requests, base_url, previous_test_file)
+                results = await run_decrypt_test(num_requests, concurrent_requests, base_url, previous_test_file, **load_options)
+            elif test_type == "scenario":
+                from src.core.scenario import run_scenario_test
+                test_state["scenario"] = scenario or "inline"
+                results = await run_scenario_test(scenario, base_url, progress=progress, scenario_yaml=scenario_yaml)
+                test_state["total_requests"] = len(results["detailed_results"])
             else:
                 raise ValueError(f"Unknown test type: {test_type}")
 
+            detailed_results = results.pop("detailed_results")
+            result_store.save_detailed_results(test_id, test_type, detailed_results, keep_responses)
+
             # Update test state with results
             test_state.update({
                 "end_time": datetime.now().isoformat(),
@@ -65,12 +86,19 @@ class BenchmarkRunner:
                 **results
             })
 
-            
-            with open(result_file, 'w') as f:
-                json.dump(test_state, f, indent=2)
+            result_store.save_summary(test_state)
 
             return test_state
 
+        except asyncio.CancelledError:
+            logger.info(f"Test {test_id} cancelled")
+            test_state.update({
+                "end_time": datetime.now().isoformat(),
+                "status": "cancelled"
+            })
+            result_store.save_summary(test_state)
+            raise
+
         except Exception as e:
             logger.error(f"Test failed: {str(e)}")
             
@@ -86,41 +114,22 @@ class BenchmarkRunner:
             }
             
             # Save error state
-            with open(result_file, 'w') as f:
-                json.dump(error_state, f, indent=2)
+            result_store.save_summary(error_state)
             
             return error_state
 
     async def get_test_result(self, test_id: str) -> Optional[Dict]:
         """Get test result by ID from file"""
         try:
-            result_file = os.path.join(settings.RESULTS_DIR, f"{test_id}.json")
-            if not os.path.exists(result_file):
-                return None
-                
-            with open(result_file, 'r') as f:
-                return json.load(f)
+            return result_store.load_summary(test_id)
         except Exception as e:
             logger.error(f"Failed to get test result: {str(e)}")
             return None 
 
     def get_most_recent_test_result(self, test_type: str) -> Optional[Dict]:
-        """Get the most recent test result for a specific test type"""
+        """Get the most recent completed test result for a specific test type"""
         try:
-            # List all files in results directory
-            files = [f for f in os.listdir(settings.RESULTS_DIR) 
-                    if f.startswith(test_type) and f.endswith('.json')]
-            
-            if not files:
-                return None
-            
-            # Sort by timestamp (which is part of the filename)
-            files.sort(reverse=True)
-            latest_file = files[0]
-            
-            # Read and return the file contents
-            with open(os.path.join(settings.RESULTS_DIR, latest_file), 'r') as f:
-                return json.load(f)
+            return get_catalog().latest_of_type(test_type)
         except Exception as e:
             logger.error(f"Failed to get recent test result: {str(e)}")
-            return None 
\ No newline at end of file
+            return None 
@@ -0,0 +1,205 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from src.core.config import settings
+from src.core.histogram import LatencyHistogram
+from src.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS test_runs (
+    test_id TEXT PRIMARY KEY,
+    test_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    total_requests INTEGER,
+    successful_requests INTEGER,
+    failed_requests INTEGER,
+    total_duration REAL,
+    avg_duration REAL,
+    requests_per_second REAL,
+    p50 REAL,
+    p90 REAL,
+    p99 REAL,
+    p999 REAL,
+    config TEXT,
+    summary TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_test_runs_type_start ON test_runs (test_type, start_time DESC);
+CREATE INDEX IF NOT EXISTS ix_test_runs_start ON test_runs (start_time DESC);
+
+-- Running merge of the latency histograms of all completed runs per type
+CREATE TABLE IF NOT EXISTS type_histograms (
+    test_type TEXT PRIMARY KEY,
+    histogram TEXT NOT NULL
+);
+"""
+
+CONFIG_FIELDS = ("num_requests", "concurrent_requests", "base_url", "mode", "arrival_rate", "keep_responses", "scenario")
+
+
+class ResultCatalog:
+    """Embedded SQLite index of benchmark summaries.
+
+    Summaries are upserted in one transaction whenever they are saved, so
+    history, metrics and "latest run of type" lookups are indexed queries
+    instead of directory scans over every stored result.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.CATALOG_PATH
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            empty = conn.execute("SELECT COUNT(*) FROM test_runs").fetchone()[0] == 0
+        if empty:
+            self.rebuild()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:  # Commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, summary: Dict):
+        """Insert or update one run; completing a run folds its histogram
+        into the per-type aggregate in the same transaction"""
+        percentiles = summary.get("percentiles") or {}
+        row = {
+            "test_id": summary["test_id"],
+            "test_type": summary["test_type"],
+            "status": summary.get("status", "unknown"),
+            "start_time": summary["start_time"],
+            "end_time": summary.get("end_time"),
+            "total_requests": summary.get("total_requests", 0),
+            "successful_requests": summary.get("successful_requests", 0),
+            "failed_requests": summary.get("failed_requests", 0),
+            "total_duration": summary.get("total_duration", 0),
+            "avg_duration": summary.get("avg_duration", 0),
+            "requests_per_second": summary.get("requests_per_second", 0),
+            "p50": percentiles.get("p50"),
+            "p90": percentiles.get("p90"),
+            "p99": percentiles.get("p99"),
+            "p999": percentiles.get("p99.9"),
+            "config": json.dumps({k: summary.get(k) for k in CONFIG_FIELDS if k in summary}),
+            "summary": json.dumps(summary),
+        }
+
+        with self._lock, self._connect() as conn:
+            previous = conn.execute(
+                "SELECT status FROM test_runs WHERE test_id = ?", (row["test_id"],)
+            ).fetchone()
+            conn.execute(
+                f"INSERT OR REPLACE INTO test_runs ({', '.join(row)}) "
+                f"VALUES ({', '.join(':' + k for k in row)})",
+                row,
+            )
+
+            newly_completed = row["status"] == "completed" and (previous is None or previous["status"] != "completed")
+            if newly_completed and summary.get("latency_histogram"):
+                self._merge_type_histogram(conn, row["test_type"], LatencyHistogram.from_dict(summary["latency_histogram"]))
+
+    def _merge_type_histogram(self, conn, test_type: str, histogram: LatencyHistogram):
+        existing = conn.execute(
+            "SELECT histogram FROM type_histograms WHERE test_type = ?", (test_type,)
+        ).fetchone()
+        if existing:
+            histogram = LatencyHistogram.from_dict(json.loads(existing["histogram"])).merge(histogram)
+        conn.execute(
+            "INSERT OR REPLACE INTO type_histograms (test_type, histogram) VALUES (?, ?)",
+            (test_type, json.dumps(histogram.to_dict())),
+        )
+
+    def latest_of_type(self, test_type: str, status: str = "completed") -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT summary FROM test_runs WHERE test_type = ? AND status = ? "
+                "ORDER BY start_time DESC LIMIT 1",
+                (test_type, status),
+            ).fetchone()
+        return json.loads(row["summary"]) if row else None
+
+    def history_page(self, limit: int = 100, offset: int = 0) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM test_runs ORDER BY start_time DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def last_n(self, test_type: str, n: int = 10) -> List[Dict]:
+        """Most recent runs of a type, oldest first (chart order)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM test_runs WHERE test_type = ? ORDER BY start_time DESC LIMIT ?",
+                (test_type, n),
+            ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def type_stats(self, test_type: str) -> Dict:
+        with self._connect() as conn:
+            stats = conn.execute(
+                """
+                SELECT
+                    COUNT(*) AS total_tests,
+                    COALESCE(SUM(total_requests), 0) AS total_requests,
+                    AVG(CASE WHEN total_requests > 0
+                        THEN 100.0 * successful_requests / total_requests END) AS success_rate,
+                    AVG(avg_duration) AS avg_response_time,
+                    AVG(requests_per_second) AS requests_per_second
+                FROM test_runs WHERE test_type = ?
+                """,
+                (test_type,),
+            ).fetchone()
+            histogram_row = conn.execute(
+                "SELECT histogram FROM type_histograms WHERE test_type = ?", (test_type,)
+            ).fetchone()
+
+        histogram = (
+            LatencyHistogram.from_dict(json.loads(histogram_row["histogram"]))
+            if histogram_row else LatencyHistogram()
+        )
+        return {
+            "total_tests": stats["total_tests"],
+            "total_requests": stats["total_requests"],
+            "success_rate": stats["success_rate"] or 0,
+            "avg_response_time": stats["avg_response_time"] or 0,
+            "requests_per_second": stats["requests_per_second"] or 0,
+            "percentiles": histogram.percentiles(),
+        }
+
+    def rebuild(self):
+        """Re-index every summary stored in RESULTS_DIR"""
+        from src.core.result_store import list_summaries
+
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM test_runs")
+            conn.execute("DELETE FROM type_histograms")
+
+        summaries = list_summaries()
+        for summary in summaries:
+            if "test_id" in summary and "start_time" in summary:
+                self.record(summary)
+        logger.info(f"Indexed {len(summaries)} stored results into the catalog")
+
+
+_catalog: Optional[ResultCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> ResultCatalog:
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ResultCatalog()
+        return _catalog
@@ -0,0 +1,249 @@
+import json
+import math
+import os
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.core.config import settings
+from src.core.histogram import LatencyHistogram
+from src.core import result_store
+
+COMPARED_PERCENTILES = {"p50": 50, "p99": 99}
+# Values drawn per vectorized bootstrap batch and side (8 bytes each), so
+# memory stays at about 32 MB per side whatever the run size
+BOOTSTRAP_BATCH_ELEMENTS = 4_000_000
+# Runs larger than this are subsampled before bootstrapping; the CI then is
+# slightly wider than the full run's, never narrower
+BOOTSTRAP_MAX_SAMPLES = 100_000
+
+
+def _load_result(run: str) -> Dict:
+    """A stored result by test id or by path to its JSON file"""
+    path = run if os.path.exists(run) else result_store.summary_path(run)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No stored result for {run}")
+    with open(path, 'r') as f:
+        result = json.load(f)
+    result["_path"] = path
+    return result
+
+
+def load_latencies(run: str) -> np.ndarray:
+    """Successful request latencies of a stored run.
+
+    Prefers the columnar per-request file, then the legacy per-request list,
+    and finally expands the summary histogram (values then carry the
+    histogram's 1% bucket error).
+    """
+    result = _load_result(run)
+    columns_path = result["_path"][:-len(".json")] + result_store.COLUMNS_SUFFIX
+    if os.path.exists(columns_path):
+        with np.load(columns_path) as data:
+            return data["duration"][data["success"]]
+
+    if result.get("detailed_results"):
+        return np.array([r["duration"] for r in result["detailed_results"] if r.get("success")], dtype=np.float64)
+
+    if result.get("latency_histogram"):
+        buckets = LatencyHistogram.from_dict(result["latency_histogram"]).buckets()
+        return np.repeat(np.array([v for v, _ in buckets], dtype=np.float64), [c for _, c in buckets])
+
+    return np.array([], dtype=np.float64)
+
+
+def bootstrap_ci(baseline: np.ndarray, candidate: np.ndarray, pct: float,
+                 resamples: int = 2000, confidence: float = 0.95, seed: int = 0) -> Dict:
+    """Bootstrap CI for the relative change of a percentile (candidate vs baseline).
+
+    The point estimates use every sample; the resampling uses at most
+    BOOTSTRAP_MAX_SAMPLES of each run, in batches of a fixed number of values.
+    """
+    rng = np.random.default_rng(seed)
+    base_samples, cand_samples = (
+        rng.choice(values, BOOTSTRAP_MAX_SAMPLES, replace=False) if len(values) > BOOTSTRAP_MAX_SAMPLES else values
+        for values in (baseline, candidate)
+    )
+    batch = max(1, BOOTSTRAP_BATCH_ELEMENTS // max(len(base_samples), len(cand_samples)))
+    changes = []
+    for start in range(0, resamples, batch):
+        size = min(batch, resamples - start)
+        base = np.percentile(rng.choice(base_samples, (size, len(base_samples))), pct, axis=1)
+        cand = np.percentile(rng.choice(cand_samples, (size, len(cand_samples))), pct, axis=1)
+        changes.append((cand - base) / base)
+    changes = np.concatenate(changes)
+
+    alpha = (1 - confidence) / 2
+    return {
+        "baseline": float(np.percentile(baseline, pct)),
+        "candidate": float(np.percentile(candidate, pct)),
+        "change": float(np.percentile(candidate, pct) / np.percentile(baseline, pct) - 1),
+        "ci_low": float(np.quantile(changes, alpha)),
+        "ci_high": float(np.quantile(changes, 1 - alpha)),
+    }
+
+
+def mann_whitney_u(baseline: np.ndarray, candidate: np.ndarray) -> Dict:
+    """Two-sided Mann-Whitney U test (normal approximation with tie correction).
+
+    `effect` is the probability that a random candidate request is slower
+    than a random baseline request (0.5 means no difference).
+    """
+    n1, n2 = len(baseline), len(candidate)
+    combined = np.concatenate([baseline, candidate])
+    order = np.argsort(combined, kind="mergesort")
+    sorted_values = combined[order]
+
+    # Average ranks over ties
+    _, first, counts = np.unique(sorted_values, return_index=True, return_counts=True)
+    tie_ranks = first + (counts + 1) / 2
+    ranks = np.empty(len(combined))
+    ranks[order] = np.repeat(tie_ranks, counts)
+
+    u_candidate = ranks[n1:].sum() - n2 * (n2 + 1) / 2
+    mean_u = n1 * n2 / 2
+    n = n1 + n2
+    tie_term = (counts ** 3 - counts).sum() / (n * (n - 1))
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term))
+    if sigma == 0:
+        return {"u": float(u_candidate), "p_value": 1.0, "effect": 0.5}
+
+    z = (abs(u_candidate - mean_u) - 0.5) / sigma  # Continuity correction
+    return {
+        "u": float(u_candidate),
+        "p_value": float(min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))),
+        "effect": float(u_candidate / (n1 * n2)),
+    }
+
+
+def compare_samples(baseline: np.ndarray, candidate: np.ndarray, threshold: float = None,
+                    alpha: float = None, resamples: int = 2000) -> Dict:
+    """Statistical comparison of two latency samples.
+
+    A regression is flagged when the distributions differ significantly
+    (Mann-Whitney p < alpha, candidate slower) and the bootstrap CI of the
+    p50 or p99 change lies entirely above `threshold`.
+    """
+    threshold = settings.REGRESSION_THRESHOLD if threshold is None else threshold
+    alpha = settings.REGRESSION_ALPHA if alpha is None else alpha
+    if len(baseline) < 2 or len(candidate) < 2:
+        raise ValueError("Both runs need at least two successful requests to compare")
+
+    test = mann_whitney_u(baseline, candidate)
+    percentiles = {
+        name: bootstrap_ci(baseline, candidate, pct, resamples=resamples, confidence=1 - alpha)
+        for name, pct in COMPARED_PERCENTILES.items()
+    }
+    significant = test["p_value"] < alpha
+    regressed = [
+        name for name, stats in percentiles.items()
+        if significant and test["effect"] > 0.5 and stats["ci_low"] > threshold
+    ]
+    improved = [
+        name for name, stats in percentiles.items()
+        if significant and test["effect"] < 0.5 and stats["ci_high"] < -threshold
+    ]
+    return {
+        "baseline_requests": len(baseline),
+        "candidate_requests": len(candidate),
+        "mann_whitney": test,
+        "significant": significant,
+        "percentiles": percentiles,
+        "regressed": regressed,
+        "improved": improved,
+        "regression": bool(regressed),
+    }
+
+
+def compare_runs(baseline: str, candidates: List[str], threshold: float = None,
+                 alpha: float = None, resamples: int = 2000) -> Dict:
+    """Compare one or more stored runs against a baseline run"""
+    baseline_latencies = load_latencies(baseline)
+    comparisons = []
+    for candidate in candidates:
+        comparison = compare_samples(baseline_latencies, load_latencies(candidate), threshold, alpha, resamples)
+        comparisons.append({"candidate": candidate, **comparison})
+    return {
+        "baseline": baseline,
+        "threshold": settings.REGRESSION_THRESHOLD if threshold is None else threshold,
+        "alpha": settings.REGRESSION_ALPHA if alpha is None else alpha,
+        "comparisons": comparisons,
+        "regression": any(c["regression"] for c in comparisons),
+    }
+
+
+def render_chart(report: Dict, output, labels: Optional[Dict[str, str]] = None):
+    """Latency CDFs plus p50/p99 changes with their confidence intervals.
+
+    `output` is a path or a binary file object (PNG).
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    labels = labels or {}
+    runs = [report["baseline"]] + [c["candidate"] for c in report["comparisons"]]
+    fig, (cdf_ax, change_ax) = plt.subplots(1, 2, figsize=(16, 6))
+
+    for run in runs:
+        latencies = np.sort(load_latencies(run)) * 1000
+        cdf_ax.plot(latencies, np.arange(1, len(latencies) + 1) / len(latencies), label=labels.get(run, run))
+    cdf_ax.set_xscale("log")
+    cdf_ax.set_xlabel("Latency (ms)")
+    cdf_ax.set_ylabel("Fraction of requests")
+    cdf_ax.set_title(f"Latency CDF (baseline {labels.get(report['baseline'], report['baseline'])})")
+    cdf_ax.grid(True, alpha=0.3)
+    cdf_ax.legend()
+
+    width = 0.8 / len(COMPARED_PERCENTILES)
+    x = np.arange(len(report["comparisons"]))
+    for offset, name in enumerate(COMPARED_PERCENTILES):
+        stats = [c["percentiles"][name] for c in report["comparisons"]]
+        changes = np.array([s["change"] for s in stats]) * 100
+        errors = np.array([[s["change"] - s["ci_low"], s["ci_high"] - s["change"]] for s in stats]).T * 100
+        change_ax.bar(x + offset * width, changes, width, yerr=errors, capsize=4, label=name)
+    change_ax.axhline(report["threshold"] * 100, color="red", linestyle="--", label="Regression threshold")
+    change_ax.axhline(0, color="grey", linewidth=0.8)
+    change_ax.set_xticks(x + width * (len(COMPARED_PERCENTILES) - 1) / 2)
+    change_ax.set_xticklabels([
+        f"{labels.get(c['candidate'], c['candidate'])}\np={c['mann_whitney']['p_value']:.3g}"
+        + (" REGRESSION" if c["regression"] else "")
+        for c in report["comparisons"]
+    ])
+    change_ax.set_ylabel("Change vs baseline (%)")
+    change_ax.set_title(f"Percentile change with {1 - report['alpha']:.0%} bootstrap CI")
+    change_ax.grid(True, axis="y", alpha=0.3)
+    change_ax.legend()
+
+    plt.tight_layout()
+    plt.savefig(output, dpi=150, format="png")
+    plt.close(fig)
+
+
+def main(argv: List[str] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare stored benchmark runs and fail on latency regressions")
+    parser.add_argument("baseline", help="Test id or path of the baseline result")
+    parser.add_argument("candidates", nargs="+", help="Test ids or paths of the runs to check")
+    parser.add_argument("--threshold", type=float, help="Relative p50/p99 slowdown treated as a regression")
+    parser.add_argument("--alpha", type=float, help="Significance level")
+    parser.add_argument("--resamples", type=int, default=2000)
+    parser.add_argument("--chart", help="Write a comparison chart (PNG) to this path")
+    args = parser.parse_args(argv)
+
+    report = compare_runs(args.baseline, args.candidates, args.threshold, args.alpha, args.resamples)
+    for c in report["comparisons"]:
+        verdict = "REGRESSION" if c["regression"] else "improved" if c["improved"] else "ok"
+        print(f"{c['candidate']}: {verdict} (Mann-Whitney p={c['mann_whitney']['p_value']:.3g})")
+        for name, stats in c["percentiles"].items():
+            print(f"  {name}: {stats['baseline'] * 1000:.1f}ms -> {stats['candidate'] * 1000:.1f}ms "
+                  f"({stats['change']:+.1%}, CI {stats['ci_low']:+.1%} .. {stats['ci_high']:+.1%})")
+    if args.chart:
+        render_chart(report, args.chart)
+    return 1 if report["regression"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,8 +4,14 @@ import os
 class Settings(BaseSettings):
     RESULTS_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "test_results")
     BASE_URL: str = "http://localhost:8000"  # Default base URL
+    PING_TARGET: str = "http://13.212.32.5:8000"  # Server the dashboard measures latency to
     LOG_LEVEL: str = "INFO"
     LOG_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "logs")
+    CATALOG_PATH: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "test_results", "catalog.sqlite3")
+    SCENARIOS_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "scenarios")
+    PROGRESS_INTERVAL: float = 0.5  # Seconds between live progress pushes per job
+    REGRESSION_THRESHOLD: float = 0.10  # Relative p50/p99 slowdown counted as a regression
+    REGRESSION_ALPHA: float = 0.05  # Significance level for run comparisons
 
     def __init__(self):
         super().__init__()
@@ -0,0 +1,126 @@
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Smallest latency we distinguish (1 microsecond); anything below lands in bucket 0
+MIN_VALUE = 1e-6
+DEFAULT_PRECISION = 0.01  # 1% relative error per bucket
+
+REPORTED_PERCENTILES = {"p50": 50, "p90": 90, "p99": 99, "p99.9": 99.9}
+
+
+class LatencyHistogram:
+    """HDR-style log-bucketed latency histogram.
+
+    Bucket i covers (MIN_VALUE * g^(i-1), MIN_VALUE * g^i] with g = 1 + precision,
+    so every recorded value is known to within `precision` and memory is
+    bounded by the value range (about 2,200 buckets from 1 us to 1 h at 1%),
+    not by the number of requests. Histograms with the same precision merge
+    by adding bucket counts.
+    """
+
+    def __init__(self, precision: float = DEFAULT_PRECISION):
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _bucket(self, value: float) -> int:
+        if value <= MIN_VALUE:
+            return 0
+        return math.ceil(math.log(value / MIN_VALUE) / self._log_base)
+
+    def _bucket_value(self, index: int) -> float:
+        return MIN_VALUE * math.exp(index * self._log_base)
+
+    def record(self, value: float, count: int = 1):
+        """Record a latency in seconds"""
+        index = self._bucket(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def record_all(self, values: Iterable[float]) -> "LatencyHistogram":
+        for value in values:
+            self.record(value)
+        return self
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge histograms with different precision")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, pct: float) -> float:
+        """Highest equivalent value at the given percentile (0-100)"""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        """(value, count) per non-empty bucket in ascending order"""
+        return [(min(self._bucket_value(i), self.max), self.counts[i]) for i in sorted(self.counts)]
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def percentiles(self) -> Dict[str, float]:
+        return {name: self.percentile(pct) for name, pct in REPORTED_PERCENTILES.items()}
+
+    def to_dict(self) -> Dict:
+        return {
+            "precision": self.precision,
+            "min_value": MIN_VALUE,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            # JSON object keys must be strings
+            "counts": {str(index): count for index, count in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LatencyHistogram":
+        histogram = cls(precision=data["precision"])
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+    @classmethod
+    def from_result(cls, result: Dict) -> "LatencyHistogram":
+        """Histogram of a stored test result.
+
+        Uses the serialized histogram when present and falls back to the
+        per-request list for results recorded before histograms existed.
+        """
+        if result.get("latency_histogram"):
+            return cls.from_dict(result["latency_histogram"])
+        return cls().record_all(
+            r["duration"] for r in result.get("detailed_results", []) if r.get("success")
+        )
+
+
+def merge_all(histograms: List[LatencyHistogram]) -> LatencyHistogram:
+    merged = LatencyHistogram()
+    for histogram in histograms:
+        merged.merge(histogram)
+    return merged
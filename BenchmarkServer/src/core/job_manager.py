@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from src.core.benchmark_runner import BenchmarkRunner
+from src.core.config import settings
+from src.core.histogram import LatencyHistogram
+from src.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+PublishFn = Callable[[str, Dict], None]
+
+
+class BenchmarkJob:
+    """State and live progress of a single submitted benchmark."""
+
+    def __init__(self, job_id: str, params: Dict):
+        self.job_id = job_id
+        self.params = params
+        self.status = QUEUED
+        self.test_id: Optional[str] = None
+        self.error: Optional[str] = None
+        self.submitted_at = datetime.now().isoformat()
+        self.future = None
+
+        self.completed = 0
+        self.failed = 0
+        self.histogram = LatencyHistogram()
+        self.started = None
+        self.current_rps = 0.0
+        self._window_start = None
+        self._window_count = 0
+
+    def record(self, result: Dict):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = self._window_start = now
+
+        self.completed += 1
+        if result.get("success"):
+            self.histogram.record(result["duration"])
+        else:
+            self.failed += 1
+
+        self._window_count += 1
+        elapsed = now - self._window_start
+        if elapsed >= settings.PROGRESS_INTERVAL:
+            self.current_rps = self._window_count / elapsed
+            self._window_start = now
+            self._window_count = 0
+
+    def snapshot(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "test_id": self.test_id,
+            "test_type": self.params["test_type"],
+            "status": self.status,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "total_requests": self.params["num_requests"],
+            "completed": self.completed,
+            "failed": self.failed,
+            "current_rps": self.current_rps,
+            "percentiles": self.histogram.percentiles(),
+        }
+
+
+class JobManager:
+    """Runs benchmark jobs on a background asyncio loop.
+
+    Submitting returns immediately with a job id; progress snapshots are
+    pushed through `publish(event, payload)` at most every
+    settings.PROGRESS_INTERVAL seconds per job.
+    """
+
+    def __init__(self, runner: BenchmarkRunner, publish: Optional[PublishFn] = None):
+        self.runner = runner
+        self.publish = publish or (lambda event, payload: None)
+        self.jobs: Dict[str, BenchmarkJob] = {}
+        self._lock = threading.Lock()
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="benchmark-jobs", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, params: Dict) -> BenchmarkJob:
+        job = BenchmarkJob(uuid.uuid4().hex[:12], params)
+        with self._lock:
+            self.jobs[job.job_id] = job
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job), self.loop)
+        logger.info(f"Queued benchmark job {job.job_id} ({params['test_type']})")
+        return job
+
+    def get(self, job_id: str) -> Optional[BenchmarkJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict]:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [job.snapshot() for job in sorted(jobs, key=lambda j: j.submitted_at, reverse=True)]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or job.status not in (QUEUED, RUNNING):
+            return False
+        if not job.future.cancel():
+            return False
+        if job.status == QUEUED:
+            # The coroutine never started, so _run will not report it
+            job.status = CANCELLED
+            self.publish("benchmark_finished", job.snapshot())
+        return True
+
+    async def _run(self, job: BenchmarkJob):
+        job.status = RUNNING
+        job.test_id = self.runner.generate_test_id(job.params["test_type"], job.job_id)
+        last_push = 0.0
+
+        def on_result(result: Dict):
+            nonlocal last_push
+            job.record(result)
+            now = time.perf_counter()
+            if now - last_push >= settings.PROGRESS_INTERVAL:
+                last_push = now
+                self.publish("benchmark_progress", job.snapshot())
+
+        try:
+            result = await self.runner.run_test(
+                test_id=job.test_id,
+                progress=on_result,
+                **job.params
+            )
+            job.status = result.get("status", FAILED)
+            job.error = result.get("error")
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+            raise
+        except Exception as e:
+            logger.error(f"Benchmark job {job.job_id} failed: {str(e)}")
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            self.publish("benchmark_finished", job.snapshot())
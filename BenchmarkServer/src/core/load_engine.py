@@ -0,0 +1,166 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+
+from src.core.histogram import LatencyHistogram
+from src.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+CLOSED_LOOP = "closed"
+OPEN_LOOP = "open"
+
+RequestFn = Callable[[aiohttp.ClientSession, int], Awaitable[Dict]]
+ProgressFn = Callable[[Dict], None]
+
+
+class LoadEngine:
+    """Asyncio load generator sharing one pooled aiohttp session.
+
+    Closed-loop mode keeps `concurrency` virtual users busy back to back.
+    Open-loop mode starts requests at a constant `arrival_rate` (req/s)
+    regardless of how fast responses come back; `concurrency` then only caps
+    the number of requests in flight, and time spent waiting for a slot is
+    reported per request as `queue_delay`.
+    """
+
+    def __init__(self, concurrency: int, mode: str = CLOSED_LOOP,
+                 arrival_rate: Optional[float] = None, timeout: float = 30):
+        if mode not in (CLOSED_LOOP, OPEN_LOOP):
+            raise ValueError(f"Unknown load mode: {mode}")
+        if mode == OPEN_LOOP and not arrival_rate:
+            raise ValueError("arrival_rate is required for open-loop mode")
+
+        self.concurrency = max(1, concurrency)
+        self.mode = mode
+        self.arrival_rate = arrival_rate
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.progress: Optional[ProgressFn] = None
+        self._run_started = 0.0
+
+    def _session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.concurrency,
+            ttl_dns_cache=300,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def run(self, num_requests: int, request_fn: RequestFn,
+                  progress: Optional[ProgressFn] = None) -> List[Dict]:
+        """Issue `num_requests` calls of `request_fn(session, index)` and
+        return their result dicts in index order.
+
+        `progress`, if given, is called with each result as it completes.
+        """
+        results: List[Optional[Dict]] = [None] * num_requests
+        self.progress = progress
+        self._run_started = asyncio.get_running_loop().time()
+
+        async with self._session() as session:
+            if self.mode == OPEN_LOOP:
+                await self._run_open_loop(session, num_requests, request_fn, results)
+            else:
+                await self._run_closed_loop(session, num_requests, request_fn, results)
+
+        return [r for r in results if r is not None]
+
+    async def _call(self, session: aiohttp.ClientSession, index: int,
+                    request_fn: RequestFn) -> Dict:
+        started_at = asyncio.get_running_loop().time() - self._run_started
+        try:
+            result = await request_fn(session, index)
+        except Exception as e:
+            logger.error(f"Request {index} failed: {str(e)}")
+            result = {"success": False, "duration": 0, "status_code": 500, "error": str(e)}
+        result["started_at"] = started_at
+
+        if self.progress:
+            self.progress(result)
+        return result
+
+    async def _run_closed_loop(self, session, num_requests, request_fn, results):
+        next_index = iter(range(num_requests))
+
+        async def worker():
+            for index in next_index:
+                results[index] = await self._call(session, index, request_fn)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, num_requests))))
+
+    async def _run_open_loop(self, session, num_requests, request_fn, results):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        interval = 1.0 / self.arrival_rate
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async def fire(index: int, scheduled: float):
+            async with semaphore:
+                queue_delay = loop.time() - scheduled
+                result = await self._call(session, index, request_fn)
+            result["queue_delay"] = queue_delay
+            results[index] = result
+
+        tasks = []
+        for index in range(num_requests):
+            scheduled = start + index * interval
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(index, scheduled)))
+
+        await asyncio.gather(*tasks)
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Phase durations in seconds from a Server-Timing header
+    (`auth;dur=1.2;desc="1x", db;dur=3.4, ...`)"""
+    phases = {}
+    for entry in (header or "").split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                try:
+                    phases[name] = float(param[4:]) / 1000
+                except ValueError:
+                    pass
+    return phases
+
+
+def phase_breakdown(results: List[Dict]) -> Dict[str, Dict]:
+    """Server-side latency per phase over successful requests that
+    reported Server-Timing"""
+    histograms: Dict[str, LatencyHistogram] = {}
+    for result in results:
+        if result["success"]:
+            for name, seconds in result.get("server_timing", {}).items():
+                histograms.setdefault(name, LatencyHistogram()).record(seconds)
+    return {
+        name: {"requests": histogram.count, "avg_duration": histogram.mean(), **histogram.percentiles()}
+        for name, histogram in histograms.items()
+    }
+
+
+def summarize(results: List[Dict], total_duration: float) -> Dict:
+    """Common summary fields shared by all test types.
+
+    Latencies of successful requests are recorded into a LatencyHistogram;
+    its percentiles and serialized form are stored with the summary so
+    consumers never need the per-request list.
+    """
+    histogram = LatencyHistogram().record_all(r["duration"] for r in results if r["success"])
+
+    return {
+        "total_duration": total_duration,
+        "successful_requests": histogram.count,
+        "failed_requests": len(results) - histogram.count,
+        "avg_duration": histogram.mean(),
+        "min_duration": histogram.min or 0,
+        "max_duration": histogram.max or 0,
+        "requests_per_second": len(results) / total_duration if total_duration else 0,
+        "percentiles": histogram.percentiles(),
+        "latency_histogram": histogram.to_dict(),
+        "phases": phase_breakdown(results),
+    }
+
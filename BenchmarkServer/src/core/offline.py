@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+from src.core.benchmark_runner import BenchmarkRunner
+from src.core.config import settings
+from src.core.load_engine import CLOSED_LOOP, OPEN_LOOP
+from src.core import result_store
+from src.core.logger import get_logger
+from src.core.trace_report import analyze, format_report, load_spans
+
+logger = get_logger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+SUITE = ("register", "login", "decrypt")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _tracing_env(enabled: bool, path: str) -> Dict[str, str]:
+    return {"TRACING_ENABLED": "true", "TRACE_EXPORT": path} if enabled else {}
+
+
+class LocalService:
+    """One FastAPI service run under uvicorn in a child process."""
+
+    def __init__(self, name: str, port: int, env: Dict[str, str], log_dir: str):
+        self.name = name
+        self.port = port
+        self.env = env
+        self.log_path = os.path.join(log_dir, f"{name}.log")
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 60):
+        log_file = open(self.log_path, 'w')
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port)],
+            cwd=os.path.join(REPO_ROOT, self.name),
+            env={**os.environ, **self.env},
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+        )
+        log_file.close()
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited during startup, see {self.log_path}")
+            try:
+                # Both services expose /metrics and the key server allows 127.0.0.1
+                if requests.get(f"{self.url}/metrics", timeout=1).status_code == 200:
+                    logger.info(f"{self.name} ready at {self.url}")
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.25)
+        self.stop()
+        raise RuntimeError(f"{self.name} did not become ready within {timeout}s, see {self.log_path}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class LocalStack:
+    """CloudBackend and PrivateKeyServer booted on this machine.
+
+    Both default to SQLite files in a scratch directory; pass Postgres URLs
+    to benchmark against a local database instead. CloudBackend's KEYSERVER
+    points at the local key server, so nothing leaves the machine.
+    """
+
+    def __init__(self, workdir: str = None, encryption_method: str = "X25519",
+                 cloud_db: str = None, key_db: str = None, trace: bool = False):
+        self.workdir = workdir or tempfile.mkdtemp(prefix="vaccine-offline-")
+        os.makedirs(self.workdir, exist_ok=True)
+        key_port, cloud_port = _free_port(), _free_port()
+        self.trace_files = [os.path.join(self.workdir, f"{name}.traces.jsonl") for name in ("key-server", "cloud-backend")]
+
+        self.key_server = LocalService("PrivateKeyServer", key_port, {
+            "DATABASE_URL": key_db or f"sqlite:///{os.path.join(self.workdir, 'keys.db')}",
+            "ENCRYPTION_METHOD": encryption_method,
+            **_tracing_env(trace, self.trace_files[0]),
+        }, self.workdir)
+        self.cloud_backend = LocalService("CloudBackend", cloud_port, {
+            "DATABASE_URL": cloud_db or f"sqlite:///{os.path.join(self.workdir, 'cloud.db')}",
+            "KEYSERVER": self.key_server.url,
+            "SECRET_KEY": "offline-benchmark-secret",
+            "ALGORITHM": "HS256",
+            "FRONTEND_URL": "http://127.0.0.1",
+            "ENVIRONMENT": "offline",
+            **_tracing_env(trace, self.trace_files[1]),
+        }, self.workdir)
+
+    @property
+    def base_url(self) -> str:
+        return self.cloud_backend.url
+
+    def start(self):
+        logger.info(f"Starting offline stack in {self.workdir}")
+        self.key_server.start()
+        try:
+            self.cloud_backend.start()
+        except Exception:
+            self.key_server.stop()
+            raise
+
+    def stop(self):
+        self.cloud_backend.stop()
+        self.key_server.stop()
+
+    def __enter__(self) -> "LocalStack":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+async def run_suite(base_url: str, num_requests: int, concurrent_requests: int,
+                    mode: str = CLOSED_LOOP, arrival_rate: float = None) -> List[Dict]:
+    """Run register -> login -> decrypt, each chained on the previous run"""
+    runner = BenchmarkRunner()
+    results = []
+    previous_test_file = None
+    for test_type in SUITE:
+        result = await runner.run_test(
+            test_type, num_requests, concurrent_requests, base_url,
+            previous_test_file=previous_test_file, mode=mode, arrival_rate=arrival_rate,
+        )
+        results.append(result)
+        if result["status"] != "completed":
+            logger.error(f"{test_type} failed, stopping the suite: {result.get('error')}")
+            break
+        previous_test_file = result_store.summary_path(result["test_id"])
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the benchmark suite against locally booted services")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--mode", choices=(CLOSED_LOOP, OPEN_LOOP), default=CLOSED_LOOP)
+    parser.add_argument("--arrival-rate", type=float)
+    parser.add_argument("--encryption-method", choices=("RSA", "X25519"), default="X25519")
+    parser.add_argument("--cloud-db", help="SQLAlchemy URL for CloudBackend (default: SQLite in the workdir)")
+    parser.add_argument("--key-db", help="SQLAlchemy URL for PrivateKeyServer (default: SQLite in the workdir)")
+    parser.add_argument("--workdir", help="Directory for databases and service logs (default: a temp dir)")
+    parser.add_argument("--trace", action="store_true", help="Enable tracing and report network vs compute time")
+    args = parser.parse_args(argv)
+
+    with LocalStack(args.workdir, args.encryption_method, args.cloud_db, args.key_db, args.trace) as stack:
+        results = asyncio.run(run_suite(stack.base_url, args.requests, args.concurrency, args.mode, args.arrival_rate))
+
+    if args.trace:
+        # The services flush their spans on shutdown
+        trace_files = [path for path in stack.trace_files if os.path.exists(path)]
+        print(format_report(analyze(load_spans(trace_files)), 99))
+
+    print(f"\nOffline suite ({args.encryption_method}), results in {settings.RESULTS_DIR}")
+    for result in results:
+        if result["status"] != "completed":
+            print(f"  {result['test_type']:<9} {result['status']}: {result.get('error')}")
+            continue
+        percentiles = result["percentiles"]
+        print(f"  {result['test_type']:<9} {result['successful_requests']}/{result['total_requests']} ok  "
+              f"{result['requests_per_second']:.1f} req/s  "
+              f"p50 {percentiles['p50'] * 1000:.1f}ms  p99 {percentiles['p99'] * 1000:.1f}ms")
+
+    ok = len(results) == len(SUITE) and all(
+        r["status"] == "completed" and r["failed_requests"] == 0 for r in results
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
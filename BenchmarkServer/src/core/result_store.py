@@ -0,0 +1,192 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.core.catalog import get_catalog
+from src.core.config import settings
+from src.core.histogram import LatencyHistogram
+from src.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Per test, RESULTS_DIR holds:
+#   <test_id>.json            compact summary (what history/metrics read)
+#   <test_id>.npz             per-request columns: duration, status_code, success,
+#                             started_at, queue_delay
+#   <test_id>.records.jsonl   minimal per-request data later tests chain on
+#                             (register -> credentials, login -> tokens)
+#   <test_id>.responses.jsonl full response bodies, only with keep_responses
+COLUMNS_SUFFIX = ".npz"
+RECORDS_SUFFIX = ".records.jsonl"
+RESPONSES_SUFFIX = ".responses.jsonl"
+
+
+def _path(test_id: str, suffix: str) -> str:
+    return os.path.join(settings.RESULTS_DIR, f"{test_id}{suffix}")
+
+
+def summary_path(test_id: str) -> str:
+    return _path(test_id, ".json")
+
+
+def save_summary(summary: Dict):
+    # Write then rename so readers never see a half-written summary
+    path = summary_path(summary["test_id"])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp_path, path)
+    get_catalog().record(summary)
+
+
+def load_summary(test_id: str) -> Optional[Dict]:
+    path = summary_path(test_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_columns(test_id: str, results: List[Dict]):
+    np.savez_compressed(
+        _path(test_id, COLUMNS_SUFFIX),
+        duration=np.array([r.get("duration", 0) for r in results], dtype=np.float64),
+        status_code=np.array([r.get("status_code", 0) for r in results], dtype=np.int16),
+        success=np.array([r.get("success", False) for r in results], dtype=bool),
+        started_at=np.array([r.get("started_at", np.nan) for r in results], dtype=np.float64),
+        queue_delay=np.array([r.get("queue_delay", 0) for r in results], dtype=np.float64),
+    )
+
+
+def load_columns(test_id: str) -> Optional[Dict[str, np.ndarray]]:
+    path = _path(test_id, COLUMNS_SUFFIX)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def chain_record(test_type: str, result: Dict) -> Optional[Dict]:
+    """The part of a successful result that a follow-up test needs"""
+    if not result.get("success"):
+        return None
+    if test_type == "register":
+        return {"email": result["email"], "password": result["password"]}
+    if test_type == "login":
+        token = json.loads(result["response"]).get("access_token")
+        return {"email": result["email"], "access_token": token} if token else None
+    return None
+
+
+def save_records(test_id: str, test_type: str, results: List[Dict]):
+    records = [r for r in (chain_record(test_type, result) for result in results) if r]
+    if not records:
+        return
+    with open(_path(test_id, RECORDS_SUFFIX), 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def save_responses(test_id: str, results: List[Dict]):
+    with open(_path(test_id, RESPONSES_SUFFIX), 'w') as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+
+
+def _read_jsonl(path: str) -> List[Dict]:
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_records(test_file: str, test_type: str) -> List[Dict]:
+    """Chain records of the test whose summary is at `test_file`.
+
+    Results written before the columnar layout keep everything in
+    detailed_results, so those are converted on the fly.
+    """
+    records_file = test_file[:-len(".json")] + RECORDS_SUFFIX
+    if os.path.exists(records_file):
+        return _read_jsonl(records_file)
+
+    with open(test_file, 'r') as f:
+        legacy = json.load(f)
+    results = legacy.get("detailed_results", legacy.get("test_results", []))
+    return [r for r in (chain_record(test_type, result) for result in results) if r]
+
+
+def save_detailed_results(test_id: str, test_type: str, results: List[Dict], keep_responses: bool = False):
+    save_columns(test_id, results)
+    save_records(test_id, test_type, results)
+    if keep_responses:
+        save_responses(test_id, results)
+
+
+def load_detailed_results(test_id: str) -> List[Dict]:
+    """Rebuild per-request rows for a single test (used by the detail view)"""
+    responses_file = _path(test_id, RESPONSES_SUFFIX)
+    if os.path.exists(responses_file):
+        return _read_jsonl(responses_file)
+
+    columns = load_columns(test_id)
+    if columns is None:
+        return []
+    return [
+        {
+            "success": bool(columns["success"][i]),
+            "duration": float(columns["duration"][i]),
+            "status_code": int(columns["status_code"][i]),
+        }
+        for i in range(len(columns["duration"]))
+    ]
+
+
+def _strip_legacy(summary: Dict) -> Dict:
+    """Turn a legacy all-in-one result into a summary, keeping its latency
+    distribution as a histogram instead of the per-request list"""
+    if "detailed_results" in summary:
+        if not summary.get("latency_histogram"):
+            histogram = LatencyHistogram.from_result(summary)
+            summary["latency_histogram"] = histogram.to_dict()
+            summary["percentiles"] = histogram.percentiles()
+        del summary["detailed_results"]
+    return summary
+
+
+def list_summaries() -> List[Dict]:
+    """Load every stored summary, skipping the companion files"""
+    summaries = []
+    for filename in os.listdir(settings.RESULTS_DIR):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.RESULTS_DIR, filename), 'r') as f:
+                summaries.append(_strip_legacy(json.load(f)))
+        except Exception as e:
+            logger.error(f"Failed to read result {filename}: {str(e)}")
+    return summaries
+
+
+def migrate_legacy(keep_responses: bool = False) -> int:
+    """Split legacy all-in-one result files into summary + columnar files"""
+    migrated = 0
+    for filename in os.listdir(settings.RESULTS_DIR):
+        if not filename.endswith('.json'):
+            continue
+        with open(os.path.join(settings.RESULTS_DIR, filename), 'r') as f:
+            result = json.load(f)
+        if "detailed_results" not in result:
+            continue
+
+        save_detailed_results(result["test_id"], result["test_type"], result["detailed_results"], keep_responses)
+        save_summary(_strip_legacy(result))
+        migrated += 1
+        logger.info(f"Migrated {filename}")
+    return migrated
+
+
+if __name__ == "__main__":
+    import sys
+    count = migrate_legacy(keep_responses="--keep-responses" in sys.argv)
+    print(f"Migrated {count} result files")
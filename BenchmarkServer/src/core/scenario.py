@@ -0,0 +1,379 @@
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+import yaml
+
+from src.core.config import settings
+from src.core.histogram import LatencyHistogram
+from src.core.load_engine import parse_server_timing, summarize
+from src.core.logger import get_logger
+from src.tests.register_test import generate_fake_user
+
+logger = get_logger(__name__)
+
+VACCINE_CODES = ["BCG", "PENTAVALENT", "OPV", "PCV", "IPV", "MR"]
+IDENTITIES = ("patient", "vaccinator", "new")
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+def _think_time(value) -> float:
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return float(value)
+    low, high = value
+    return random.uniform(low, high)
+
+
+class VirtualUser:
+    """One simulated client walking through journeys.
+
+    `ctx` carries what earlier steps produced (credentials, token) so later
+    steps in the same journey can use them.
+    """
+
+    def __init__(self, runner: "ScenarioRunner", index: int):
+        self.runner = runner
+        self.index = index
+        self.ctx: Dict = {}
+        self.step_name = None
+
+    async def request(self, method: str, path: str, **kwargs) -> Optional[Dict]:
+        """Timed HTTP call recorded under the current step; returns the JSON
+        body on success and None otherwise"""
+        start = time.perf_counter()
+        result = {"step": self.step_name, "journey": self.ctx.get("journey")}
+        body = None
+        try:
+            async with self.runner.session.request(method, f"{self.runner.base_url}{path}", **kwargs) as response:
+                text = await response.text()
+            result.update(success=response.status == 200, status_code=response.status,
+                          server_timing=parse_server_timing(response.headers.get("Server-Timing")))
+            if response.status == 200:
+                body = json.loads(text) if text else {}
+            else:
+                result["error"] = text[:500]
+        except asyncio.TimeoutError:
+            result.update(success=False, status_code=408, error="Request timed out")
+        except Exception as e:
+            result.update(success=False, status_code=500, error=str(e))
+        result["duration"] = time.perf_counter() - start
+        result["started_at"] = start - self.runner.started
+        self.runner.record(result)
+        return body
+
+    async def run_journey(self, name: str, journey: Dict):
+        self.ctx = {"journey": name}
+        identity = journey.get("as", "patient")
+        if identity != "new":
+            self.ctx.update(random.choice(self.runner.accounts[identity]))
+
+        for step in journey["steps"]:
+            action, params = step["action"], step.get("params", {})
+            self.step_name = f"{name}.{step.get('name', action)}"
+            await ACTIONS[action](self, params)
+            think = step.get("think_time", journey.get("think_time", self.runner.default_think_time))
+            await asyncio.sleep(_think_time(think))
+
+
+# Actions, one per CloudBackend route, keyed by the name used in scenario files
+
+async def _register(vu: VirtualUser, params: Dict):
+    user = generate_fake_user()
+    user["user_type"] = params.get("user_type", "1")
+    if await vu.request("POST", "/register", json=user) is not None:
+        vu.ctx.update(email=user["email"], password=user["password"])
+
+
+async def _login(vu: VirtualUser, params: Dict):
+    body = await vu.request("POST", "/login", json={"email": vu.ctx["email"], "password": vu.ctx["password"]})
+    if body:
+        vu.ctx["token"] = body["access_token"]
+
+
+async def _user_info(vu: VirtualUser, params: Dict):
+    await vu.request("GET", "/api/user/info", params={"token": vu.ctx["token"]})
+
+
+async def _update_profile(vu: VirtualUser, params: Dict):
+    await vu.request("PUT", "/api/user/update", json={
+        "token": vu.ctx["token"],
+        "first_name": params.get("first_name", "Load"),
+        "last_name": params.get("last_name", "Test"),
+        "dob": params.get("dob", "1990-01-01"),
+        "phone_number": f"+880{random.randint(10000000000, 99999999999)}",
+    })
+
+
+async def _history(vu: VirtualUser, params: Dict):
+    email = vu.ctx["email"]
+    if params.get("of") == "patient":
+        # A vaccinator looking up someone else's card
+        email = vu.ctx["patient_email"] = random.choice(vu.runner.accounts["patient"])["email"]
+    await vu.request("GET", "/api/vaccinations/history", params={"email": email})
+
+
+async def _history_by_jwt(vu: VirtualUser, params: Dict):
+    await vu.request("POST", "/api/vaccinations/get-vaccination-history/by-jwt/", json={"token": vu.ctx["token"]})
+
+
+async def _record_dose(vu: VirtualUser, params: Dict):
+    patient_email = vu.ctx.get("patient_email") or random.choice(vu.runner.accounts["patient"])["email"]
+    await vu.request("POST", "/api/vaccinations/vaccination-history", json={
+        "email": patient_email,
+        "token": vu.ctx["token"],
+        "vaccine_code": random.choice(params.get("vaccine_codes", VACCINE_CODES)),
+        "dose_number": params.get("dose_number", 1),
+        "vaccination_date": date.today().isoformat(),
+        "is_taken": True,
+    })
+
+
+async def _stats(vu: VirtualUser, params: Dict):
+    await vu.request("GET", "/api/vaccinations/stats", params={"token": vu.ctx["token"]})
+
+
+ACTIONS: Dict[str, Callable] = {
+    "register": _register,
+    "login": _login,
+    "user_info": _user_info,
+    "update_profile": _update_profile,
+    "history": _history,
+    "history_by_jwt": _history_by_jwt,
+    "record_dose": _record_dose,
+    "stats": _stats,
+}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def scenario_path(name: str) -> str:
+    """Path of a scenario file in settings.SCENARIOS_DIR by bare name, with
+    or without its extension. Anything else (paths, '..') is refused, so a
+    request can only ever read the bundled scenarios."""
+    if not name or os.path.basename(name) != name or name in (".", ".."):
+        raise ScenarioError("Scenario must be the name of a file in the scenarios directory")
+    root = os.path.realpath(settings.SCENARIOS_DIR)
+    candidates = [name] if name.endswith((".yaml", ".yml")) else [f"{name}.yaml", f"{name}.yml"]
+    for candidate in candidates:
+        path = os.path.realpath(os.path.join(root, candidate))
+        if os.path.dirname(path) == root and os.path.isfile(path):
+            return path
+    raise ScenarioError(f"Unknown scenario {name}, choose from {', '.join(list_scenarios()) or 'none'}")
+
+
+def load_scenario(name: str = None, text: str = None) -> Dict:
+    """Parse and validate a scenario: a file of settings.SCENARIOS_DIR by
+    name, or, given explicitly, raw YAML text"""
+    if (name is None) == (text is None):
+        raise ScenarioError("Give either a scenario name or scenario YAML")
+    if text is None:
+        with open(scenario_path(name), 'r') as f:
+            scenario = yaml.safe_load(f)
+    else:
+        scenario = yaml.safe_load(text)
+
+    if not isinstance(scenario, dict):
+        raise ScenarioError("Scenario must be a YAML mapping")
+    stages, journeys = scenario.get("stages"), scenario.get("journeys")
+    if not stages or not isinstance(stages, list):
+        raise ScenarioError("Scenario needs a list of at least one stage")
+    if not journeys or not isinstance(journeys, dict):
+        raise ScenarioError("Scenario needs a mapping of at least one journey")
+
+    # Checked here so a bad file is a 400, not a failure inside the job
+    for i, stage in enumerate(stages, start=1):
+        if not isinstance(stage, dict):
+            raise ScenarioError(f"Stage {i} must be a mapping with users and duration")
+        if not _is_number(stage.get("users")) or stage["users"] < 0:
+            raise ScenarioError(f"Stage {i}: users must be a number >= 0")
+        if not _is_number(stage.get("duration")) or stage["duration"] <= 0:
+            raise ScenarioError(f"Stage {i}: duration must be a number of seconds > 0")
+
+    for name, journey in journeys.items():
+        if not isinstance(journey, dict):
+            raise ScenarioError(f"Journey {name} must be a mapping")
+        if not _is_number(journey.get("weight", 1)) or journey.get("weight", 1) < 0:
+            raise ScenarioError(f"Journey {name}: weight must be a number >= 0")
+        if journey.get("as", "patient") not in IDENTITIES:
+            raise ScenarioError(f"Journey {name}: 'as' must be one of {IDENTITIES}")
+        if not journey.get("steps") or not isinstance(journey["steps"], list):
+            raise ScenarioError(f"Journey {name} needs a list of at least one step")
+        # Steps may be bare action names or mappings with options
+        journey["steps"] = [{"action": step} if isinstance(step, str) else step for step in journey["steps"]]
+        for step in journey["steps"]:
+            if not isinstance(step, dict):
+                raise ScenarioError(f"Journey {name}: a step must be an action name or a mapping")
+            if step.get("action") not in ACTIONS:
+                raise ScenarioError(f"Journey {name}: unknown action {step.get('action')}")
+    if not sum(journey.get("weight", 1) for journey in journeys.values()):
+        raise ScenarioError("At least one journey needs a weight above 0")
+    return scenario
+
+
+def list_scenarios() -> List[str]:
+    if not os.path.isdir(settings.SCENARIOS_DIR):
+        return []
+    return sorted(f for f in os.listdir(settings.SCENARIOS_DIR) if f.endswith((".yaml", ".yml")))
+
+
+class ScenarioRunner:
+    """Executes a scenario: a setup phase that registers the account pools,
+    then ramp stages that grow or shrink the number of virtual users, each
+    picking journeys by weight until the last stage ends."""
+
+    TICK = 0.5  # Seconds between ramp adjustments
+
+    def __init__(self, scenario: Dict, base_url: str, progress=None):
+        self.scenario = scenario
+        self.base_url = base_url.rstrip("/")
+        self.progress = progress
+        self.default_think_time = scenario.get("defaults", {}).get("think_time", 1)
+        self.accounts: Dict[str, List[Dict]] = {"patient": [], "vaccinator": []}
+        self.results: List[Dict] = []
+        self.started = 0.0
+        self.session: Optional[aiohttp.ClientSession] = None
+
+        self.journey_names = list(scenario["journeys"])
+        self.journey_weights = [scenario["journeys"][n].get("weight", 1) for n in self.journey_names]
+        self.journey_counts = {name: 0 for name in self.journey_names}
+
+    def record(self, result: Dict):
+        self.results.append(result)
+        if self.progress:
+            self.progress(result)
+
+    async def _setup(self):
+        setup = self.scenario.get("setup", {})
+        semaphore = asyncio.Semaphore(setup.get("concurrency", 20))
+
+        async def register(pool: str, user_type: str):
+            user = generate_fake_user()
+            user["user_type"] = user_type
+            try:
+                async with semaphore:
+                    async with self.session.post(f"{self.base_url}/register", json=user) as response:
+                        await response.read()
+                        ok = response.status == 200
+            except Exception as e:
+                logger.error(f"Scenario setup registration failed: {str(e)}")
+                return
+            if ok:
+                self.accounts[pool].append({"email": user["email"], "password": user["password"]})
+
+        await asyncio.gather(
+            *(register("patient", "1") for _ in range(setup.get("patients", 20))),
+            *(register("vaccinator", "2") for _ in range(setup.get("vaccinators", 2))),
+        )
+        logger.info(f"Scenario setup registered {len(self.accounts['patient'])} patients "
+                    f"and {len(self.accounts['vaccinator'])} vaccinators")
+
+        for name, journey in self.scenario["journeys"].items():
+            identity = journey.get("as", "patient")
+            if identity != "new" and not self.accounts[identity]:
+                raise ScenarioError(f"Journey {name} needs {identity} accounts but setup registered none")
+
+    def _target_users(self, elapsed: float) -> Optional[int]:
+        """Linearly interpolated user count, or None once all stages are done"""
+        previous = 0
+        for stage in self.scenario["stages"]:
+            if elapsed < stage["duration"]:
+                return round(previous + (stage["users"] - previous) * elapsed / stage["duration"])
+            elapsed -= stage["duration"]
+            previous = stage["users"]
+        return None
+
+    async def _virtual_user(self, index: int, active: Dict):
+        vu = VirtualUser(self, index)
+        while index < active["target"]:
+            name = random.choices(self.journey_names, weights=self.journey_weights)[0]
+            self.journey_counts[name] += 1
+            try:
+                await vu.run_journey(name, self.scenario["journeys"][name])
+            except (KeyError, IndexError) as e:
+                # An earlier step failed, so the context is missing what this one needs
+                logger.debug(f"Journey {name} aborted: {e}")
+
+    async def run(self) -> Dict:
+        max_users = max(stage["users"] for stage in self.scenario["stages"])
+        connector = aiohttp.TCPConnector(limit=max(1, max_users))
+        timeout = aiohttp.ClientTimeout(total=self.scenario.get("timeout", 30))
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as self.session:
+            await self._setup()
+
+            self.started = time.perf_counter()
+            active = {"target": 0}
+            users: Dict[int, asyncio.Task] = {}
+            while True:
+                target = self._target_users(time.perf_counter() - self.started)
+                if target is None:
+                    break
+                # Users at or above the target index retire after their current journey
+                active["target"] = target
+                for index in range(target):
+                    if index not in users or users[index].done():
+                        users[index] = asyncio.create_task(self._virtual_user(index, active))
+                await asyncio.sleep(self.TICK)
+
+            active["target"] = 0
+            await asyncio.gather(*users.values())
+            total_duration = time.perf_counter() - self.started
+
+        return {
+            **summarize(self.results, total_duration),
+            "scenario": self.scenario.get("name"),
+            "journeys": self.journey_counts,
+            "steps": step_breakdown(self.results),
+            "detailed_results": self.results,
+        }
+
+
+def step_breakdown(results: List[Dict]) -> Dict[str, Dict]:
+    """Per-step request counts, error counts and latency percentiles"""
+    histograms: Dict[str, LatencyHistogram] = {}
+    errors: Dict[str, int] = {}
+    for result in results:
+        step = result["step"]
+        histograms.setdefault(step, LatencyHistogram())
+        errors.setdefault(step, 0)
+        if result["success"]:
+            histograms[step].record(result["duration"])
+        else:
+            errors[step] += 1
+
+    return {
+        step: {
+            "requests": histogram.count + errors[step],
+            "errors": errors[step],
+            "avg_duration": histogram.mean(),
+            **histogram.percentiles(),
+        }
+        for step, histogram in sorted(histograms.items())
+    }
+
+
+async def run_scenario_test(scenario: Optional[str], base_url: str, progress=None,
+                            scenario_yaml: Optional[str] = None) -> Dict:
+    """Run a bundled scenario by name, or one given as YAML text"""
+    definition = load_scenario(scenario, scenario_yaml)
+    logger.info(f"Starting scenario {definition.get('name', scenario or 'inline')}")
+    results = await ScenarioRunner(definition, base_url, progress=progress).run()
+
+    logger.info("\nScenario Step Breakdown:")
+    logger.info("=" * 50)
+    for step, stats in results["steps"].items():
+        logger.info(f"{step}: {stats['requests']} requests, {stats['errors']} errors, "
+                    f"p50 {stats['p50']:.3f}s, p99 {stats['p99']:.3f}s")
+    return results
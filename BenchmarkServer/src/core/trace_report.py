@@ -0,0 +1,129 @@
+import argparse
+import json
+import math
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+from src.core.histogram import LatencyHistogram
+
+# Span names written by CloudBackend's and PrivateKeyServer's core/tracing.py
+CLOUD_SERVICE = "cloud-backend"
+KEY_SERVICE = "key-server"
+KEYSERVER_CALL = "keyserver"
+
+COMPONENTS = ("cloud_compute", "cloud_db", "network", "keyserver_compute", "keyserver_db", "keyserver_crypto")
+
+
+def load_spans(paths: List[str]) -> List[Dict]:
+    """Spans from the JSON-lines trace files of one or more services"""
+    spans = []
+    for path in paths:
+        with open(path, 'r') as f:
+            spans.extend(json.loads(line) for line in f if line.strip())
+    return spans
+
+
+def _sum(spans: List[Dict]) -> float:
+    return sum(span["duration"] for span in spans)
+
+
+def break_down(trace: List[Dict]) -> List[Dict]:
+    """Split every CloudBackend request in a trace into where its time went.
+
+    Network is the key-server call as seen by CloudBackend minus the time
+    the key server spent handling it.
+    """
+    by_parent = defaultdict(list)
+    for span in trace:
+        by_parent[span["parent_id"]].append(span)
+
+    def descendants(span_id: str, service: str) -> List[Dict]:
+        found, stack = [], [span_id]
+        while stack:
+            for child in by_parent.get(stack.pop(), []):
+                if child["service"] == service:
+                    found.append(child)
+                    stack.append(child["span_id"])
+        return found
+
+    rows = []
+    for root in trace:
+        if root["service"] != CLOUD_SERVICE or root["kind"] != "server":
+            continue
+        cloud_spans = descendants(root["span_id"], CLOUD_SERVICE)
+        calls = [s for s in cloud_spans if s["kind"] == "client" and s["name"] == KEYSERVER_CALL]
+        handled = [s for call in calls for s in by_parent.get(call["span_id"], []) if s["service"] == KEY_SERVICE]
+        key_spans = [d for s in handled for d in descendants(s["span_id"], KEY_SERVICE)]
+
+        call_time, handled_time = _sum(calls), _sum(handled)
+        cloud_db = _sum([s for s in cloud_spans if s["name"] == "db"])
+        keyserver_db = _sum([s for s in key_spans if s["name"] == "db"])
+        keyserver_crypto = _sum([s for s in key_spans if s["name"].startswith("crypto")])
+        rows.append({
+            "route": root["name"],
+            "total": root["duration"],
+            "cloud_compute": max(root["duration"] - call_time - cloud_db, 0),
+            "cloud_db": cloud_db,
+            "network": max(call_time - handled_time, 0),
+            "keyserver_compute": max(handled_time - keyserver_db - keyserver_crypto, 0),
+            "keyserver_db": keyserver_db,
+            "keyserver_crypto": keyserver_crypto,
+        })
+    return rows
+
+
+def analyze(spans: List[Dict], tail_percentile: float = 99) -> Dict[str, Dict]:
+    """Mean time per component for all requests and for the slowest tail,
+    per CloudBackend route"""
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+
+    routes = defaultdict(list)
+    for trace in traces.values():
+        for row in break_down(trace):
+            routes[row["route"]].append(row)
+
+    report = {}
+    for route, rows in routes.items():
+        cutoff = LatencyHistogram().record_all(r["total"] for r in rows).percentile(tail_percentile)
+        tail = [r for r in rows if r["total"] >= cutoff] or rows
+        report[route] = {
+            "requests": len(rows),
+            "tail_cutoff": cutoff,
+            "all": {c: sum(r[c] for r in rows) / len(rows) for c in ("total",) + COMPONENTS},
+            "tail": {c: sum(r[c] for r in tail) / len(tail) for c in ("total",) + COMPONENTS},
+        }
+    return report
+
+
+def format_report(report: Dict[str, Dict], tail_percentile: float) -> str:
+    lines = []
+    header = f"{'':<8}{'total':>10}" + "".join(f"{c:>19}" for c in COMPONENTS)
+    for route, stats in sorted(report.items()):
+        lines.append(f"{route} ({stats['requests']} requests, tail >= p{tail_percentile:g} "
+                     f"= {stats['tail_cutoff'] * 1000:.1f}ms), mean ms:")
+        lines.append(header)
+        for label in ("all", "tail"):
+            values = stats[label]
+            total = values["total"] or math.inf
+            lines.append(f"{label:<8}{values['total'] * 1000:>10.1f}" + "".join(
+                f"{values[c] * 1000:>11.1f} ({values[c] / total:>4.0%})" for c in COMPONENTS
+            ))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Attribute request latency to network vs compute from trace files")
+    parser.add_argument("files", nargs="+", help="JSON-lines trace files from CloudBackend and PrivateKeyServer")
+    parser.add_argument("--tail", type=float, default=99, help="Percentile from which requests count as tail")
+    args = parser.parse_args(argv)
+
+    print(format_report(analyze(load_spans(args.files), args.tail), args.tail))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,41 @@
-import re
-import json
+import asyncio
 import time
-import os
-import requests
-from concurrent.futures import ThreadPoolExecutor
+from src.core import result_store
 from src.core.logger import get_logger
-from src.core.config import settings
+from src.core.load_engine import LoadEngine, CLOSED_LOOP, summarize, parse_server_timing
 
 logger = get_logger(__name__)
 
-def process_request(token: str, base_url: str, request_num: int, num_requests: int) -> dict:
+async def process_request(session, token: str, base_url: str) -> dict:
     """Process a single request"""
+    req_start = time.perf_counter()
     try:
-        req_start = time.time()
-        response = requests.get(
-            f"{base_url}/api/user/info",
-            params={"token": token},
-            timeout=30
-        )
-        duration = time.time() - req_start
+        async with session.get(f"{base_url}/api/user/info", params={"token": token}) as response:
+            body = await response.text()
+        duration = time.perf_counter() - req_start
         
-        success = response.status_code == 200
+        success = response.status == 200
         if not success:
-            logger.error(f"Decrypt failed: {response.text}")
+            logger.error(f"Decrypt failed: {body}")
 
-        result = {
+        return {
             "success": success,
             "duration": duration,
-            "status_code": response.status_code,
+            "status_code": response.status,
             "token": token,
-            "response": response.text
+            "response": body,
+            "server_timing": parse_server_timing(response.headers.get("Server-Timing"))
         }
-        logger.info(f"{request_num+1}/{num_requests} Decryption completed")
-        return result
 
+    except asyncio.TimeoutError:
+        logger.error("Request timed out")
+        return {
+            "success": False,
+            "duration": time.perf_counter() - req_start,
+            "status_code": 408,
+            "token": token,
+            "error": "Request timed out"
+        }
     except Exception as e:
         logger.error(f"Request failed: {str(e)}")
         return {
@@ -44,63 +46,36 @@ def process_request(token: str, base_url: str, request_num: int, num_requests: i
             "error": str(e)
         }
 
-async def run_decrypt_test(num_requests: int, concurrent_requests: int, base_url: str, login_results_file: str) -> dict:
+async def run_decrypt_test(num_requests: int, concurrent_requests: int, base_url: str, login_results_file: str,
+                           mode: str = CLOSED_LOOP, arrival_rate: float = None, progress=None) -> dict:
     """Run decrypt load test using tokens from login test"""
     # Load tokens from login test results
-    with open(login_results_file, 'r') as f:
-        login_data = json.load(f)
-    
-    tokens = []
-    for result in login_data["detailed_results"]:
-        if result["success"]:
-            result_json = json.loads(result["response"])
-            if "access_token" in result_json:
-                tokens.append(result_json["access_token"])
+    tokens = [record["access_token"] for record in result_store.load_records(login_results_file, "login")]
 
     if not tokens:
         raise ValueError("No valid tokens found in login results")
 
-    results = []
-    start_time = time.time()
-
-    # Use ThreadPoolExecutor for concurrent requests
-    with ThreadPoolExecutor(max_workers=concurrent_requests) as executor:
-        futures = [
-            executor.submit(process_request, tokens[i % len(tokens)], base_url, i, num_requests)
-            for i in range(num_requests)
-        ]
-        
-        # Collect results as they complete
-        for future in futures:
-            try:
-                result = future.result()
-                results.append(result)
-            except Exception as e:
-                logger.error(f"Future failed: {str(e)}")
+    engine = LoadEngine(concurrent_requests, mode=mode, arrival_rate=arrival_rate)
 
-    end_time = time.time()
-    total_duration = end_time - start_time
-    successful = [r for r in results if r["success"]]
-    durations = [r["duration"] for r in successful]
+    start_time = time.perf_counter()
+    results = await engine.run(
+        num_requests,
+        lambda session, i: process_request(session, tokens[i % len(tokens)], base_url),
+        progress=progress
+    )
+    total_duration = time.perf_counter() - start_time
 
-    summary = {
-        "total_duration": total_duration,
-        "successful_requests": len(successful),
-        "failed_requests": len(results) - len(successful),
-        "avg_duration": sum(durations) / len(durations) if durations else 0,
-        "min_duration": min(durations) if durations else 0,
-        "max_duration": max(durations) if durations else 0,
-        "requests_per_second": len(results) / total_duration
-    }
+    summary = summarize(results, total_duration)
     
     logger.info(f"""Decrypt test completed. Summary:
                 \nTotal Duration: {total_duration}
-                \nSuccessful Requests: {len(successful)}
-                \nFailed Requests: {len(results) - len(successful)}
-                \nAverage Duration: {sum(durations) / len(durations) if durations else 0}
-                \nMinimum Duration: {min(durations) if durations else 0}
-                \nMaximum Duration: {max(durations) if durations else 0}
-                \nRequests per Second: {len(results) / total_duration}""")
+                \nSuccessful Requests: {summary['successful_requests']}
+                \nFailed Requests: {summary['failed_requests']}
+                \nAverage Duration: {summary['avg_duration']}
+                \nMinimum Duration: {summary['min_duration']}
+                \nMaximum Duration: {summary['max_duration']}
+                \nPercentiles: {summary['percentiles']}
+                \nRequests per Second: {summary['requests_per_second']}""")
 
     # Save results to file
     timestamp = time.strftime("%Y%m%d_%H%M%S")
@@ -111,6 +86,8 @@ async def run_decrypt_test(num_requests: int, concurrent_requests: int, base_url
         "base_url": base_url,
         "timestamp": timestamp,
         "login_results": login_results_file,
+        "mode": mode,
+        "arrival_rate": arrival_rate,
         **summary,
         "detailed_results": results
     } 
@@ -1,107 +1,74 @@
-import requests
+import asyncio
 import time
-import statistics
-from concurrent.futures import ThreadPoolExecutor
-import json
-import os
+from src.core import result_store
 from src.core.logger import get_logger
-from src.core.config import settings
+from src.core.load_engine import LoadEngine, CLOSED_LOOP, summarize, parse_server_timing
 
 logger = get_logger(__name__)
 
-def login_user(credentials, base_url):
+async def login_user(session, credentials, base_url):
     """Make a login request and measure time"""
-    start_time = time.time()
+    start_time = time.perf_counter()
     try:
-        logger.info(f"Attempting login for email: {credentials['email']}")
-        
-        response = requests.post(f"{base_url}/login", json=credentials, timeout=30)
-        end_time = time.time()
-        duration = end_time - start_time
+        logger.debug(f"Attempting login for email: {credentials['email']}")
+
+        async with session.post(f"{base_url}/login", json=credentials) as response:
+            body = await response.text()
+        duration = time.perf_counter() - start_time
         
-        if response.status_code != 200:
+        if response.status != 200:
             logger.error(f"Login failed for {credentials['email']}")
-            logger.error(f"Status Code: {response.status_code}")
-            logger.error(f"Response: {response.text}")
-        else:
-            logger.info(f"Login successful for {credentials['email']}")
+            logger.error(f"Status Code: {response.status}")
+            logger.error(f"Response: {body}")
         
         return {
-            "success": response.status_code == 200,
+            "success": response.status == 200,
             "duration": duration,
-            "status_code": response.status_code,
+            "status_code": response.status,
             "email": credentials["email"],
-            "response": response.text
+            "response": body,
+            "server_timing": parse_server_timing(response.headers.get("Server-Timing"))
         }
-    except requests.Timeout:
-        end_time = time.time()
+    except asyncio.TimeoutError:
         logger.error(f"Request timed out for {credentials['email']}")
         return {
             "success": False,
-            "duration": end_time - start_time,
+            "duration": time.perf_counter() - start_time,
             "status_code": 408,
             "email": credentials["email"],
             "error": "Request timed out"
         }
     except Exception as e:
-        end_time = time.time()
         logger.error(f"Exception during login: {str(e)}")
         return {
             "success": False,
-            "duration": end_time - start_time,
+            "duration": time.perf_counter() - start_time,
             "error": str(e),
             "email": credentials["email"]
         }
 
-async def run_login_test(num_requests: int, concurrent_requests: int, base_url: str, previous_test_file: str = None) -> dict:
+async def run_login_test(num_requests: int, concurrent_requests: int, base_url: str, previous_test_file: str = None,
+                         mode: str = CLOSED_LOOP, arrival_rate: float = None, progress=None) -> dict:
     """Run login benchmark test"""
     logger.info(f"Starting login test with {num_requests} requests ({concurrent_requests} concurrent)")
     
     # Get credentials from most recent register test
-    if previous_test_file:
-        try:
-            with open(previous_test_file, 'r') as f:
-                register_results = json.load(f)
-                # Check if we have the new or old format
-                if "detailed_results" in register_results:
-                    # New format
-                    successful_users = [
-                        {
-                            "email": result["email"],
-                            "password": result["password"]
-                        }
-                        for result in register_results["detailed_results"]
-                        if result.get("success", False)
-                    ]
-                else:
-                    # Old format
-                    successful_users = [
-                        {
-                            "email": result["email"],
-                            "password": result["password"]
-                        }
-                        for result in register_results.get("test_results", [])
-                        if result.get("success", False)
-                    ]
-        except Exception as e:
-            logger.error(f"Failed to load previous test results: {str(e)}")
-            raise
-    else:
+    if not previous_test_file:
         from src.core.benchmark_runner import BenchmarkRunner
         runner = BenchmarkRunner()
         register_results = runner.get_most_recent_test_result("register")
         if not register_results:
             raise ValueError("No previous register test results found")
-        
-        # Extract from new format
+        previous_test_file = result_store.summary_path(register_results["test_id"])
+
+    try:
         successful_users = [
-            {
-                "email": result["email"],
-                "password": result["password"]
-            }
-            for result in register_results.get("detailed_results", [])
-            if result.get("success", False)
+            {"email": record["email"], "password": record["password"]}
+            for record in result_store.load_records(previous_test_file, "register")
         ]
+    except Exception as e:
+        logger.error(f"Failed to load previous test results: {str(e)}")
+        raise
     
     if not successful_users:
         raise ValueError("No successful registrations found in previous test")
@@ -111,52 +78,38 @@ async def run_login_test(num_requests: int, concurrent_requests: int, base_url:
         logger.warning(f"Only {len(successful_users)} registered users available. Adjusting test size.")
         num_requests = len(successful_users)
     
-    total_start_time = time.time()
-    results = []
-    
-    # Run requests using ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=concurrent_requests) as executor:
-        futures = [
-            executor.submit(login_user, user, base_url)
-            for user in successful_users[:num_requests]
-        ]
-        for future in futures:
-            results.append(future.result())
-    
-    # Calculate metrics
-    total_duration = time.time() - total_start_time
-    successful_requests = [r for r in results if r["success"]]
-    failed_requests = [r for r in results if not r["success"]]
-    
-    durations = [r["duration"] for r in results if r["success"]]
-    if durations:
-        avg_duration = statistics.mean(durations)
-        min_duration = min(durations)
-        max_duration = max(durations)
-    else:
-        avg_duration = min_duration = max_duration = 0
+    users = successful_users[:num_requests]
+    engine = LoadEngine(concurrent_requests, mode=mode, arrival_rate=arrival_rate)
+
+    total_start_time = time.perf_counter()
+    results = await engine.run(
+        num_requests,
+        lambda session, i: login_user(session, users[i], base_url),
+        progress=progress
+    )
+    total_duration = time.perf_counter() - total_start_time
+
+    summary = summarize(results, total_duration)
     
     # Log results
     logger.info("\nLoad Test Results:")
     logger.info("=" * 50)
     logger.info(f"Total Time: {total_duration:.2f} seconds")
     logger.info(f"Total Requests: {num_requests}")
-    logger.info(f"Successful Requests: {len(successful_requests)}")
-    logger.info(f"Failed Requests: {len(failed_requests)}")
-    logger.info(f"Requests per Second: {num_requests/total_duration:.2f}")
+    logger.info(f"Successful Requests: {summary['successful_requests']}")
+    logger.info(f"Failed Requests: {summary['failed_requests']}")
+    logger.info(f"Requests per Second: {summary['requests_per_second']:.2f}")
     logger.info("\nResponse Time Statistics (seconds):")
-    logger.info(f"Average: {avg_duration:.3f}")
-    logger.info(f"Min: {min_duration:.3f}")
-    logger.info(f"Max: {max_duration:.3f}")
+    logger.info(f"Average: {summary['avg_duration']:.3f}")
+    logger.info(f"Min: {summary['min_duration']:.3f}")
+    logger.info(f"Max: {summary['max_duration']:.3f}")
+    for name, value in summary["percentiles"].items():
+        logger.info(f"{name}: {value:.3f}")
     
     return {
-        "total_duration": total_duration,
-        "successful_requests": len(successful_requests),
-        "failed_requests": len(failed_requests),
-        "avg_duration": avg_duration,
-        "min_duration": min_duration,
-        "max_duration": max_duration,
-        "requests_per_second": num_requests/total_duration,
+        **summary,
+        "mode": mode,
+        "arrival_rate": arrival_rate,
         "detailed_results": results
     }
 
@@ -165,5 +118,4 @@ if __name__ == "__main__":
     CONCURRENT_REQUESTS = 10
     BASE_URL = "http://localhost:8000"
     
-    import asyncio
     asyncio.run(run_login_test(NUM_REQUESTS, CONCURRENT_REQUESTS, BASE_URL)) 
\ No newline at end of file
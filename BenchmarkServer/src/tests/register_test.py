@@ -1,12 +1,10 @@
-import requests
+import asyncio
 import time
 import random
 import string
-import statistics
-from concurrent.futures import ThreadPoolExecutor
-import json
 from datetime import datetime, timedelta
 from src.core.logger import get_logger
+from src.core.load_engine import LoadEngine, CLOSED_LOOP, summarize, parse_server_timing
 
 logger = get_logger(__name__)
 
@@ -32,103 +30,88 @@ def generate_fake_user():
         "terms": True
     }
 
-def register_user(user_data, base_url):
+async def register_user(session, user_data, base_url):
     """Make a registration request and measure time"""
-    start_time = time.time()
+    start_time = time.perf_counter()
     try:
-        logger.info(f"Attempting Encryption for user email: {user_data['email']}")
-        logger.debug(f"Request payload: {json.dumps(user_data, indent=2)}")
-        
-        response = requests.post(f"{base_url}/register", json=user_data, timeout=30)
-        end_time = time.time()
-        duration = end_time - start_time
-        
-        if response.status_code != 200:
+        logger.debug(f"Attempting Encryption for user email: {user_data['email']}")
+
+        async with session.post(f"{base_url}/register", json=user_data) as response:
+            body = await response.text()
+        duration = time.perf_counter() - start_time
+
+        if response.status != 200:
             logger.error(f"Encryption failed for {user_data['email']}")
-            logger.error(f"Status Code: {response.status_code}")
-            logger.error(f"Response: {response.text}")
-        else:
-            logger.info(f"Encryption successful for {user_data['email']}")
-        
+            logger.error(f"Status Code: {response.status}")
+            logger.error(f"Response: {body}")
+
         return {
-            "success": response.status_code == 200,
+            "success": response.status == 200,
             "duration": duration,
-            "status_code": response.status_code,
+            "status_code": response.status,
             "email": user_data["email"],
             "password": user_data["password"],
-            "response": response.text
+            "response": body,
+            "server_timing": parse_server_timing(response.headers.get("Server-Timing"))
         }
-    except requests.Timeout:
-        end_time = time.time()
+    except asyncio.TimeoutError:
         logger.error(f"Request timed out for {user_data['email']}")
         return {
             "success": False,
-            "duration": end_time - start_time,
+            "duration": time.perf_counter() - start_time,
             "status_code": 408,
             "email": user_data["email"],
             "password": user_data["password"],
             "error": "Request timed out"
         }
     except Exception as e:
-        end_time = time.time()
         logger.error(f"Exception during registration: {str(e)}")
         return {
             "success": False,
-            "duration": end_time - start_time,
+            "duration": time.perf_counter() - start_time,
             "error": str(e),
             "email": user_data["email"],
             "password": user_data["password"]
         }
 
-async def run_register_test(num_requests: int, concurrent_requests: int, base_url: str) -> dict:
+async def run_register_test(num_requests: int, concurrent_requests: int, base_url: str,
+                            mode: str = CLOSED_LOOP, arrival_rate: float = None, progress=None) -> dict:
     """Run register benchmark test"""
-    logger.info(f"Starting load test with {num_requests} requests ({concurrent_requests} concurrent)")
+    logger.info(f"Starting load test with {num_requests} requests ({concurrent_requests} concurrent, {mode}-loop)")
     
-    # Generate test users
+    # Generate test users up front so payload generation is not timed
     test_users = [generate_fake_user() for _ in range(num_requests)]
-    total_start_time = time.time()
-    
-    # Run requests using ThreadPoolExecutor
-    results = []
-    with ThreadPoolExecutor(max_workers=concurrent_requests) as executor:
-        futures = [executor.submit(register_user, user, base_url) for user in test_users]
-        for future in futures:
-            results.append(future.result())
-    
-    # Calculate metrics
-    total_duration = time.time() - total_start_time
-    successful_requests = [r for r in results if r["success"]]
-    failed_requests = [r for r in results if not r["success"]]
-    
-    durations = [r["duration"] for r in results if r["success"]]
-    if durations:
-        avg_duration = statistics.mean(durations)
-        min_duration = min(durations)
-        max_duration = max(durations)
-    else:
-        avg_duration = min_duration = max_duration = 0
+    engine = LoadEngine(concurrent_requests, mode=mode, arrival_rate=arrival_rate)
+
+    total_start_time = time.perf_counter()
+    results = await engine.run(
+        num_requests,
+        lambda session, i: register_user(session, test_users[i], base_url),
+        progress=progress
+    )
+    total_duration = time.perf_counter() - total_start_time
+
+    summary = summarize(results, total_duration)
     
     # Log results
     logger.info("\nLoad Test Results:")
     logger.info("=" * 50)
     logger.info(f"Total Time: {total_duration:.2f} seconds")
     logger.info(f"Total Requests: {num_requests}")
-    logger.info(f"Successful Requests: {len(successful_requests)}")
-    logger.info(f"Failed Requests: {len(failed_requests)}")
-    logger.info(f"Requests per Second: {num_requests/total_duration:.2f}")
+    logger.info(f"Successful Requests: {summary['successful_requests']}")
+    logger.info(f"Failed Requests: {summary['failed_requests']}")
+    logger.info(f"Requests per Second: {summary['requests_per_second']:.2f}")
     logger.info("\nResponse Time Statistics (seconds):")
-    logger.info(f"Average: {avg_duration:.3f}")
-    logger.info(f"Min: {min_duration:.3f}")
-    logger.info(f"Max: {max_duration:.3f}")
+    logger.info(f"Average: {summary['avg_duration']:.3f}")
+    logger.info(f"Min: {summary['min_duration']:.3f}")
+    logger.info(f"Max: {summary['max_duration']:.3f}")
+    for name, value in summary["percentiles"].items():
+        logger.info(f"{name}: {value:.3f}")
     
     return {
-        "total_duration": total_duration,
-        "successful_requests": len(successful_requests),
-        "failed_requests": len(failed_requests),
-        "avg_duration": avg_duration,
-        "min_duration": min_duration,
-        "max_duration": max_duration,
-        "requests_per_second": num_requests/total_duration,
+        **summary,
+        "mode": mode,
+        "arrival_rate": arrival_rate,
         "detailed_results": results
     }
 
@@ -137,5 +120,4 @@ if __name__ == "__main__":
     CONCURRENT_REQUESTS = 10
     BASE_URL = "http://localhost:8000"
     
-    import asyncio
     asyncio.run(run_register_test(NUM_REQUESTS, CONCURRENT_REQUESTS, BASE_URL)) 
\ No newline at end of file
@@ -11,6 +11,7 @@ let currentTestData = {
 let isPollingLogs = false;
 let logPollingInterval;
 let isRunningTest = false;
+let currentJobId = null;
 
 
 let lastSeenLogs = new Set();
@@ -27,8 +28,71 @@ document.addEventListener('DOMContentLoaded', function() {
     
     const form = document.getElementById('benchmarkForm');
     form.addEventListener('submit', handleFormSubmit);
+
+    document.getElementById('cancelJobButton').addEventListener('click', cancelCurrentJob);
+
+    const socket = io();
+    socket.on('benchmark_progress', updateJobProgress);
+    socket.on('benchmark_finished', handleJobFinished);
+
+    loadScenarios();
 });
 
+async function loadScenarios() {
+    try {
+        const response = await fetch('/api/scenarios');
+        const scenarios = await response.json();
+        document.getElementById('scenarioOptions').innerHTML =
+            scenarios.map(name => `<option value="${name}">`).join('');
+    } catch (error) {
+        console.error('Error loading scenarios:', error);
+    }
+}
+
+function updateJobProgress(job) {
+    if (job.job_id !== currentJobId) return;
+
+    const done = job.total_requests ? (job.completed / job.total_requests) * 100 : 0;
+    document.getElementById('jobProgress').classList.remove('d-none');
+    document.getElementById('jobProgressBar').style.width = `${done.toFixed(0)}%`;
+    document.getElementById('jobProgressText').textContent =
+        `${job.status}: ${job.completed}/${job.total_requests} done, ${job.failed} failed, ` +
+        `${job.current_rps.toFixed(1)} req/s, p50 ${job.percentiles.p50.toFixed(3)}s, ` +
+        `p90 ${job.percentiles.p90.toFixed(3)}s, p99 ${job.percentiles.p99.toFixed(3)}s`;
+}
+
+async function handleJobFinished(job) {
+    if (job.job_id !== currentJobId) return;
+
+    updateJobProgress(job);
+    document.getElementById('cancelJobButton').disabled = true;
+    if (job.status === 'failed') {
+        showError(job.error || 'Benchmark failed');
+    }
+
+    currentJobId = null;
+    isRunningTest = false;
+    document.querySelector('#benchmarkForm button[type="submit"]').disabled = false;
+
+    clearInterval(logPollingInterval);
+    logPollingInterval = setInterval(pollLogs, 2000);
+    await refreshHistory();
+    await updateMetrics();
+}
+
+async function cancelCurrentJob() {
+    if (!currentJobId) return;
+    try {
+        const response = await fetch(`/api/benchmark/jobs/${currentJobId}/cancel`, { method: 'POST' });
+        const result = await response.json();
+        if (!response.ok) {
+            showError(result.error);
+        }
+    } catch (error) {
+        showError(`Failed to cancel benchmark: ${error.message}`);
+    }
+}
+
 function initializeCharts() {
     
     responseTimeChart = new ApexCharts(document.querySelector("#responseTimeChart"), {
@@ -207,7 +271,10 @@ async function handleFormSubmit(e) {
         test_type: formData.get('test_type'),
         num_requests: parseInt(formData.get('num_requests')),
         concurrent_requests: parseInt(formData.get('concurrent_requests')),
-        base_url: formData.get('base_url')
+        base_url: formData.get('base_url'),
+        mode: formData.get('mode'),
+        arrival_rate: formData.get('arrival_rate') ? parseFloat(formData.get('arrival_rate')) : null,
+        scenario: formData.get('scenario') || null
     };
 
     try {
@@ -235,28 +302,24 @@ async function handleFormSubmit(e) {
         if (result.error) {
             showError(result.error);
             isRunningTest = false;
+            submitButton.disabled = false;
         } else {
-            // Start more frequent polling during test
+            // Progress and completion now arrive over Socket.IO
+            currentJobId = result.job_id;
+            document.getElementById('cancelJobButton').disabled = false;
+            updateJobProgress({
+                job_id: result.job_id, status: result.status, completed: 0, failed: 0,
+                total_requests: data.num_requests, current_rps: 0,
+                percentiles: { p50: 0, p90: 0, p99: 0 }
+            });
+
             clearInterval(logPollingInterval);
             logPollingInterval = setInterval(pollLogs, 500); // Poll every 500ms during test
-            
-            // Wait for test to complete
-            await new Promise(resolve => setTimeout(resolve, 1000));
-            await refreshHistory();
-            await updateMetrics();  // Add metrics update
-            
-            // Reset polling interval
-            clearInterval(logPollingInterval);
-            logPollingInterval = setInterval(pollLogs, 2000);
-            isRunningTest = false;
         }
     } catch (error) {
         showError(`Failed to start benchmark: ${error.message}`);
         isRunningTest = false;
-    } finally {
-        // Re-enable the submit button
-        const submitButton = e.target.querySelector('button[type="submit"]');
-        submitButton.disabled = false;
+        e.target.querySelector('button[type="submit"]').disabled = false;
     }
 }
 
@@ -0,0 +1,87 @@
+"""Crypto micro-benchmarks for CloudBackend's encryption module.
+
+Times encrypt_with_public_key for RSA and X25519 keys in-process, without
+HTTP, across payload sizes from a phone number up to a large
+medical_conditions JSON, and public-key parsing of the binary key format
+against the legacy PEM bundles. Keys are generated locally in the key
+server's formats, so no key server is needed.
+
+Run from the CloudBackend directory:
+    python -m benchmarks.crypto_bench [--json results.json] [--min-time 0.5] [-k filter]
+"""
+import base64
+import sys
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa, x25519
+
+from benchmarks import harness
+from benchmarks.harness import PAYLOADS, RSA_OAEP_MAX_PLAINTEXT
+from services.encryption import encrypt_with_public_key, load_public_key
+
+
+def _public_pem(key) -> bytes:
+    return key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+
+def rsa_public_key() -> str:
+    """Base64 DER public key as returned by the key server"""
+    public_key = rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key()
+    return base64.b64encode(public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )).decode('utf-8')
+
+
+def x25519_public_key() -> str:
+    """Base64 raw X25519 public key as returned by the key server"""
+    return base64.b64encode(x25519.X25519PrivateKey.generate().public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )).decode('utf-8')
+
+
+def legacy_public_keys():
+    """Base64 PEM public keys as stored before the binary format, the
+    X25519 one bundled with an unused Ed25519 key"""
+    rsa_pem = _public_pem(rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key())
+    x25519_bundle = (_public_pem(x25519.X25519PrivateKey.generate().public_key()) + b"\n"
+                     + _public_pem(ed25519.Ed25519PrivateKey.generate().public_key()))
+    return {
+        "rsa": base64.b64encode(rsa_pem).decode('utf-8'),
+        "x25519": base64.b64encode(x25519_bundle).decode('utf-8'),
+    }
+
+
+def collect_benchmarks():
+    """(group, name, params, fn, setup) for every case; fn is None when skipped"""
+    public_keys = {"rsa": rsa_public_key(), "x25519": x25519_public_key()}
+    legacy = legacy_public_keys()
+    cases = []
+    for algorithm, public_key in public_keys.items():
+        # Uncached parse of each stored format; params carry the stored size
+        for key_format, key in (("legacy_pem", legacy[algorithm]), ("binary", public_key)):
+            params = {"algorithm": algorithm, "format": key_format, "stored_bytes": len(key)}
+            cases.append(("key_parsing", f"load_public_key_{algorithm}[{key_format}]", params,
+                          lambda k=key: load_public_key.__wrapped__(k), None))
+
+        for payload_name, payload in PAYLOADS.items():
+            params = {"algorithm": algorithm, "payload": payload_name, "payload_bytes": len(payload.encode())}
+            name = f"encrypt_{algorithm}[{payload_name}]"
+            if algorithm == "rsa" and len(payload.encode()) > RSA_OAEP_MAX_PLAINTEXT:
+                cases.append(("encryption", name, params, None, None))
+                continue
+            cases.append(("encryption", name, params,
+                          lambda k=public_key, p=payload: encrypt_with_public_key(k, p), None))
+    return cases
+
+
+def main(argv=None):
+    harness.main(__doc__.splitlines()[0], collect_benchmarks, argv, width=44)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,117 @@
+"""Registration pipeline benchmark: sequential vs overlapped.
+
+Times the secret-handling part of /register (key-server call, three
+encryptions, bcrypt) done one after another, as it used to be, and through
+services.registration.prepare_registration. The key server is simulated
+with a sleep of --keygen-ms around a locally generated key, or called for
+real with --keyserver. Exits non-zero when the pipeline is not close to
+max(bcrypt, key generation + encryption).
+
+Run from the CloudBackend directory:
+    python -m benchmarks.register_bench [--rounds 10] [--keygen-ms 80] [--algorithm X25519] [--keyserver URL]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+import requests
+
+from core import auth
+from core.models import schemas
+from services.registration import encrypt_profile, prepare_registration
+from benchmarks.crypto_bench import rsa_public_key, x25519_public_key
+from benchmarks.harness import MEDICAL_CONDITION
+
+# Allowed overshoot of the pipeline over max(bcrypt, keygen + encrypt)
+TOLERANCE = 1.2
+
+
+def make_user() -> schemas.UserCreate:
+    return schemas.UserCreate(
+        first_name="Bench",
+        last_name="User",
+        email=f"bench-{uuid.uuid4().hex[:12]}@example.com",
+        user_type="patient",
+        identity_type="nid",
+        identity_number="19901234567890123",
+        phone_number="+8801712345678",
+        medical_conditions=[MEDICAL_CONDITION],
+        dob="1990-01-01",
+        password="benchmark-password",
+    )
+
+
+def simulated_key_server(keygen_ms: float, algorithm: str):
+    public_key = x25519_public_key() if algorithm == "X25519" else rsa_public_key()
+
+    def request_public_key(user_email: str):
+        time.sleep(keygen_ms / 1000)
+        return public_key, None
+    return request_public_key
+
+
+def real_key_server(url: str):
+    def request_public_key(user_email: str):
+        response = requests.post(f"{url}/generate-key-pair", params={"user_email": user_email})
+        response.raise_for_status()
+        body = response.json()
+        return body["encoded_public_key"], body.get("key_epoch")
+    return request_public_key
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--keygen-ms", type=float, default=80, help="Simulated key-server latency")
+    parser.add_argument("--algorithm", choices=("X25519", "RSA"), default="X25519",
+                        help="Key type of the simulated key server")
+    parser.add_argument("--keyserver", help="Use this key server instead of the simulation")
+    args = parser.parse_args(argv)
+
+    request_public_key = real_key_server(args.keyserver) if args.keyserver else simulated_key_server(args.keygen_ms, args.algorithm)
+    public_key, _ = request_public_key(make_user().email)  # Warm up
+
+    phases = {"bcrypt": [], "keygen": [], "encrypt": [], "sequential": [], "pipelined": []}
+    for _ in range(args.rounds):
+        user = make_user()
+        phases["bcrypt"].append(timed(lambda: auth.get_password_hash(user.password)))
+        phases["keygen"].append(timed(lambda: request_public_key(make_user().email)))
+        phases["encrypt"].append(timed(lambda: encrypt_profile(public_key, user)))
+
+        def sequential():
+            key, _ = request_public_key(make_user().email)
+            encrypt_profile(key, user)
+            auth.get_password_hash(user.password)
+        phases["sequential"].append(timed(sequential))
+
+        pipeline_user = make_user()
+        phases["pipelined"].append(timed(lambda: asyncio.run(prepare_registration(pipeline_user, request_public_key))))
+
+    median = {name: statistics.median(values) for name, values in phases.items()}
+    expected = max(median["bcrypt"], median["keygen"] + median["encrypt"])
+
+    print(f"{'phase':<12}{'median ms':>12}")
+    for name, value in median.items():
+        print(f"{name:<12}{value * 1000:>12.1f}")
+    print(f"\nmax(bcrypt, keygen + encrypt) = {expected * 1000:.1f}ms, "
+          f"sum = {(median['bcrypt'] + median['keygen'] + median['encrypt']) * 1000:.1f}ms, "
+          f"pipelined = {median['pipelined'] * 1000:.1f}ms "
+          f"({median['sequential'] / median['pipelined']:.2f}x faster than sequential)")
+
+    if median["pipelined"] > expected * TOLERANCE:
+        print(f"FAIL: pipeline is more than {TOLERANCE:g}x the slowest branch")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
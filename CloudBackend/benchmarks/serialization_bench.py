@@ -0,0 +1,110 @@
+"""Serialization micro-benchmark for CloudBackend responses.
+
+Compares FastAPI's default path (jsonable_encoder + JSONResponse) against
+FastJSONResponse for the payloads of the history, stats and user-info routes.
+
+Run from the CloudBackend directory:
+    python -m benchmarks.serialization_bench [iterations]
+"""
+import sys
+import time
+from datetime import date
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from core.models import schemas
+from core.responses import FastJSONResponse
+
+
+def build_history_payload():
+    vaccination_history = []
+    for code in ["BCG", "PENTAVALENT", "OPV", "PCV", "IPV", "MR"]:
+        vaccination_history.append({
+            "vaccine_code": code,
+            "vaccine_name": f"{code} Vaccine",
+            "doses": [
+                {
+                    "dose_number": i,
+                    "vaccination_date": date(2024, i, 1) if i < 3 else None,
+                    "is_taken": i < 3,
+                }
+                for i in range(1, 6)
+            ],
+        })
+    return schemas.VaccinationFullHistoryResponse(
+        user_info=schemas.UserInfoResponseNoLogin(
+            user_name="Jane Doe", user_email="jane@example.com"
+        ),
+        vaccination_history=vaccination_history,
+    )
+
+
+def build_stats_payload():
+    return {
+        "monthly_data": [{"month": m, "vaccinations": m * 17} for m in range(1, 13)],
+        "vaccine_distribution": [
+            {"name": f"Vaccine {i}", "value": i * 31} for i in range(6)
+        ],
+    }
+
+
+def build_user_info_payload():
+    return schemas.UserInfoResponse(
+        first_name="Jane",
+        last_name="Doe",
+        user_type="1",
+        identity_type="nid",
+        identity_number="12345678901234567",
+        phone_number="+8801712345678",
+        email="jane@example.com",
+        medical_conditions=[
+            {
+                "condition_name": "Asthma",
+                "details": "Mild, seasonal",
+                "severity": "low",
+                "diagnosed_date": "2015-04-01",
+            }
+        ],
+        dob=date(1990, 1, 1),
+        public_key="LS0tLS1CRUdJTiBQVUJMSUMgS0VZLS0tLS0K" * 8,
+    )
+
+
+def default_render(payload) -> bytes:
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def fast_render(payload) -> bytes:
+    return FastJSONResponse(payload).body
+
+
+def measure(render, payload, iterations: int):
+    render(payload)  # warm up
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        total_bytes += len(render(payload))
+    elapsed = time.perf_counter() - start
+    return total_bytes / elapsed, iterations / elapsed
+
+
+def main(iterations: int = 20000):
+    payloads = {
+        "history": build_history_payload(),
+        "stats": build_stats_payload(),
+        "user_info": build_user_info_payload(),
+    }
+
+    print(f"{'route':<12}{'default MB/s':>14}{'fast MB/s':>12}{'default req/s':>16}{'fast req/s':>14}{'speedup':>10}")
+    for route, payload in payloads.items():
+        default_bps, default_rps = measure(default_render, payload, iterations)
+        fast_bps, fast_rps = measure(fast_render, payload, iterations)
+        print(
+            f"{route:<12}{default_bps / 1e6:>14.2f}{fast_bps / 1e6:>12.2f}"
+            f"{default_rps:>16.0f}{fast_rps:>14.0f}{fast_bps / default_bps:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
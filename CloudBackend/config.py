@@ -9,7 +9,22 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 200))
 
+# One key server URL, or several comma-separated replicas sharing one key database
 KEYSERVER = os.getenv("KEYSERVER")
+KEYSERVERS = [url.strip().rstrip("/") for url in (KEYSERVER or "").split(",") if url.strip()]
+
+# Key-server client (services/key_server.py)
+KEYSERVER_CONNECT_TIMEOUT = float(os.getenv("KEYSERVER_CONNECT_TIMEOUT", 2))
+KEYSERVER_READ_TIMEOUT = float(os.getenv("KEYSERVER_READ_TIMEOUT", 10))
+KEYSERVER_BATCH_READ_TIMEOUT = float(os.getenv("KEYSERVER_BATCH_READ_TIMEOUT", 120))  # /generate-key-pairs, /reencrypt-batch
+KEYSERVER_ROUTING = os.getenv("KEYSERVER_ROUTING", "least_latency")  # or round_robin
+# Consecutive failures that open a replica's circuit, and seconds before it is probed again
+KEYSERVER_BREAKER_FAILURES = int(os.getenv("KEYSERVER_BREAKER_FAILURES", 5))
+KEYSERVER_BREAKER_RESET = float(os.getenv("KEYSERVER_BREAKER_RESET", 30))
+# Decrypts still running after the replica's p95 (never sooner than the
+# minimum) are sent again, to another replica when there is one
+KEYSERVER_HEDGING = os.getenv("KEYSERVER_HEDGING", "true").lower() == "true"
+KEYSERVER_HEDGE_MIN_DELAY = float(os.getenv("KEYSERVER_HEDGE_MIN_DELAY", 0.05))
 
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
@@ -27,7 +42,42 @@ print(f"SERVER_PORT: {SERVER_PORT}")
 print(f"FRONTEND_URL: {FRONTEND_URL}")
 print(f"ENVIRONMENT: {ENVIRONMENT}")
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_SERVER}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL overrides the Postgres settings, e.g. sqlite:///./cloud.db for offline benchmarks
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_SERVER}:{DB_PORT}/{DB_NAME}"
+
+# The encryption scheme follows each user's key, whose type the key
+# server's ENCRYPTION_METHOD picks; there is no setting for it here
+
+# Distributed tracing (core/tracing.py): spans go to a JSON-lines file or,
+# for an http(s) URL, to an OTLP/HTTP collector such as http://localhost:4318/v1/traces
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "traces.jsonl")
+SERVICE_NAME = os.getenv("SERVICE_NAME", "cloud-backend")
+
+# Sampling profiler (core/profiling.py). /debug/profile only exists when
+# PROFILING_ENABLED is set and needs PROFILE_TOKEN in the X-Profile-Token header
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+# Continuous low-rate sampling to PROFILE_DIR, one file per PROFILE_PERIOD seconds
+PROFILE_CONTINUOUS = os.getenv("PROFILE_CONTINUOUS", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.05))
+PROFILE_PERIOD = float(os.getenv("PROFILE_PERIOD", 60))
+
+# Bulk patient import (services/bulk_import.py): rows per key-server batch
+# and insert, threads for encryption and bcrypt, row errors kept per job
+BULK_IMPORT_CHUNK_SIZE = int(os.getenv("BULK_IMPORT_CHUNK_SIZE", 500))
+BULK_IMPORT_WORKERS = int(os.getenv("BULK_IMPORT_WORKERS", os.cpu_count() or 4))
+BULK_IMPORT_MAX_ERRORS = int(os.getenv("BULK_IMPORT_MAX_ERRORS", 1000))
+
+# Re-encryption job (services/reencryption.py): users per key-server batch,
+# users per second, user errors kept per job
+REENCRYPT_BATCH_SIZE = int(os.getenv("REENCRYPT_BATCH_SIZE", 200))
+REENCRYPT_RATE = float(os.getenv("REENCRYPT_RATE", 100))
+REENCRYPT_MAX_ERRORS = int(os.getenv("REENCRYPT_MAX_ERRORS", 1000))
 
-# Add encryption method configuration
-ENCRYPTION_METHOD = "os.getenv('ENCRYPTION_METHOD')"  # Default to RSA for backward compatibility
\ No newline at end of file
+# uvicorn workers started by `python main.py`. With more than one, metrics
+# are kept per process in PROMETHEUS_MULTIPROC_DIR (emptied at startup) and
+# /metrics aggregates them; set it yourself when running uvicorn --workers
+WORKERS = int(os.getenv("WORKERS", 4))
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "prometheus_multiproc")
@@ -5,6 +5,7 @@ from fastapi import Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 from core.models.models import User
+from core.timing import timed_phase
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -16,12 +17,15 @@ def create_access_token(data: str):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+@timed_phase("auth")
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+@timed_phase("auth")
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+@timed_phase("auth")
 def get_current_user(token, db):
     try:
         # Decode JWT token
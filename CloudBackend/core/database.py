@@ -1,20 +1,31 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
 
 from config import SQLALCHEMY_DATABASE_URL
 
-# Configure the engine with explicit pool settings
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=10,        # Moderate pool size for t3.small
-    max_overflow=20,     # Allow more overflow connections
-    pool_timeout=30,     # Standard timeout is sufficient
-    pool_pre_ping=True,  # Keep connection health checks
-    pool_recycle=3600,   # 1 hour recycle is fine with more memory
-)
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    # Local stand-in for offline benchmarks; requests run on a threadpool
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _enable_wal(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+else:
+    # Configure the engine with explicit pool settings
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        poolclass=QueuePool,
+        pool_size=10,        # Moderate pool size for t3.small
+        max_overflow=20,     # Allow more overflow connections
+        pool_timeout=30,     # Standard timeout is sufficient
+        pool_pre_ping=True,  # Keep connection health checks
+        pool_recycle=3600,   # 1 hour recycle is fine with more memory
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -22,12 +22,42 @@ KEY_SERVER_LATENCY = Histogram(
 CONCURRENT_OPERATIONS = Gauge(
     "concurrent_crypto_operations",
     "Number of concurrent cryptographic operations",
-    ["operation_type"]
+    ["operation_type"],
+    multiprocess_mode="livesum"  # Sum over running workers
 )
 
 # Key Server Health Metrics
 KEY_SERVER_ERRORS = Counter(
     "key_server_errors_total",
     "Total number of key server errors",
-    ["error_type"]
-) 
\ No newline at end of file
+    ["error_type"]  # timeout, connection, unavailable (502/503/504), server_error (other 5xx), circuit_open
+)
+
+# Circuit breaker per key-server replica: 0 closed, 1 open, 2 half-open (probing)
+KEY_SERVER_CIRCUIT_STATE = Gauge(
+    "key_server_circuit_state",
+    "Circuit breaker state per key-server replica",
+    ["replica"],
+    multiprocess_mode="max"  # Worst state over the workers
+)
+
+KEY_SERVER_HEDGES = Counter(
+    "key_server_hedged_requests_total",
+    "Decrypts sent again after the hedge delay (result=sent), and how often the hedge answered first (result=won)",
+    ["result"]
+)
+
+# Exclusive time per request phase (auth, db, keyserver, crypto, serialize), see core/timing.py
+REQUEST_PHASE_TIME = Histogram(
+    "request_phase_duration_seconds",
+    "Time spent in each phase of a request",
+    ["phase", "route"]
+)
+
+# Key-server calls joined onto an identical in-flight call (result="coalesced")
+# versus actually sent (result="leader"), see core/singleflight.py
+SINGLE_FLIGHT_REQUESTS = Counter(
+    "keyserver_singleflight_requests_total",
+    "Key-server calls by whether they were sent or coalesced",
+    ["operation", "result"]
+)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Boolean, Text, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Boolean, Text, UniqueConstraint, LargeBinary
+from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import JSON
 from core.database import Base
@@ -11,12 +12,18 @@ class User(Base):
     email = Column(String(255), unique=True, index=True)
     user_type = Column(String(50))  # patient, vaccinator, admin
     identity_type = Column(String(50))  # national_id, passport, etc.
-    identity_number = Column(Text)  # Encrypted
-    phone_number = Column(Text, nullable=True)  # Encrypted
-    medical_conditions = Column(Text, nullable=True)  # Encrypted JSON
+    # Versioned binary ciphertexts, see services/encryption.py
+    identity_number_bin = Column(LargeBinary, nullable=True)
+    phone_number_bin = Column(LargeBinary, nullable=True)
+    medical_conditions_bin = Column(LargeBinary, nullable=True)  # JSON
+    # Legacy base64 ciphertexts, NULL once migrated by scripts/migrate_binary_storage.py
+    identity_number = Column(Text, nullable=True)
+    phone_number = Column(Text, nullable=True)
+    medical_conditions = Column(Text, nullable=True)
     dob = Column(Date)
     hashed_password = Column(String(255))
-    public_key = Column(Text)
+    public_key = Column(Text)  # Base64 raw X25519 or DER RSA key (PEM bundle before migration)
+    key_epoch = Column(Integer, nullable=True)  # Set when the key server derives the key instead of storing it
 
 class VaccinationType(Base):
     __tablename__ = "vaccine_types"
@@ -47,4 +54,38 @@ class VaccinationHistory(Base):
 
     __table_args__ = (
         UniqueConstraint('user_email', 'vaccine_type_id', 'dose_number', name='_user_vaccine_dose_unique'),
-    )
\ No newline at end of file
+    )
+
+
+class ImportJob(Base):
+    """Progress of one bulk patient import, see services/bulk_import.py"""
+    __tablename__ = "import_jobs"
+    id = Column(String(32), primary_key=True)
+    created_by = Column(String(255), ForeignKey("users.email"))
+    format = Column(String(10))  # csv or ndjson
+    status = Column(String(20))  # queued, running, completed, failed
+    processed = Column(Integer, default=0)  # Rows read so far
+    imported = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    errors = Column(JSON, default=list)  # [{"line", "email", "error"}], capped at BULK_IMPORT_MAX_ERRORS
+    detail = Column(Text, nullable=True)  # Why the whole job failed
+    created_at = Column(DateTime, default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+
+class ReencryptionJob(Base):
+    """Progress of one run of scripts/reencrypt.py, see services/reencryption.py"""
+    __tablename__ = "reencryption_jobs"
+    id = Column(String(32), primary_key=True)
+    target_algorithm = Column(String(10))  # X25519 or RSA
+    min_key_epoch = Column(Integer, nullable=True)  # Derived keys of older epochs are replaced too
+    status = Column(String(20))  # running, paused, completed, failed
+    last_user_id = Column(Integer, default=0)  # Checkpoint: users up to this id are done
+    processed = Column(Integer, default=0)  # Users read so far
+    reencrypted = Column(Integer, default=0)
+    skipped = Column(Integer, default=0)  # Already under the target algorithm
+    failed = Column(Integer, default=0)  # Key-server errors and rows changed meanwhile; rerun to retry
+    errors = Column(JSON, default=list)  # [{"user_id", "email", "error"}], capped at REENCRYPT_MAX_ERRORS
+    detail = Column(Text, nullable=True)  # Why the whole job failed
+    created_at = Column(DateTime, default=func.now())
+    finished_at = Column(DateTime, nullable=True)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from datetime import date
+from datetime import date, datetime
 from typing import Optional, List, Dict, Any
 from enum import Enum
 
@@ -63,6 +63,19 @@ class UserInfoResponse(BaseModel):
         from_attributes = True
         arbitrary_types_allowed = True
 
+class UserInfoFieldsResponse(BaseModel):
+    """UserInfoResponse restricted to the fields asked for with ?fields="""
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    user_type: Optional[Any] = None
+    identity_type: Optional[str] = None
+    identity_number: Optional[str] = None
+    phone_number: Optional[str] = None
+    email: Optional[str] = None
+    medical_conditions: Optional[Any] = None
+    dob: Optional[Any] = None
+    public_key: Optional[str] = None
+
 class UserUpdate(BaseModel):
     first_name: str
     last_name: str
@@ -114,3 +127,25 @@ class UserInfoUpdate(BaseModel):
         from_attributes = True
         
         
+
+
+class ImportRowError(BaseModel):
+    line: int
+    email: Optional[str] = None
+    error: str
+
+class BulkImportJobResponse(BaseModel):
+    job_id: str = Field(validation_alias="id")
+    status: str
+    format: str
+    processed: int
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+    detail: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+        populate_by_name = True
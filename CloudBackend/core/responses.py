@@ -0,0 +1,29 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from core.timing import phase
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, pydantic_core is always available
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that skips jsonable_encoder and the stdlib json module.
+
+    Pydantic models are serialized straight to bytes by pydantic_core, plain
+    dicts/lists go through orjson when it is installed. Routes opt in by
+    returning FastJSONResponse(content) directly.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with phase("serialize"):
+            if isinstance(content, BaseModel):
+                return content.__pydantic_serializer__.to_json(content)
+            if orjson is not None:
+                return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+            return to_json(content)
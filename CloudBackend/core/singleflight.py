@@ -0,0 +1,47 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, TypeVar
+
+from core.metrics import SINGLE_FLIGHT_REQUESTS
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution.
+
+    The first caller runs `fn`; callers arriving while it is in flight
+    block on its Future and get the same result or exception. The key is
+    dropped as soon as the call completes, so no result outlives it.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            SINGLE_FLIGHT_REQUESTS.labels(operation=self.operation, result="coalesced").inc()
+            return future.result()
+
+        SINGLE_FLIGHT_REQUESTS.labels(operation=self.operation, result="leader").inc()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._forget(key)
+            future.set_exception(e)
+            raise
+        self._forget(key)
+        future.set_result(result)
+        return result
+
+    def _forget(self, key: Hashable):
+        with self._lock:
+            del self._calls[key]
@@ -0,0 +1,150 @@
+import asyncio
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+from core.metrics import REQUEST_PHASE_TIME
+from core.tracing import span
+
+# Phases that are calls to another service are traced as client spans
+PHASE_SPAN_KINDS = {"keyserver": "client"}
+
+# Phase totals of the request being handled: name -> [seconds, count]
+_request_phases: ContextVar[Optional[Dict[str, List]]] = ContextVar("request_phases", default=None)
+# Innermost open phase, so nested phases are subtracted from their parent
+_current_phase: ContextVar[Optional["_OpenPhase"]] = ContextVar("current_phase", default=None)
+
+
+class _OpenPhase:
+    __slots__ = ("child_time",)
+
+    def __init__(self):
+        self.child_time = 0.0
+
+
+def _add(name: str, seconds: float):
+    phases = _request_phases.get()
+    if phases is None:
+        # Outside a request there is no header to add to, observe directly
+        REQUEST_PHASE_TIME.labels(phase=name, route="").observe(seconds)
+        return
+    totals = phases.setdefault(name, [0.0, 0])
+    totals[0] += seconds
+    totals[1] += 1
+
+
+def record_phase(name: str, seconds: float):
+    """Attribute an already measured leaf phase to the current request"""
+    parent = _current_phase.get()
+    if parent is not None:
+        parent.child_time += seconds
+    _add(name, seconds)
+
+
+@contextmanager
+def phase(name: str):
+    """Time a block as one phase (auth, db, keyserver, crypto, serialize).
+
+    Phases nest: time spent in an inner phase counts only towards the
+    inner one, so per-phase totals add up to the request time. Each phase
+    is also a tracing span when tracing is enabled.
+    """
+    parent = _current_phase.get()
+    current = _OpenPhase()
+    token = _current_phase.set(current)
+    start = time.perf_counter()
+    try:
+        with span(name, PHASE_SPAN_KINDS.get(name, "internal")):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_phase.reset(token)
+        if parent is not None:
+            parent.child_time += elapsed
+        _add(name, elapsed - current.child_time)
+
+
+def timed_phase(name: str):
+    """Decorator form of phase() for sync and async functions"""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with phase(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine):
+    """Count every SQL statement executed on `engine` as the db phase"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("query_start", None)
+        if start is not None:
+            record_phase("db", time.perf_counter() - start)
+
+
+def _server_timing(phases: Dict[str, List], total: float) -> str:
+    entries = [
+        f'{name};dur={seconds * 1000:.2f};desc="{count}x"'
+        for name, (seconds, count) in phases.items()
+    ]
+    # Whatever no phase claimed: routing, validation, response handling
+    other = total - sum(seconds for seconds, _ in phases.values())
+    entries.append(f"app;dur={max(other, 0) * 1000:.2f}")
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """Collects the phases of each HTTP request, adds them as a
+    Server-Timing header and observes them in REQUEST_PHASE_TIME.
+
+    Plain ASGI rather than BaseHTTPMiddleware so the endpoint runs in this
+    middleware's context and sees the per-request phase table.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        phases: Dict[str, List] = {}
+        token = _request_phases.set(phases)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                # Template path, not the raw one, to keep label cardinality bounded
+                route_path = getattr(route, "path", "unmatched")
+                for name, (seconds, _) in phases.items():
+                    REQUEST_PHASE_TIME.labels(phase=name, route=route_path).observe(seconds)
+                header = _server_timing(phases, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_phases.reset(token)
@@ -0,0 +1,254 @@
+# Vendored from shared/core/tracing.py; edit it there and run `python shared/sync.py`.
+import atexit
+import functools
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import requests
+from sqlalchemy import event
+
+from config import SERVICE_NAME, TRACE_EXPORT, TRACING_ENABLED
+
+# W3C trace context (https://www.w3.org/TR/trace-context/) so spans from
+# CloudBackend and the key server join into one trace
+TRACEPARENT = "traceparent"
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str = "internal"):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes: Dict = {}
+        self.error = False
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict:
+        return {
+            "service": SERVICE_NAME,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration": (self.end_ns - self.start_ns) / 1e9,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _Exporter:
+    """Ships finished spans from a background thread, in batches, either as
+    JSON lines appended to a file or as OTLP/HTTP JSON to a collector URL."""
+
+    BATCH_SIZE = 512
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, target: str):
+        self.target = target
+        self.queue: "queue.Queue[Span]" = queue.Queue(maxsize=100000)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def export(self, span: Span):
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            pass  # Never block a request on tracing
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.BATCH_SIZE:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        batch = self._drain()
+        while batch:
+            try:
+                if self.target.startswith(("http://", "https://")):
+                    requests.post(self.target, json=_otlp(batch), timeout=5)
+                else:
+                    with open(self.target, 'a') as f:
+                        f.writelines(json.dumps(span.to_dict()) + "\n" for span in batch)
+            except Exception as e:
+                print(f"Trace export failed: {e}")
+            batch = self._drain()
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp(spans) -> Dict:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{
+            "scope": {"name": "vaccine.tracing"},
+            "spans": [{
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": SPAN_KINDS[span.kind],
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+                "status": {"code": 2 if span.error else 0},
+            } for span in spans],
+        }],
+    }]}
+
+
+_exporter = _Exporter(TRACE_EXPORT) if TRACING_ENABLED else None
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent span id) from a traceparent header, or None"""
+    parts = (header or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def _start(name: str, kind: str, remote_parent=None) -> Span:
+    parent = _current_span.get()
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, kind)
+    if remote_parent:
+        return Span(name, remote_parent[0], remote_parent[1], kind)
+    return Span(name, os.urandom(16).hex(), None, kind)
+
+
+def _finish(span: Span):
+    span.end_ns = time.time_ns()
+    _exporter.export(span)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    """Trace a block as a child of the current span; yields None when
+    tracing is disabled"""
+    if _exporter is None:
+        yield None
+        return
+    current = _start(name, kind)
+    current.attributes.update(attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = True
+        current.set_attribute("error.type", type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current)
+
+
+def traced(name: str, kind: str = "internal"):
+    """Decorator form of span() for sync functions"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inject_headers(headers: Dict = None) -> Dict:
+    """Outgoing request headers carrying the current span as parent"""
+    headers = dict(headers or {})
+    current = _current_span.get()
+    if current is not None:
+        headers[TRACEPARENT] = f"00-{current.trace_id}-{current.span_id}-01"
+    return headers
+
+
+def trace_engine(engine):
+    """Record one db span per SQL statement executed on `engine`"""
+    if _exporter is None:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["trace_span"] = _start("db", "client")
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        current = conn.info.pop("trace_span", None)
+        if current is not None:
+            current.set_attribute("db.statement", statement[:200])
+            _finish(current)
+
+
+class TracingMiddleware:
+    """Opens a server span per HTTP request, continuing the caller's trace
+    when a traceparent header is present."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        remote_parent = parse_traceparent(headers.get(TRACEPARENT.encode(), b"").decode("latin-1"))
+        current = _start(f"{scope['method']} {scope['path']}", "server", remote_parent)
+        token = _current_span.set(current)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                current.set_attribute("http.status_code", message["status"])
+                current.error = message["status"] >= 500
+                route = scope.get("route")
+                if route is not None:
+                    current.name = f"{scope['method']} {route.path}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            current.error = True
+            raise
+        finally:
+            _current_span.reset(token)
+            _finish(current)
@@ -1,16 +1,19 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import prometheus_client
 from sqlalchemy.orm import Session
-from prometheus_fastapi_instrumentator import Instrumentator, metrics
-from prometheus_client import Counter, Histogram, Gauge, REGISTRY
-from fastapi.responses import Response
+from prometheus_fastapi_instrumentator import Instrumentator
+
 
 from core.database import SessionLocal, engine, Base
+from core.migrations import add_missing_columns
+from core.metrics_export import metrics_response, prepare_multiproc_dir
 from core.models.models import VaccinationType
+from core.timing import ServerTimingMiddleware, instrument_engine
+from core.tracing import TracingMiddleware, trace_engine
+from core.profiling import start_continuous_profiling
 import config
 
-from routes import auth_routes, vaccination_routes, user_routes
+from routes import auth_routes, vaccination_routes, user_routes, debug_routes
 
 # Create the FastAPI app
 app = FastAPI(
@@ -27,27 +30,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
-# Create database tables
+# Per-phase timings as Server-Timing headers and request_phase_duration_seconds
+app.add_middleware(ServerTimingMiddleware)
+instrument_engine(engine)
+
+# Spans per request, phase and SQL statement when TRACING_ENABLED is set
+app.add_middleware(TracingMiddleware)
+trace_engine(engine)
+
+# Create database tables, and columns added to existing ones since
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine, Base.metadata)
 
 # Include routers
 app.include_router(auth_routes.router, tags=["Authentication"])
 app.include_router(user_routes.router, prefix="/api/user", tags=["User Management"])
 app.include_router(vaccination_routes.router, prefix="/api/vaccinations", tags=["Vaccination Records"])
 
+# Opt-in profiling; each uvicorn worker samples itself
+if config.PROFILING_ENABLED:
+    app.include_router(debug_routes.router, prefix="/debug", tags=["Debug"])
+
+
+@app.on_event("startup")
+def start_profiling():
+    # In the workers only: `python main.py` also imports this module in the
+    # uvicorn supervisor, which serves no requests worth sampling
+    if config.PROFILE_CONTINUOUS:
+        start_continuous_profiling()
+
 
+# HTTP metrics from the instrumentator; the one /metrics route below
+# aggregates all uvicorn workers when PROMETHEUS_MULTIPROC_DIR is set
 instrumentator = Instrumentator()
-instrumentator.instrument(app).expose(app)
+instrumentator.instrument(app)
 
 
-@app.get("/metrics")
+@app.get("/metrics", include_in_schema=False)
 async def metrics():
-    return Response(
-        prometheus_client.generate_latest(REGISTRY),
-        media_type="text/plain"
-    )
+    return metrics_response()
 
 @app.get("/")
 async def root():
@@ -109,12 +133,15 @@ finally:
 
 if __name__ == "__main__":
     import uvicorn
+    if config.WORKERS > 1:
+        # Before the workers spawn, so they inherit it
+        prepare_multiproc_dir(config.PROMETHEUS_MULTIPROC_DIR)
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
         reload=False,  # Disable reload in production
-        workers=4,
+        workers=config.WORKERS,
         limit_concurrency=100,
         timeout_keep_alive=30,
         timeout_graceful_shutdown=30
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Tuple
 from datetime import datetime
 import json
 import time
-import requests
 from prometheus_client import Counter, Histogram
 from core.metrics import ENCRYPTION_TIME, ENCRYPTION_REQUESTS, KEY_SERVER_LATENCY, CONCURRENT_OPERATIONS
 
@@ -12,12 +12,32 @@ from core.database import get_db
 from core import auth
 from core.models.models import User
 from core.models import schemas
-from services.encryption import encrypt_with_public_key
-from config import KEYSERVER
+from services.registration import prepare_registration
+from services import key_server
 from core.utils import validate_identity
 
 router = APIRouter()
 
+def request_public_key(user_email: str) -> Tuple[str, Optional[int]]:
+    """Generate a key pair on the private key server, returning the public
+    key and, for a derived key, its epoch"""
+    key_server_start = time.time()
+    try:
+        key_response = key_server.generate_key_pair(user_email)
+    except key_server.KeyServerUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    KEY_SERVER_LATENCY.labels(operation_type="key_generation").observe(
+        time.time() - key_server_start
+    )
+
+    if key_response.status_code != 200:
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to generate encryption keys"
+        )
+    body = key_response.json()
+    return body["encoded_public_key"], body.get("key_epoch")
+
 @router.post("/register", response_model=schemas.UserResponse)
 async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     CONCURRENT_OPERATIONS.labels(operation_type="encryption").inc()
@@ -37,32 +57,8 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
                 detail="Email already registered"
             )
 
-        # Generate key pair from private key server
-        key_server_start = time.time()
-        key_response = requests.post(
-            f"{KEYSERVER}/generate-key-pair",
-            params={"user_email": user.email}
-        )
-        KEY_SERVER_LATENCY.labels(operation_type="key_generation").observe(
-            time.time() - key_server_start
-        )
-        
-        if key_response.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to generate encryption keys"
-            )
-        public_key = key_response.json()["encoded_public_key"]
-        
-        # Now encrypt sensitive data with the received public key
-        encrypted_identity = encrypt_with_public_key(public_key, user.identity_number)
-        encrypted_phone = encrypt_with_public_key(public_key, user.phone_number) if user.phone_number else None
-        
-        # Encrypt medical conditions if they exist
-        encrypted_medical_conditions = None
-        if user.medical_conditions:
-            medical_conditions_json = json.dumps([mc.dict() for mc in user.medical_conditions])
-            encrypted_medical_conditions = encrypt_with_public_key(public_key, medical_conditions_json)
+        # Key generation, encryption and bcrypt overlap, see prepare_registration
+        secrets = await prepare_registration(user, request_public_key)
 
         # Create user with encrypted data
         db_user = User(
@@ -71,17 +67,20 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
             email=user.email,
             user_type=user.user_type,
             identity_type=user.identity_type,
-            identity_number=encrypted_identity,
-            phone_number=encrypted_phone,
-            medical_conditions=encrypted_medical_conditions,
             dob=user.dob,
-            hashed_password=auth.get_password_hash(user.password),
-            public_key=public_key
+            **secrets
         )
 
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Registered concurrently since the check above
+            db.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail="Email already registered"
+            )
 
         ENCRYPTION_REQUESTS.labels(
             operation_type="registration",
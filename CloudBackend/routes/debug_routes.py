@@ -0,0 +1,41 @@
+# Vendored from shared/routes/debug_routes.py; edit it there and run `python shared/sync.py`.
+import asyncio
+import hmac
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from config import PROFILE_TOKEN
+from core.profiling import profile_for, to_collapsed, to_speedscope
+
+router = APIRouter()
+
+MAX_PROFILE_SECONDS = 60
+
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+    interval: float = Query(0.005, ge=0.001, le=1),
+    idle: bool = False,
+    x_profile_token: Optional[str] = Header(None),
+):
+    """Sample the worker handling this request for `seconds` and return
+    collapsed stacks or a speedscope file. Requires the X-Profile-Token header."""
+    if not PROFILE_TOKEN or not hmac.compare_digest(x_profile_token or "", PROFILE_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+    # Sample from a worker thread so this worker keeps serving requests meanwhile
+    counts = await asyncio.to_thread(profile_for, seconds, interval, idle)
+
+    name = f"pid {os.getpid()} {time.strftime('%Y-%m-%d %H:%M:%S')} ({seconds:g}s)"
+    if format == "speedscope":
+        return JSONResponse(
+            to_speedscope(counts, interval, name),
+            headers={"Content-Disposition": f'attachment; filename="profile-{os.getpid()}.speedscope.json"'},
+        )
+    return PlainTextResponse(to_collapsed(counts))
@@ -1,24 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import update
 from sqlalchemy.orm import Session
+import asyncio
 import json
-import requests
+import os
+import tempfile
 import time
+from typing import Any, Dict, List, Optional, Union
 
 from core.database import get_db
 from core.auth import get_current_user
-from core.models.models import User
+from core.models.models import ImportJob, User
 from core.models import schemas
-from services.encryption import encrypt_with_public_key
-from config import KEYSERVER
+from core.responses import FastJSONResponse
+from services.encryption import ENCRYPTED_FIELDS, encrypt_with_public_key, stored_ciphertext
+from services.bulk_import import FORMATS, start_import
+from services.key_server import KeyServerUnavailable, decrypt_batch
 from core.metrics import ENCRYPTION_TIME, ENCRYPTION_REQUESTS, KEY_SERVER_LATENCY, CONCURRENT_OPERATIONS
 
 router = APIRouter()
 
-@router.get("/info", response_model=schemas.UserInfoResponse)
-async def get_user_info(token: str, db: Session = Depends(get_db)):
+# Every UserInfoResponse field but ENCRYPTED_FIELDS is served straight from the row
+USER_INFO_FIELDS = tuple(schemas.UserInfoResponse.model_fields)
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Field names of a comma-separated ?fields= value, None for all"""
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in USER_INFO_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(USER_INFO_FIELDS)}"
+        )
+    return names
+
+def decrypt_fields(user: User, token: str, names) -> Dict[str, Any]:
+    """Plaintext of the encrypted columns of `user` named in `names`.
+
+    Only these are sent to the key server, all in one call. A missing or
+    undecryptable phone number reads as None and medical conditions as [],
+    as before.
+    """
+    names = [name for name in ENCRYPTED_FIELDS if name in names]
+    decrypted = {"phone_number": None, "medical_conditions": []}
+    decrypted = {name: decrypted.get(name) for name in names}
+    ciphertexts = {name: stored_ciphertext(user, name) for name in names}
+    stored = [name for name in names if ciphertexts[name] is not None]
+    if not stored:
+        return decrypted
+
+    try:
+        key_server_start = time.time()
+        response = decrypt_batch(user.email, token, [ciphertexts[name] for name in stored], user.key_epoch)
+        KEY_SERVER_LATENCY.labels(operation_type="decryption").observe(time.time() - key_server_start)
+
+        if response.status_code != 200:
+            results = [(None, response.text)] * len(stored)
+        else:
+            body = response.json()
+            results = list(zip(body["decrypted_data"], body["errors"]))
+
+        for name, (plaintext, error) in zip(stored, results):
+            if error is not None:
+                if name == "identity_number":
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Failed to decrypt identity number: {error}"
+                    )
+                continue
+            decrypted[name] = json.loads(plaintext) if name == "medical_conditions" else plaintext
+
+    except KeyServerUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to decrypt user data: {str(e)}"
+        )
+    return decrypted
+
+@router.get(
+    "/info",
+    response_model=Union[schemas.UserInfoResponse, schemas.UserInfoFieldsResponse],
+    response_class=FastJSONResponse,
+)
+async def get_user_info(token: str, fields: Optional[str] = None, db: Session = Depends(get_db)):
+    """The caller's profile. With ?fields=first_name,last_name only those
+    fields are returned, and only encrypted ones among them cost a key-server
+    call, so name-only lookups need none."""
     CONCURRENT_OPERATIONS.labels(operation_type="decryption").inc()
     start_time = time.time()
     try:
+        names = parse_fields(fields)
+
         # Get user email from token
         user_email = get_current_user(token, db)
         
@@ -27,83 +103,23 @@ async def get_user_info(token: str, db: Session = Depends(get_db)):
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Get decrypted data from key server
-        try:
-            start_time = time.time()
-            # Decrypt identity number
-            identity_response = requests.post(
-                f"{KEYSERVER}/decrypt-data",
-                json={
-                    "user_email": user_email,
-                    "token": token,
-                    "data": user.identity_number
-                }
-            )
-        
-            
-            if identity_response.status_code != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Failed to decrypt identity number: {identity_response.text}"
-                )
-            decrypted_identity = identity_response.json()["decrypted_data"]
-
-            # Decrypt phone number if exists
-            decrypted_phone = None
-            if user.phone_number:
-                phone_response = requests.post(
-                    f"{KEYSERVER}/decrypt-data",
-                    json={
-                        "user_email": user_email,
-                        "token": token,
-                        "data": user.phone_number
-                    }
-                )
-                if phone_response.status_code == 200:
-                    decrypted_phone = phone_response.json()["decrypted_data"]
-
-            # Decrypt medical conditions if exists
-            decrypted_medical_conditions = []
-            if user.medical_conditions:
-                med_response = requests.post(
-                    f"{KEYSERVER}/decrypt-data",
-                    json={
-                        "user_email": user_email,
-                        "token": token,
-                        "data": user.medical_conditions
-                    }
-                )
-                if med_response.status_code == 200:
-                    decrypted_med_data = med_response.json()["decrypted_data"]
-                    decrypted_medical_conditions = json.loads(decrypted_med_data)
-                    
-            response_time = time.time() - start_time
-            KEY_SERVER_LATENCY.labels(operation_type="decryption").observe(response_time)
-
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to decrypt user data: {str(e)}"
-            )
+        requested = names if names is not None else USER_INFO_FIELDS
+        values = {name: getattr(user, name) for name in requested if name not in ENCRYPTED_FIELDS}
+        # Off the event loop, so concurrent requests can share one decrypt
+        values.update(await asyncio.to_thread(decrypt_fields, user, token, requested))
 
-        user_info = schemas.UserInfoResponse(
-            first_name=user.first_name,
-            last_name=user.last_name,
-            email=user.email,
-            user_type=user.user_type,
-            identity_type=user.identity_type,
-            identity_number=decrypted_identity,
-            phone_number=decrypted_phone,
-            medical_conditions=decrypted_medical_conditions,
-            dob=user.dob,
-            public_key=user.public_key
-        )
+        if names is None:
+            user_info = schemas.UserInfoResponse(**values)
+            content = user_info
+        else:
+            user_info = schemas.UserInfoFieldsResponse(**values)
+            content = user_info.model_dump(mode="json", exclude_unset=True)
 
         ENCRYPTION_REQUESTS.labels(
             operation_type="decryption",
             status="success"
         ).inc()
-        return user_info
+        return FastJSONResponse(content)
     except Exception as e:
         ENCRYPTION_REQUESTS.labels(
             operation_type="decryption",
@@ -117,38 +133,105 @@ async def get_user_info(token: str, db: Session = Depends(get_db)):
         ).observe(time.time() - start_time)
         CONCURRENT_OPERATIONS.labels(operation_type="decryption").dec()
 
-@router.put("/update", response_model=schemas.UserInfoResponse)
+@router.put("/update", response_model=schemas.UserInfoResponse, response_class=FastJSONResponse)
 async def update_user_info(user_update: schemas.UserUpdate, db: Session = Depends(get_db)):
     try:
         # Get user from database
         user_email = get_current_user(user_update.token, db)
         
         user = db.query(User).filter(User.email == user_email).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
 
-        # Update non-sensitive fields
-        user.first_name = user_update.first_name
-        user.last_name = user_update.last_name
-        user.dob = user_update.dob
+        # Non-sensitive fields, written only when they differ
+        plain = {
+            "first_name": user_update.first_name,
+            "last_name": user_update.last_name,
+            "dob": user_update.dob,
+        }
+        changes = {name: value for name, value in plain.items() if getattr(user, name) != value}
 
-        # Encrypt and update sensitive fields
+        # Sensitive fields that were sent are encrypted and echoed back as given
+        given = {}
         if user_update.phone_number:
-            encrypted_phone = encrypt_with_public_key(user.public_key, user_update.phone_number)
-            user.phone_number = encrypted_phone
+            given["phone_number"] = user_update.phone_number
+            changes["phone_number_bin"] = encrypt_with_public_key(user.public_key, user_update.phone_number)
+            changes["phone_number"] = None  # Legacy column
 
-        # Update and encrypt medical conditions if provided
         if user_update.medical_conditions:
-            medical_conditions_json = json.dumps(user_update.medical_conditions)
-            encrypted_medical_conditions = encrypt_with_public_key(
+            given["medical_conditions"] = user_update.medical_conditions
+            changes["medical_conditions_bin"] = encrypt_with_public_key(
                 user.public_key, 
-                medical_conditions_json
+                json.dumps(user_update.medical_conditions)
             )
-            user.medical_conditions = encrypted_medical_conditions
+            changes["medical_conditions"] = None
+
+        # Only the encrypted fields left untouched need the key server
+        decrypted = await asyncio.to_thread(
+            decrypt_fields, user, user_update.token, [name for name in ENCRYPTED_FIELDS if name not in given]
+        )
 
-        db.commit()
-        db.refresh(user)
+        if changes:
+            db.execute(update(User).where(User.id == user.id).values(**changes))
+            db.commit()
 
-        # Return updated user info
-        return await get_user_info(user_update.token, db)
+        user_info = schemas.UserInfoResponse(
+            first_name=user_update.first_name,
+            last_name=user_update.last_name,
+            email=user.email,
+            user_type=user.user_type,
+            identity_type=user.identity_type,
+            dob=user_update.dob,
+            public_key=user.public_key,
+            **decrypted,
+            **given
+        )
+        return FastJSONResponse(user_info)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+def get_healthcare_worker(token: str, db: Session) -> User:
+    user = db.query(User).filter(User.email == get_current_user(token, db)).first()
+    # Healthcare workers have user group 2
+    if not user or user.user_type != '2':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only healthcare workers can import patients"
+        )
+    return user
+
+@router.post("/bulk-import", response_model=schemas.BulkImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def bulk_import(request: Request, token: str, format: str = None, db: Session = Depends(get_db)):
+    """Register patients from a CSV or NDJSON request body in the background.
+
+    Columns / keys are those of /register; user_type is always patient.
+    Poll GET /bulk-import/{job_id} for progress and the per-row error report.
+    """
+    current_user = get_healthcare_worker(token, db)
+    fmt = format or ("ndjson" if "ndjson" in request.headers.get("content-type", "") else "csv")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+
+    # Spool the body to disk as it arrives; the import reads it back row by row
+    fd, path = tempfile.mkstemp(prefix="bulk-import-", suffix=f".{fmt}")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            async for chunk in request.stream():
+                f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+
+    job = start_import(db, current_user.email, path, fmt)
+    return schemas.BulkImportJobResponse.model_validate(job)
+
+@router.get("/bulk-import/{job_id}", response_model=schemas.BulkImportJobResponse)
+def bulk_import_status(job_id: str, token: str, db: Session = Depends(get_db)):
+    current_user = get_healthcare_worker(token, db)
+    job = db.get(ImportJob, job_id)
+    if not job or job.created_by != current_user.email:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return schemas.BulkImportJobResponse.model_validate(job)
@@ -8,11 +8,14 @@ from core.database import get_db
 from core import auth
 from core.models.models import User, VaccinationType, VaccinationHistory
 from core.models import schemas
+from core.responses import FastJSONResponse
 
 router = APIRouter()
 
 @router.get(
-    "/history", response_model=schemas.VaccinationFullHistoryResponse
+    "/history",
+    response_model=schemas.VaccinationFullHistoryResponse,
+    response_class=FastJSONResponse,
 )
 def get_vaccination_history(email: str, db: Session = Depends(get_db)):
     # First, verify the email exists in the users table
@@ -87,15 +90,19 @@ def get_vaccination_history(email: str, db: Session = Depends(get_db)):
         )
 
     # Return the full response structure
-    return schemas.VaccinationFullHistoryResponse(
+    return FastJSONResponse(schemas.VaccinationFullHistoryResponse(
         user_info=schemas.UserInfoResponseNoLogin(
             user_name=f"{user.first_name} {user.last_name}",
             user_email=user.email
         ),
         vaccination_history=vaccination_history
-    )
+    ))
     
-@router.post("/get-vaccination-history/by-jwt/", response_model=schemas.VaccinationFullHistoryResponse)
+@router.post(
+    "/get-vaccination-history/by-jwt/",
+    response_model=schemas.VaccinationFullHistoryResponse,
+    response_class=FastJSONResponse,
+)
 def get_vaccination_history_by_jwt(jwt: schemas.TokenInput, db: Session = Depends(get_db)):
     user_email = auth.get_current_user(token=jwt.token, db=db)
     user = db.query(User).filter(User.email == user_email).first()
@@ -214,7 +221,7 @@ def update_vaccination_history(
 
     return {"message": "Vaccination history updated successfully"}
 
-@router.get("/stats")
+@router.get("/stats", response_class=FastJSONResponse)
 def get_vaccination_stats(token: str, db: Session = Depends(get_db)):
     try:
         # Verify user and check if they're a healthcare worker (user_type = 2)
@@ -280,10 +287,10 @@ def get_vaccination_stats(token: str, db: Session = Depends(get_db)):
             for stat in vaccine_stats
         ]
 
-        return {
+        return FastJSONResponse({
             "monthly_data": monthly_data,
             "vaccine_distribution": vaccine_distribution
-        }
+        })
 
     except Exception as e:
         raise HTTPException(
@@ -0,0 +1,109 @@
+"""Online migration of users to binary ciphertexts and public keys.
+
+Moves the legacy base64 ciphertexts of identity_number, phone_number and
+medical_conditions into the *_bin columns as versioned ciphertexts, tagged
+with the scheme of the user's key, and rewrites public_key from a base64
+PEM bundle to base64 raw X25519 / DER RSA. No key server call is needed:
+the ciphertext bytes themselves are unchanged.
+
+Rows are converted in id order, one short transaction per batch with the
+batch locked FOR UPDATE, so the service keeps running: reads handle both
+formats and a profile update waits for at most one batch. Safe to stop and
+rerun; migrated rows are skipped.
+
+Run from the CloudBackend directory, after the service has started once
+so the new columns exist:
+    python -m scripts.migrate_binary_storage [--batch-size 500] [--pause 0.1]
+"""
+import argparse
+import base64
+import sys
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import x25519
+from sqlalchemy import or_
+
+from core.database import SessionLocal
+from core.models.models import User
+from services.encryption import ENCRYPTED_FIELDS, ciphertext_version, load_public_key
+
+
+def binary_public_key(public_key: str) -> str:
+    """Base64 raw X25519 or DER RSA form of a stored public key"""
+    key = load_public_key(public_key)
+    if isinstance(key, x25519.X25519PublicKey):
+        key_bytes = key.public_bytes(encoding=serialization.Encoding.Raw, format=serialization.PublicFormat.Raw)
+    else:
+        key_bytes = key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+    return base64.b64encode(key_bytes).decode('utf-8')
+
+
+def convert_user(user: User):
+    """Move the legacy columns of one user to the binary ones; returns the
+    stored size in bytes before and after"""
+    before = len(user.public_key)
+    version = bytes([ciphertext_version(user.public_key)])
+    for name in ENCRYPTED_FIELDS:
+        legacy = getattr(user, name)
+        if legacy is None:
+            continue
+        before += len(legacy)
+        # A value written since the binary columns exist wins over the legacy one
+        if legacy and getattr(user, f"{name}_bin") is None:
+            setattr(user, f"{name}_bin", version + base64.b64decode(legacy))
+        setattr(user, name, None)
+    user.public_key = binary_public_key(user.public_key)
+    after = len(user.public_key) + sum(len(getattr(user, f"{name}_bin") or b"") for name in ENCRYPTED_FIELDS)
+    return before, after
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    args = parser.parse_args(argv)
+
+    last_id, converted, failed, size_before, size_after = 0, 0, 0, 0, 0
+    start = time.monotonic()
+    while True:
+        with SessionLocal() as db:
+            users = (
+                db.query(User)
+                .filter(User.id > last_id)
+                .filter(or_(*(getattr(User, name).isnot(None) for name in ENCRYPTED_FIELDS)))
+                .order_by(User.id)
+                .limit(args.batch_size)
+                .with_for_update()
+                .all()
+            )
+            if not users:
+                break
+            for user in users:
+                try:
+                    before, after = convert_user(user)
+                except Exception as e:
+                    # Left in the legacy format, which stays readable
+                    db.expire(user)
+                    failed += 1
+                    print(f"user {user.id}: {e}", file=sys.stderr)
+                    continue
+                converted += 1
+                size_before += before
+                size_after += after
+            last_id = users[-1].id
+            db.commit()
+        print(f"converted {converted} users (last id {last_id}, {failed} failed)")
+        time.sleep(args.pause)
+
+    print(f"Done in {time.monotonic() - start:.1f}s: {converted} users converted, {failed} failed")
+    if converted:
+        print(f"Stored secrets: {size_before} -> {size_after} bytes ({size_after / size_before:.0%})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,69 @@
+"""Online re-encryption of users under another algorithm, e.g. RSA to X25519.
+
+Every stored value names its scheme in its first byte, so users can be
+moved one at a time while the services run: each user's values are sent to
+the key server, which decrypts them, gives the user a key of the target
+algorithm and returns the new ciphertexts. The plaintexts never leave the
+key server. Users already under the target algorithm are skipped.
+
+Progress is checkpointed in the reencryption_jobs table after every batch.
+Ctrl-C pauses the job; resume it with --resume. Users that failed or were
+changed while their batch ran are listed in the job's errors, and a new run
+retries them.
+
+Run from the CloudBackend directory, after the service has started once so
+the table exists, and with the key server deployed first:
+    python -m scripts.reencrypt --algorithm X25519 [--rate 100] [--batch-size 200]
+    python -m scripts.reencrypt --resume JOB_ID
+"""
+import argparse
+import sys
+
+from config import REENCRYPT_BATCH_SIZE, REENCRYPT_RATE
+from core.database import SessionLocal
+from core.models.models import ReencryptionJob
+from services.reencryption import ALGORITHMS, create_job, run_job
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--algorithm", choices=list(ALGORITHMS), help="Target algorithm of a new job")
+    parser.add_argument("--min-key-epoch", type=int,
+                        help="Also move users whose derived key is of an older epoch")
+    parser.add_argument("--resume", metavar="JOB_ID", help="Continue a paused or failed job from its checkpoint")
+    parser.add_argument("--batch-size", type=int, default=REENCRYPT_BATCH_SIZE,
+                        help="Users per key-server call (at most the key server's KEYGEN_BATCH_MAX)")
+    parser.add_argument("--rate", type=float, default=REENCRYPT_RATE, help="Users per second")
+    args = parser.parse_args(argv)
+    if (args.algorithm is None) == (args.resume is None):
+        parser.error("give either --algorithm or --resume")
+    if args.rate <= 0 or args.batch_size <= 0:
+        parser.error("--rate and --batch-size must be positive")
+
+    with SessionLocal() as db:
+        if args.resume:
+            job = db.get(ReencryptionJob, args.resume)
+            if job is None:
+                parser.error(f"no job {args.resume}")
+            if job.status == "completed":
+                print(f"Job {job.id} is already completed")
+                return 0
+        else:
+            job = create_job(db, args.algorithm, args.min_key_epoch)
+        print(f"Job {job.id}: re-encrypting to {job.target_algorithm} from user id {job.last_user_id}")
+
+        run_job(db, job, batch_size=args.batch_size, rate=args.rate)
+
+        print(f"Job {job.id} {job.status}: {job.processed} users processed, {job.reencrypted} re-encrypted, "
+              f"{job.skipped} skipped, {job.failed} failed")
+        if job.detail:
+            print(job.detail, file=sys.stderr)
+        for error in job.errors or []:
+            print(f"user {error['user_id']} ({error['email']}): {error['error']}", file=sys.stderr)
+        if job.status == "paused":
+            print(f"Resume with: python -m scripts.reencrypt --resume {job.id}")
+        return 0 if job.status == "completed" and not job.failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
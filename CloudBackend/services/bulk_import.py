@@ -0,0 +1,225 @@
+import csv
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import BULK_IMPORT_CHUNK_SIZE, BULK_IMPORT_MAX_ERRORS, BULK_IMPORT_WORKERS
+from core import auth
+from core.database import SessionLocal
+from core.models import schemas
+from core.models.models import ImportJob, User
+from core.utils import validate_identity
+from services import key_server
+from services.registration import encrypt_profile
+
+FORMATS = ("csv", "ndjson")
+PATIENT = "1"
+
+
+class _Report:
+    """Counts and row errors of a running import, written to its ImportJob"""
+
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+        self.emails = set()  # Seen in this file, to catch duplicate rows
+
+    def error(self, line: int, email: Optional[str], error: str):
+        self.failed += 1
+        if len(self.errors) < BULK_IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "email": email, "error": error})
+
+    def save(self, db: Session, job: ImportJob):
+        job.processed = self.processed
+        job.imported = self.imported
+        job.failed = self.failed
+        job.errors = list(self.errors)
+        db.commit()
+
+
+def read_rows(path: str, fmt: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """(line number, row, parse error) for every record of a CSV or NDJSON file"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                # Empty cells are missing values; medical_conditions holds JSON
+                row = {key: value for key, value in row.items() if key and value not in ("", None)}
+                try:
+                    if "medical_conditions" in row:
+                        row["medical_conditions"] = json.loads(row["medical_conditions"])
+                except json.JSONDecodeError as e:
+                    yield reader.line_num, row, f"medical_conditions is not valid JSON: {e}"
+                    continue
+                yield reader.line_num, row, None
+            return
+
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, "Expected a JSON object"
+                continue
+            yield line_number, row, None
+
+
+def validate_row(row: Dict) -> schemas.UserCreate:
+    """A patient registration from an import row, or ValueError"""
+    try:
+        # Optional columns may be left out of a row altogether
+        user = schemas.UserCreate(**{"phone_number": None, "medical_conditions": None, **row, "user_type": PATIENT})
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+    if not validate_identity(user.identity_type, user.identity_number):
+        raise ValueError(f"Invalid {user.identity_type} format")
+    try:
+        date.fromisoformat(user.dob)
+    except ValueError:
+        raise ValueError("dob must be YYYY-MM-DD")
+    return user
+
+
+def request_public_keys(user_emails: List[str]) -> Tuple[Dict[str, str], Optional[int]]:
+    """Generate key pairs for a whole chunk in one key-server call; returns
+    the public keys and, for derived keys, their epoch"""
+    response = key_server.generate_key_pairs(user_emails)
+    if response.status_code != 200:
+        raise RuntimeError(f"Key server returned {response.status_code}: {response.text}")
+    body = response.json()
+    return body["encoded_public_keys"], body.get("key_epoch")
+
+
+def _user_row(public_key: str, key_epoch: Optional[int], user: schemas.UserCreate) -> Dict:
+    return {
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "email": user.email,
+        "user_type": user.user_type,
+        "identity_type": user.identity_type,
+        "dob": date.fromisoformat(user.dob),
+        "public_key": public_key,
+        "key_epoch": key_epoch,
+        "hashed_password": auth.get_password_hash(user.password),
+        **encrypt_profile(public_key, user),
+    }
+
+
+def _import_chunk(db: Session, pool: ThreadPoolExecutor, chunk: List[Tuple[int, schemas.UserCreate]], report: _Report):
+    emails = [user.email for _, user in chunk]
+    registered = {email for (email,) in db.query(User.email).filter(User.email.in_(emails))}
+    fresh = []
+    for line, user in chunk:
+        if user.email in registered or user.email in report.emails:
+            report.error(line, user.email, "Email already registered")
+            continue
+        report.emails.add(user.email)
+        fresh.append((line, user))
+    if not fresh:
+        return
+
+    try:
+        public_keys, key_epoch = request_public_keys([user.email for _, user in fresh])
+    except Exception as e:
+        for line, user in fresh:
+            report.error(line, user.email, f"Key generation failed: {e}")
+        return
+
+    def build(item):
+        line, user = item
+        try:
+            return line, user, _user_row(public_keys[user.email], key_epoch, user), None
+        except Exception as e:
+            return line, user, None, f"Encryption failed: {e}"
+
+    rows = []
+    for line, user, row, error in pool.map(build, fresh):
+        if error:
+            report.error(line, user.email, error)
+        else:
+            rows.append((line, user, row))
+    if not rows:
+        return
+
+    try:
+        # One executemany per chunk; SQLAlchemy batches it into multi-row INSERTs
+        db.execute(insert(User), [row for _, _, row in rows])
+        db.commit()
+        report.imported += len(rows)
+    except IntegrityError:
+        db.rollback()
+        # Typically an email registered through /register since the check
+        # above; insert row by row so only the conflicting rows fail
+        for line, user, row in rows:
+            try:
+                db.execute(insert(User), [row])
+                db.commit()
+                report.imported += 1
+            except IntegrityError as e:
+                db.rollback()
+                report.error(line, user.email, f"Insert failed: {e.orig}")
+
+
+def run_import(job_id: str, path: str):
+    """Import every row of the file at `path` into the users table, recording
+    progress on the ImportJob after each chunk"""
+    db = SessionLocal()
+    report = _Report()
+    job = db.get(ImportJob, job_id)
+    try:
+        job.status = "running"
+        db.commit()
+        with ThreadPoolExecutor(BULK_IMPORT_WORKERS, thread_name_prefix="bulk-import") as pool:
+            chunk = []
+            for line, row, error in read_rows(path, job.format):
+                report.processed += 1
+                try:
+                    if error:
+                        raise ValueError(error)
+                    chunk.append((line, validate_row(row)))
+                except ValueError as e:
+                    email = row.get("email") if row else None
+                    report.error(line, str(email) if email is not None else None, str(e))
+                if len(chunk) >= BULK_IMPORT_CHUNK_SIZE:
+                    _import_chunk(db, pool, chunk, report)
+                    chunk = []
+                    report.save(db, job)
+            if chunk:
+                _import_chunk(db, pool, chunk, report)
+        job.status = "completed"
+    except Exception as e:
+        db.rollback()
+        job.status = "failed"
+        job.detail = str(e)
+    finally:
+        job.finished_at = datetime.utcnow()
+        report.save(db, job)
+        db.close()
+        os.remove(path)
+
+
+def start_import(db: Session, created_by: str, path: str, fmt: str) -> ImportJob:
+    """Record a queued ImportJob for an uploaded file and import it on a
+    background thread. The job lives in the database, so any worker can
+    report its progress."""
+    job = ImportJob(id=uuid.uuid4().hex, created_by=created_by, format=fmt, status="queued", errors=[])
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    threading.Thread(target=run_import, args=(job.id, path), name=f"bulk-import-{job.id}", daemon=True).start()
+    return job
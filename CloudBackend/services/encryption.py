@@ -1,22 +1,50 @@
 from cryptography.hazmat.primitives.asymmetric import padding, x25519
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from functools import lru_cache
+from typing import Optional
 import base64
 import os
-from config import ENCRYPTION_METHOD
+from core.timing import timed_phase
 
-def encrypt_with_public_key(public_key_pem: str, plaintext: str) -> str:
-    """Encrypts data with either RSA or X25519 based on configuration"""
-    if ENCRYPTION_METHOD == "X25519":
-        return encrypt_x25519(public_key_pem, plaintext)
-    return encrypt_rsa(public_key_pem, plaintext)
+# First byte of a stored ciphertext, naming the scheme that made it; the
+# key server's CIPHERTEXT_* values
+CIPHERTEXT_X25519 = 0x01  # ephemeral public key (32) | nonce (12) | ciphertext + tag (16)
+CIPHERTEXT_RSA = 0x02     # RSA-OAEP-SHA256 ciphertext
 
-def encrypt_rsa(public_key_pem: str, plaintext: str) -> str:
+# Encrypted User fields: each has a binary `<name>_bin` column and a legacy
+# base64 `<name>` column, see stored_ciphertext
+ENCRYPTED_FIELDS = ("identity_number", "phone_number", "medical_conditions")
+
+@lru_cache(maxsize=1024)
+def load_public_key(public_key: str):
+    """Parse a base64 public key from the key server: 32 raw bytes for
+    X25519, DER for RSA, or a legacy PEM bundle"""
+    key_bytes = base64.b64decode(public_key)
+    if len(key_bytes) == 32:
+        return x25519.X25519PublicKey.from_public_bytes(key_bytes)
+    if key_bytes.startswith(b"-----BEGIN"):
+        # The encryption key is the first PEM block of the bundle
+        return serialization.load_pem_public_key(key_bytes.split(b"\n-----BEGIN")[0] + b"\n")
+    return serialization.load_der_public_key(key_bytes)
+
+def ciphertext_version(public_key: str) -> int:
+    """CIPHERTEXT_* byte of values encrypted for this public key"""
+    if isinstance(load_public_key(public_key), x25519.X25519PublicKey):
+        return CIPHERTEXT_X25519
+    return CIPHERTEXT_RSA
+
+@timed_phase("crypto")
+def encrypt_with_public_key(public_key: str, plaintext: str) -> bytes:
+    """Versioned binary ciphertext; RSA or X25519 according to the user's key"""
+    key = load_public_key(public_key)
+    if isinstance(key, x25519.X25519PublicKey):
+        return bytes([CIPHERTEXT_X25519]) + encrypt_x25519(key, plaintext)
+    return bytes([CIPHERTEXT_RSA]) + encrypt_rsa(key, plaintext)
+
+def encrypt_rsa(public_key, plaintext: str) -> bytes:
     """Original RSA encryption logic"""
-    public_key_decode = base64.b64decode(public_key_pem)
-    public_key = serialization.load_pem_public_key(public_key_decode)
-    
-    encrypted_data = public_key.encrypt(
+    return public_key.encrypt(
         plaintext.encode(),
         padding.OAEP(
             mgf=padding.MGF1(algorithm=hashes.SHA256()),
@@ -24,26 +52,10 @@ def encrypt_rsa(public_key_pem: str, plaintext: str) -> str:
             label=None
         )
     )
-    
-    return base64.b64encode(encrypted_data).decode('utf-8')
 
-def encrypt_x25519(public_key_pem: str, plaintext: str) -> str:
+def encrypt_x25519(public_key: x25519.X25519PublicKey, plaintext: str) -> bytes:
     """X25519 encryption with ChaCha20Poly1305"""
     try:
-        # Decode the base64-encoded PEM public key
-        public_key_bundle = base64.b64decode(public_key_pem)
-        
-        # Split the bundle if it contains multiple keys
-        encryption_key_pem = public_key_bundle.split(b"\n-----BEGIN")[0] + b"\n"
-        if not encryption_key_pem.startswith(b"-----BEGIN"):
-            encryption_key_pem = b"-----BEGIN" + encryption_key_pem
-            
-        # Load the X25519 public key
-        public_key = serialization.load_pem_public_key(encryption_key_pem)
-        
-        if not isinstance(public_key, x25519.X25519PublicKey):
-            raise ValueError("Invalid key type. Expected X25519 public key.")
-        
         # Generate ephemeral key pair
         ephemeral_private = x25519.X25519PrivateKey.generate()
         ephemeral_public = ephemeral_private.public_key()
@@ -64,16 +76,24 @@ def encrypt_x25519(public_key_pem: str, plaintext: str) -> str:
             format=serialization.PublicFormat.Raw
         )
         
-        # Combine all components
-        final_message = ephemeral_public_bytes + nonce + ciphertext
-        
-        # Encode to base64 for transmission
-        return base64.b64encode(final_message).decode('utf-8')
+        return ephemeral_public_bytes + nonce + ciphertext
         
     except Exception as e:
         # Add better error handling
         raise ValueError(f"Encryption failed: {str(e)}")
 
+def stored_ciphertext(user, name: str) -> Optional[bytes]:
+    """Versioned ciphertext of the encrypted User field `name`: its binary
+    column, or the legacy base64 text column of a row not yet migrated,
+    tagged with the scheme of the user's key"""
+    value = getattr(user, f"{name}_bin")
+    if value is not None:
+        return value
+    legacy = getattr(user, name)
+    if not legacy:
+        return None
+    return bytes([ciphertext_version(user.public_key)]) + base64.b64decode(legacy)
+
 # Test
 if __name__ == "__main__":
     val = encrypt_with_public_key("LS0tLS1CRUdJTiBQVUJMSUMgS0VZLS0tLS0KTUlJQklqQU5CZ2txaGtpRzl3MEJBUUVGQUFPQ0FROEFNSUlCQ2dLQ0FRRUF5U0RROFV4SFUzWlMvOVpDNTNUTgpDQ1F1RjJXTWZ0Yk9QcTgrcklwQVVVaDFwTGNheHpxcmN2Umg1SjVDLzFTR2g0b3p6WE0xbXlmRkc0OFZ1ZjdJClR4MXNLVDVDM2ZlZUdSWVd2Q05MTnNRekhXVDNWR1JDSEJRemxQTnNPbUkxRnlpTWI0ODZJM2hoaFNjckpXMk4KR0s3TXcvT1RrWUMvQkh1VkI1cHJzRGljdjVrWVg4VDZ1TUZsblVtYjl5aTdlWUY5cUF1WGVReVNEU3B3dWtIago5dlNaSEZEV2w2RjE2MTNQUk1CYWFSbjZ1eG40S2NOMEowVisyTy9nMDRLNXl4enhxajVacmV6Qi9LVjd6WW5wCjNrZ2dqVmdaN2NFR3l6NUd6Z2hpRGZrRlBMUW5YdEgyNm5QZnIvTEFvcTNBUjlvRjcrUnZ4V2d5ZDFzVU5CUlcKcHdJREFRQUIKLS0tLS1FTkQgUFVCTElDIEtFWS0tLS0tCg==", "4242424")
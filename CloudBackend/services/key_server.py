@@ -0,0 +1,311 @@
+import base64
+import contextvars
+import hashlib
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    KEYSERVER_BATCH_READ_TIMEOUT, KEYSERVER_BREAKER_FAILURES, KEYSERVER_BREAKER_RESET,
+    KEYSERVER_CONNECT_TIMEOUT, KEYSERVER_HEDGE_MIN_DELAY, KEYSERVER_HEDGING, KEYSERVER_READ_TIMEOUT,
+    KEYSERVER_ROUTING, KEYSERVERS,
+)
+from core.metrics import KEY_SERVER_CIRCUIT_STATE, KEY_SERVER_ERRORS, KEY_SERVER_HEDGES
+from core.singleflight import SingleFlight
+from core.timing import phase
+from core.tracing import inject_headers
+
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+# Latencies kept per replica for the hedge delay, and samples needed before
+# their p95 is trusted over the minimum delay
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+# Answers meaning the replica (or the proxy in front of it) cannot serve;
+# any other 5xx is an error of that one request, e.g. a duplicate key
+UNAVAILABLE_STATUSES = (502, 503, 504)
+
+
+class KeyServerUnavailable(Exception):
+    """No key-server replica could be reached, or all circuits are open"""
+
+
+class Replica:
+    """One key-server URL with its latency history and circuit breaker"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session = requests.Session()
+        self.session.mount(url, HTTPAdapter(pool_connections=4, pool_maxsize=32))
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.ewma: Optional[float] = None
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+        KEY_SERVER_CIRCUIT_STATE.labels(replica=url).set(CLOSED)
+
+    def _set_state(self, state: int):
+        self.state = state
+        KEY_SERVER_CIRCUIT_STATE.labels(replica=self.url).set(state)
+
+    def acquire(self) -> bool:
+        """Whether a request may go to this replica now. After the reset
+        period one request is let through to probe an open circuit."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= KEYSERVER_BREAKER_RESET:
+                self._set_state(HALF_OPEN)
+                return True
+            return False
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+            self.ewma = latency if self.ewma is None else 0.8 * self.ewma + 0.2 * latency
+            self.failures = 0
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_answer(self):
+        """An error answer of the request itself: the replica is up, so a
+        probe of a half-open circuit succeeded, but the failure count and
+        latencies are left alone"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.failures = 0
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= KEYSERVER_BREAKER_FAILURES:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            if len(self.latencies) < MIN_LATENCY_SAMPLES:
+                return KEYSERVER_HEDGE_MIN_DELAY
+            ordered = sorted(self.latencies)
+        return max(ordered[int(len(ordered) * 0.95) - 1], KEYSERVER_HEDGE_MIN_DELAY)
+
+
+class KeyServerClient:
+    """Calls the key server with strict timeouts, a circuit breaker per
+    replica, failover between replicas and hedged idempotent requests.
+
+    Replicas are chosen by lowest latency (EWMA) or round robin. A replica
+    whose circuit is open is skipped, and when every circuit is open calls
+    fail at once with KeyServerUnavailable instead of tying up the worker.
+    """
+
+    def __init__(self, urls: List[str], routing: str = "least_latency"):
+        self.replicas = [Replica(url) for url in urls]
+        self.routing = routing
+        self._round_robin = itertools.cycle(range(max(len(self.replicas), 1)))
+        self._lock = threading.Lock()
+        self._hedges = ThreadPoolExecutor(max_workers=32, thread_name_prefix="keyserver")
+
+    def _candidates(self) -> List[Replica]:
+        if self.routing == "round_robin":
+            with self._lock:
+                start = next(self._round_robin)
+            return self.replicas[start:] + self.replicas[:start]
+        # Unmeasured replicas first, so each gets tried
+        return sorted(self.replicas, key=lambda r: -1 if r.ewma is None else r.ewma)
+
+    def _pick(self, exclude=()) -> Optional[Replica]:
+        for replica in self._candidates():
+            if replica not in exclude and replica.acquire():
+                return replica
+        return None
+
+    def _send(self, replica: Replica, path: str, read_timeout: float, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        try:
+            response = replica.session.post(
+                f"{replica.url}{path}", timeout=(KEYSERVER_CONNECT_TIMEOUT, read_timeout), **kwargs
+            )
+        except requests.Timeout:
+            KEY_SERVER_ERRORS.labels(error_type="timeout").inc()
+            replica.record_failure()
+            raise
+        except requests.RequestException:
+            KEY_SERVER_ERRORS.labels(error_type="connection").inc()
+            replica.record_failure()
+            raise
+        if response.status_code in UNAVAILABLE_STATUSES:
+            KEY_SERVER_ERRORS.labels(error_type="unavailable").inc()
+            replica.record_failure()
+        elif response.status_code >= 500:
+            KEY_SERVER_ERRORS.labels(error_type="server_error").inc()
+            replica.record_answer()
+        else:
+            replica.record_success(time.perf_counter() - start)
+        return response
+
+    def _unavailable(self, error: Optional[Exception]) -> KeyServerUnavailable:
+        if error is None:
+            KEY_SERVER_ERRORS.labels(error_type="circuit_open").inc()
+            return KeyServerUnavailable("Key server unavailable: circuit open")
+        return KeyServerUnavailable(f"Key server unavailable: {error}")
+
+    def post(self, path: str, read_timeout: float = KEYSERVER_READ_TIMEOUT, **kwargs) -> requests.Response:
+        """Non-idempotent call. Fails over to another replica only when the
+        connection could not be made, so the request never reached a server."""
+        tried, error = [], None
+        while True:
+            replica = self._pick(exclude=tried)
+            if replica is None:
+                raise self._unavailable(error)
+            tried.append(replica)
+            try:
+                return self._send(replica, path, read_timeout, **kwargs)
+            except requests.ConnectTimeout as e:
+                error = e
+            except requests.ConnectionError as e:
+                if not _never_sent(e):
+                    raise self._unavailable(e)
+                error = e
+            except requests.RequestException as e:
+                raise self._unavailable(e)
+
+    def post_idempotent(self, path: str, read_timeout: float = KEYSERVER_READ_TIMEOUT,
+                        hedge: bool = KEYSERVER_HEDGING, **kwargs) -> requests.Response:
+        """Idempotent call, retried on the remaining replicas after a
+        failure. With `hedge`, it is also sent again (to another replica when
+        possible) if no answer came within the replica's p95 latency; the
+        first answer that is not a 502/503/504 wins."""
+        context = contextvars.copy_context()
+        tried: List[Replica] = []
+        pending: Dict = {}
+        error, failed_response, hedged = None, None, False
+
+        def launch(is_hedge: bool) -> bool:
+            replica = self._pick(exclude=tried)
+            if replica is None and is_hedge and tried:
+                replica = tried[0]  # A single replica still has other workers and connections
+            if replica is None:
+                return False
+            tried.append(replica)
+            future = self._hedges.submit(context.copy().run, self._send, replica, path, read_timeout, **kwargs)
+            pending[future] = is_hedge
+            return True
+
+        if not launch(False):
+            raise self._unavailable(None)
+
+        while pending:
+            timeout = None if hedged or not hedge else tried[0].hedge_delay()
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                if launch(True):
+                    KEY_SERVER_HEDGES.labels(result="sent").inc()
+                continue
+            for future in done:
+                is_hedge = pending.pop(future)
+                try:
+                    response = future.result()
+                except requests.RequestException as e:
+                    error = e
+                    continue
+                if response.status_code not in UNAVAILABLE_STATUSES:
+                    if is_hedge:
+                        KEY_SERVER_HEDGES.labels(result="won").inc()
+                    return response
+                failed_response = response
+            if not pending:
+                launch(False)
+
+        if failed_response is not None:
+            return failed_response
+        raise self._unavailable(error)
+
+
+def _never_sent(error: requests.ConnectionError) -> bool:
+    """Whether a connection error happened before the request was written
+    (refused, unresolvable), as opposed to a reset mid-request"""
+    message = str(error)
+    return "Failed to establish a new connection" in message or "Failed to resolve" in message
+
+
+client = KeyServerClient(KEYSERVERS, KEYSERVER_ROUTING)
+
+_decrypts = SingleFlight("decryption")
+
+
+def _decrypt_key(user_email: str, token: str, data: List[str], key_epoch: Optional[int]):
+    """Everything the request carries: calls differing in epoch or token
+    (the key server may judge tokens differently) never share an answer"""
+    digest = hashlib.sha256()
+    for value in data:
+        digest.update(value.encode())
+        digest.update(b"\0")
+    return user_email, key_epoch, hashlib.sha256(token.encode()).hexdigest(), digest.hexdigest()
+
+
+def decrypt_batch(user_email: str, token: str, ciphertexts: List[bytes],
+                  key_epoch: Optional[int] = None) -> requests.Response:
+    """POST /decrypt-data-batch of versioned ciphertexts; `key_epoch` is
+    the user's for a derived key. Identical concurrent decrypts of one user,
+    as in dashboard bursts, share a single key-server call."""
+    data = [base64.b64encode(ciphertext).decode('utf-8') for ciphertext in ciphertexts]
+
+    def call():
+        with phase("keyserver"):
+            return client.post_idempotent(
+                "/decrypt-data-batch",
+                headers=inject_headers(),
+                json={
+                    "user_email": user_email,
+                    "token": token,
+                    "data": data,
+                    "versioned": True,
+                    "key_epoch": key_epoch
+                }
+            )
+    return _decrypts.do(_decrypt_key(user_email, token, data, key_epoch), call)
+
+
+def generate_key_pair(user_email: str) -> requests.Response:
+    """POST /generate-key-pair"""
+    with phase("keyserver"):
+        return client.post("/generate-key-pair", headers=inject_headers(), params={"user_email": user_email})
+
+
+def generate_key_pairs(user_emails: List[str]) -> requests.Response:
+    """POST /generate-key-pairs. Existing keys are returned rather than
+    replaced, so a failed batch is safe to retry on another replica; it is
+    never hedged, as that would generate the whole batch twice."""
+    with phase("keyserver"):
+        return client.post_idempotent(
+            "/generate-key-pairs",
+            read_timeout=KEYSERVER_BATCH_READ_TIMEOUT,
+            hedge=False,
+            headers=inject_headers(),
+            json={"user_emails": user_emails}
+        )
+
+
+def reencrypt_batch(users: List[Dict], algorithm: str) -> requests.Response:
+    """POST /reencrypt-batch. The key server reuses a key of the target
+    algorithm it already made, so a failed batch is safe to retry; like key
+    generation it is never hedged."""
+    with phase("keyserver"):
+        return client.post_idempotent(
+            "/reencrypt-batch",
+            read_timeout=KEYSERVER_BATCH_READ_TIMEOUT,
+            hedge=False,
+            headers=inject_headers(),
+            json={"users": users, "algorithm": algorithm}
+        )
@@ -0,0 +1,166 @@
+import base64
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from config import REENCRYPT_BATCH_SIZE, REENCRYPT_MAX_ERRORS, REENCRYPT_RATE
+from core.models.models import ReencryptionJob, User
+from services import key_server
+from services.encryption import (
+    CIPHERTEXT_RSA, CIPHERTEXT_X25519, ENCRYPTED_FIELDS, ciphertext_version, stored_ciphertext
+)
+
+ALGORITHMS = {"X25519": CIPHERTEXT_X25519, "RSA": CIPHERTEXT_RSA}
+
+# Everything a user's re-encryption reads, and checks again when writing
+COLUMNS = (User.id, User.email, User.public_key, User.key_epoch) + tuple(
+    getattr(User, column) for name in ENCRYPTED_FIELDS for column in (f"{name}_bin", name)
+)
+
+
+def needs_reencryption(user, target: int, min_key_epoch: Optional[int]) -> bool:
+    """Whether the key or any stored value of a user is not yet under the
+    target CIPHERTEXT_* scheme (or, for a derived key, of an older epoch).
+    Each value carries its own scheme byte, so a half-done user counts."""
+    if ciphertext_version(user.public_key) != target:
+        return True
+    if min_key_epoch is not None and user.key_epoch is not None and user.key_epoch < min_key_epoch:
+        return True
+    return any(
+        (ciphertext := stored_ciphertext(user, name)) is not None and ciphertext[0] != target
+        for name in ENCRYPTED_FIELDS
+    )
+
+
+def _unchanged(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def _save(db: Session, user, result: Dict, names: List[str]) -> bool:
+    """Write one user's new key and ciphertexts, unless the row changed since
+    it was read (a profile update, say); returns whether it was written"""
+    values = {"public_key": result["encoded_public_key"], "key_epoch": result["key_epoch"]}
+    for name, value in zip(names, result["data"]):
+        values[f"{name}_bin"] = base64.b64decode(value)
+        values[name] = None  # Legacy column
+    statement = update(User).where(*(_unchanged(column, getattr(user, column.key)) for column in COLUMNS))
+    return db.execute(statement.values(**values)).rowcount == 1
+
+
+class _Progress:
+    """Counts and user errors of a running job, written to its ReencryptionJob"""
+
+    def __init__(self, job: ReencryptionJob):
+        self.job = job
+        self.errors = list(job.errors or [])
+
+    def error(self, user, error: str):
+        self.job.failed += 1
+        if len(self.errors) < REENCRYPT_MAX_ERRORS:
+            self.errors.append({"user_id": user.id, "email": user.email, "error": error})
+
+    def save(self, db: Session):
+        self.job.errors = list(self.errors)
+        db.commit()
+
+    def rollback(self, db: Session):
+        """Drop the unfinished batch; counts go back to the last checkpoint"""
+        db.rollback()
+        self.errors = list(self.job.errors or [])
+
+
+def _reencrypt_batch(db: Session, users, progress: _Progress):
+    job = progress.job
+    target = ALGORITHMS[job.target_algorithm]
+    pending = []
+    for user in users:
+        if needs_reencryption(user, target, job.min_key_epoch):
+            names = [name for name in ENCRYPTED_FIELDS if stored_ciphertext(user, name) is not None]
+            pending.append((user, names))
+        else:
+            job.skipped += 1
+    if not pending:
+        return
+
+    response = key_server.reencrypt_batch([
+        {
+            "user_email": user.email,
+            "data": [base64.b64encode(stored_ciphertext(user, name)).decode('utf-8') for name in names],
+            "key_epoch": user.key_epoch,
+        }
+        for user, names in pending
+    ], job.target_algorithm)
+    if response.status_code != 200:
+        raise RuntimeError(f"Key server returned {response.status_code}: {response.text}")
+
+    for (user, names), result in zip(pending, response.json()["users"]):
+        if result["error"] is not None:
+            progress.error(user, f"Key server: {result['error']}")
+        elif _save(db, user, result, names):
+            job.reencrypted += 1
+        else:
+            # The key server kept the old key as the previous one, so the
+            # values written meanwhile still decrypt; a rerun picks them up
+            progress.error(user, "Changed during re-encryption")
+
+
+def run_job(db: Session, job: ReencryptionJob, batch_size: int = REENCRYPT_BATCH_SIZE,
+            rate: float = REENCRYPT_RATE, log=print):
+    """Re-encrypt every user after the job's checkpoint, in id order.
+
+    Users are read in keyset batches without locks, and each batch is sent
+    to the key server in one call; the plaintexts never leave it. A user is
+    written only if its row is still as read. The checkpoint is committed
+    with each batch's writes, so a stopped job resumes after the last
+    finished batch. At most `rate` users are processed per second.
+    KeyboardInterrupt pauses the job.
+    """
+    progress = _Progress(job)
+    job.status = "running"
+    job.detail = None
+    job.finished_at = None
+    progress.save(db)
+    try:
+        while True:
+            started = time.monotonic()
+            users = db.execute(
+                select(*COLUMNS).where(User.id > job.last_user_id).order_by(User.id).limit(batch_size)
+            ).all()
+            db.commit()  # No transaction stays open across the key-server call
+            if not users:
+                break
+            _reencrypt_batch(db, users, progress)
+            job.processed += len(users)
+            job.last_user_id = users[-1].id
+            progress.save(db)
+            log(f"{job.processed} users processed (last id {job.last_user_id}): {job.reencrypted} re-encrypted, "
+                f"{job.skipped} skipped, {job.failed} failed")
+            time.sleep(max(0.0, len(users) / rate - (time.monotonic() - started)))
+        job.status = "completed"
+    except KeyboardInterrupt:
+        progress.rollback(db)
+        job.status = "paused"
+    except Exception as e:
+        progress.rollback(db)
+        job.status = "failed"
+        job.detail = str(e)
+    finally:
+        job.finished_at = datetime.utcnow()
+        progress.save(db)
+    return job
+
+
+def create_job(db: Session, algorithm: str, min_key_epoch: Optional[int] = None) -> ReencryptionJob:
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown algorithm {algorithm!r}, choose from {', '.join(ALGORITHMS)}")
+    job = ReencryptionJob(
+        id=uuid.uuid4().hex, target_algorithm=algorithm, min_key_epoch=min_key_epoch, status="running",
+        last_user_id=0, processed=0, reencrypted=0, skipped=0, failed=0, errors=[]
+    )
+    db.add(job)
+    db.commit()
+    return job
@@ -0,0 +1,40 @@
+import asyncio
+import json
+from typing import Callable, Dict, Optional, Tuple
+
+from core import auth
+from services.encryption import encrypt_with_public_key
+
+
+def encrypt_profile(public_key: str, user) -> Dict[str, Optional[bytes]]:
+    """Encrypted identity number, phone number and medical conditions of a
+    registration, keyed by User column"""
+    medical_conditions = None
+    if user.medical_conditions:
+        medical_conditions_json = json.dumps([mc.dict() for mc in user.medical_conditions])
+        medical_conditions = encrypt_with_public_key(public_key, medical_conditions_json)
+    return {
+        "identity_number_bin": encrypt_with_public_key(public_key, user.identity_number),
+        "phone_number_bin": encrypt_with_public_key(public_key, user.phone_number) if user.phone_number else None,
+        "medical_conditions_bin": medical_conditions,
+    }
+
+
+async def prepare_registration(user, request_public_key: Callable[[str], Tuple[str, Optional[int]]]) -> Dict:
+    """Secret columns of a new User: key, encrypted profile and password hash.
+
+    bcrypt runs in a worker thread while `request_public_key` fetches the
+    key pair from the key server, and the profile is encrypted as soon as
+    the key arrives, so this takes about max(bcrypt, key generation)
+    instead of their sum.
+    """
+    password_hash = asyncio.ensure_future(asyncio.to_thread(auth.get_password_hash, user.password))
+    try:
+        public_key, key_epoch = await asyncio.to_thread(request_public_key, user.email)
+        encrypted = await asyncio.to_thread(encrypt_profile, public_key, user)
+        hashed_password = await password_hash
+    except BaseException:
+        # The hashing thread finishes on its own, nobody waits for it
+        password_hash.cancel()
+        raise
+    return {**encrypted, "public_key": public_key, "key_epoch": key_epoch, "hashed_password": hashed_password}
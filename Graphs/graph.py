@@ -1,7 +1,15 @@
+import json
+import os
+import sys
+
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.patches import Rectangle
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'BenchmarkServer'))
+from src.core.compare import compare_runs
+from src.core.histogram import LatencyHistogram
+
 plt.style.use('dark_background')
 
 
@@ -11,23 +19,55 @@ BG_COLOR = '#1a1a1a'
 TEXT_COLOR = '#ffffff'
 GRID_COLOR = '#333333'    
 
-# Data for decrypt tests
-decrypt_metrics = ['Total\nDuration', 'Requests\nper sec', 'Average\nDuration', 'Median\nDuration', 'Min\nDuration', 'Max\nDuration']
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Stored benchmark results being compared
+RUNS = {
+    'encrypt': {
+        'cloud_onprem': 'onpremises/rsa_onpremises_encrypt.json',
+        'cloud_only': 'cloudonly/rsa_cloudonly_encrypt.json',
+    },
+    'decrypt': {
+        'cloud_onprem': 'onpremises/rsa_onpremises_decrypt.json',
+        'cloud_only': 'cloudonly/rsa_cloudonly_decrypt.json',
+    },
+}
 
+metrics = ['Total\nDuration', 'Requests\nper sec', 'Average\nDuration', 'p50\nDuration', 'p99\nDuration', 'Min\nDuration', 'Max\nDuration']
 
-decrypt_cloud_onprem = [99.37059211730957, 10.063339451771345, 9.595656961202621, 9.76, 1.7142291069030762, 12.992579221725464]
 
+def load_metrics(relative_path):
+    """Summary values plus histogram percentiles of one stored run"""
+    with open(os.path.join(DATA_DIR, relative_path), 'r') as f:
+        result = json.load(f)
+    histogram = LatencyHistogram.from_result(result)
+    return [
+        result['total_duration'],
+        result['requests_per_second'],
+        histogram.mean(),
+        histogram.percentile(50),
+        histogram.percentile(99),
+        histogram.min,
+        histogram.max,
+    ]
 
-decrypt_cloud_only = [88.50052618980408, 11.299367846190359, 8.565438908338546, 8.69, 1.1668150424957275, 10.899847984313965]
 
-# Data for encrypt tests
-encrypt_metrics = ['Total\nDuration', 'Requests\nper sec', 'Average\nDuration', 'Median\nDuration', 'Min\nDuration', 'Max\nDuration']
+def significance(runs):
+    """Cloud-only vs Cloud+OnPremise percentile changes and Mann-Whitney p-value"""
+    report = compare_runs(os.path.join(DATA_DIR, runs['cloud_onprem']), [os.path.join(DATA_DIR, runs['cloud_only'])])
+    comparison = report['comparisons'][0]
+    percentiles = comparison['percentiles']
+    return (f"Cloud-only vs Cloud+OnPremise: p50 {percentiles['p50']['change']:+.1%}, "
+            f"p99 {percentiles['p99']['change']:+.1%} (Mann-Whitney p={comparison['mann_whitney']['p_value']:.3g})")
 
 
-encrypt_cloud_onprem = [207.39154267311096, 4.821797394005563, 20.047717767715454, 20.51, 3.7154176235198975, 25.380581855773926]
+decrypt_metrics = encrypt_metrics = metrics
 
+decrypt_cloud_onprem = load_metrics(RUNS['decrypt']['cloud_onprem'])
+decrypt_cloud_only = load_metrics(RUNS['decrypt']['cloud_only'])
 
-encrypt_cloud_only = [175.22614669799805, 5.706910862586611, 16.942836599349974, 17.26, 3.690986394882202, 21.182495832443237] 
+encrypt_cloud_onprem = load_metrics(RUNS['encrypt']['cloud_onprem'])
+encrypt_cloud_only = load_metrics(RUNS['encrypt']['cloud_only'])
 
 
 fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(20, 8))
@@ -40,7 +80,7 @@ fig.suptitle('RSA (2048): Cloud vs Cloud+OnPremise Performance Analysis (1000 Re
              color=TEXT_COLOR,
              y=1)
 
-def create_comparison_plot(ax, metrics, cloud_onprem, cloud_only, title):
+def create_comparison_plot(ax, metrics, cloud_onprem, cloud_only, title, subtitle):
     x = np.arange(len(metrics))
     width = 0.35
     
@@ -56,7 +96,7 @@ def create_comparison_plot(ax, metrics, cloud_onprem, cloud_only, title):
     ax.set_ylabel('Seconds / Requests per Second', color=TEXT_COLOR, fontsize=12)
     
     
-    ax.set_title(title + '\n' + 
+    ax.set_title(title + '\n' + subtitle + '\n' +
                  'Higher is better: Requests/sec\nLower is better: All Duration metrics', 
                  pad=20, color=TEXT_COLOR, fontsize=14, fontweight='bold')
     
@@ -85,11 +125,11 @@ def create_comparison_plot(ax, metrics, cloud_onprem, cloud_only, title):
 
 create_comparison_plot(ax1, encrypt_metrics, 
                       encrypt_cloud_onprem, encrypt_cloud_only,
-                      'Encryption Operation Performance')
+                      'Encryption Operation Performance', significance(RUNS['encrypt']))
 
 create_comparison_plot(ax2, decrypt_metrics, 
                       decrypt_cloud_onprem, decrypt_cloud_only,
-                      'Decryption Operation Performance')
+                      'Decryption Operation Performance', significance(RUNS['decrypt']))
 
 
 plt.tight_layout()
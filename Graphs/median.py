@@ -1,16 +1,17 @@
 import json
-from statistics import median
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "BenchmarkServer"))
+from src.core.histogram import LatencyHistogram
 
 def calculate_median_duration(json_file_path):
     
     with open(json_file_path, 'r') as file:
         data = json.load(file)
     
-    
-    durations = [result['duration'] for result in data['detailed_results']]
-    
-    
-    return median(durations)
+    # Summaries carry a latency histogram; older results fall back to detailed_results
+    return LatencyHistogram.from_result(data).percentile(50)
 
 if __name__ == "__main__":
     
@@ -0,0 +1,99 @@
+"""Crypto micro-benchmarks for the key server.
+
+Times key generation and decryption in-process, without HTTP or the
+database, across payload sizes from a phone number up to a large
+medical_conditions JSON. Decryption is measured with the parsed-key cache
+warm (hit) and cleared before every call (miss). Private-key parsing is
+timed for the binary storage format against the legacy base64 PEM bundles.
+
+Run from the PrivateKeyServer directory:
+    python -m benchmarks.crypto_bench [--json results.json] [--min-time 0.5] [-k filter]
+"""
+import base64
+import os
+import sys
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from benchmarks import harness
+from benchmarks.harness import PAYLOADS, RSA_OAEP_MAX_PLAINTEXT
+from services.key_management import (
+    decrypt_with_key,
+    encrypt_for_key,
+    generate_rsa_key_pair,
+    generate_x25519_key_pair,
+    load_private_key,
+)
+from services import key_derivation
+
+
+def legacy_private_key(private_key: bytes) -> str:
+    """The key as stored before the binary format: base64 of a PEM bundle,
+    for X25519 with an unused Ed25519 signing key"""
+    pem = load_private_key(private_key).private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    if len(private_key) == 32:
+        pem += b"\n" + ed25519.Ed25519PrivateKey.generate().private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+    return base64.b64encode(pem).decode('utf-8')
+
+
+def collect_benchmarks():
+    """(group, name, params, fn, setup) for every case"""
+    cases = [
+        ("key_generation", "generate_rsa_key_pair", {}, generate_rsa_key_pair, None),
+        ("key_generation", "generate_x25519_key_pair", {}, generate_x25519_key_pair, None),
+    ]
+
+    # A derived key costs one HKDF instead of a key-table read and a parse
+    key_derivation.MASTER_SECRETS.setdefault(0, os.urandom(key_derivation.MIN_SECRET_BYTES))
+    cases.append(("key_derivation", "derive_private_key", {"algorithm": "x25519"},
+                  lambda: key_derivation.derive_private_key.__wrapped__("bench@example.com", 0), None))
+
+    rsa_private, _ = generate_rsa_key_pair()
+    x25519_private, _ = generate_x25519_key_pair()
+    algorithms = {"rsa": rsa_private, "x25519": x25519_private}
+
+    for algorithm, private_key in algorithms.items():
+        # Uncached parse of a stored key: base64 decode and PEM bundle split
+        # for the legacy Text column, none for the binary one
+        legacy = legacy_private_key(private_key)
+        cases.append(("key_parsing", f"load_private_key_{algorithm}[legacy_pem]",
+                      {"algorithm": algorithm, "format": "legacy_pem", "stored_bytes": len(legacy)},
+                      lambda k=legacy: load_private_key.__wrapped__(base64.b64decode(k)), None))
+        cases.append(("key_parsing", f"load_private_key_{algorithm}[binary]",
+                      {"algorithm": algorithm, "format": "binary", "stored_bytes": len(private_key)},
+                      lambda k=private_key: load_private_key.__wrapped__(k), None))
+
+        for payload_name, payload in PAYLOADS.items():
+            params = {"algorithm": algorithm, "payload": payload_name, "payload_bytes": len(payload.encode())}
+            if algorithm == "rsa" and len(payload.encode()) > RSA_OAEP_MAX_PLAINTEXT:
+                cases.append(("decryption", f"decrypt_{algorithm}[{payload_name}]", params, None, None))
+                continue
+
+            ciphertext = encrypt_for_key(private_key, payload)
+            call = (lambda k=private_key, c=ciphertext: decrypt_with_key(k, c, versioned=True))
+            for cache in ("hit", "miss"):
+                cases.append((
+                    "decryption",
+                    f"decrypt_{algorithm}[{payload_name}-cache_{cache}]",
+                    {**params, "key_cache": cache},
+                    call,
+                    load_private_key.cache_clear if cache == "miss" else None,
+                ))
+    return cases
+
+
+def main(argv=None):
+    harness.main(__doc__.splitlines()[0], collect_benchmarks, argv)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
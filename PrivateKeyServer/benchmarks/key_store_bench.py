@@ -0,0 +1,66 @@
+"""Key fetch latency of the key store backends.
+
+Fills each backend with --keys synthetic key pairs and times
+get_private_key for random users: the SQLAlchemy user_keys table (a
+temporary SQLite database unless --database-url points at Postgres), the
+embedded SQLite store, and both with the in-memory preload.
+
+Run from the PrivateKeyServer directory:
+    python -m benchmarks.key_store_bench [--keys 10000] [--database-url postgresql://...] [--min-time 0.5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+from sqlalchemy import create_engine, delete
+
+from core.database import Base
+from core.models.models import UserKey
+from services.key_store import PreloadedKeyStore, SqlAlchemyKeyStore, SqliteKeyStore
+from benchmarks.harness import run_benchmark
+
+EMAIL_DOMAIN = "keystore-bench.example.com"
+
+
+def fill(store, count: int):
+    for start in range(0, count, 1000):
+        store.add([
+            (f"user{i}@{EMAIL_DOMAIN}", os.urandom(32), os.urandom(32), None)
+            for i in range(start, min(start + 1000, count))
+        ])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--database-url", help="SQLAlchemy URL for the user_keys backend (default: temporary SQLite)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Measured seconds per benchmark")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="key_store_bench")
+    engine = create_engine(args.database_url or f"sqlite:///{os.path.join(directory, 'user_keys.db')}")
+    Base.metadata.create_all(bind=engine)
+    stores = {
+        "sqlalchemy": SqlAlchemyKeyStore(engine),
+        "sqlite": SqliteKeyStore(os.path.join(directory, "keys.sqlite3")),
+    }
+    for store in stores.values():
+        fill(store, args.keys)
+    stores.update({f"{name}+preload": PreloadedKeyStore(store) for name, store in list(stores.items())})
+
+    emails = [f"user{i}@{EMAIL_DOMAIN}" for i in range(args.keys)]
+    try:
+        print(f"{'store':<24}{'rounds':>8}{'median us':>12}{'p99 us':>12}{'ops/s':>12}")
+        for name, store in stores.items():
+            stats = run_benchmark(lambda s=store: s.get_private_key(random.choice(emails)), min_time=args.min_time)
+            print(f"{name:<24}{stats['rounds']:>8}{stats['median'] * 1e6:>12.1f}{stats['p99'] * 1e6:>12.1f}{stats['ops']:>12.0f}")
+    finally:
+        with engine.begin() as connection:
+            connection.execute(delete(UserKey).where(UserKey.user_email.like(f"%@{EMAIL_DOMAIN}")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
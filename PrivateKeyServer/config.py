@@ -12,8 +12,63 @@ DB_PORT = 5432
 
 # Convert to postgres
 
-
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_SERVER}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL overrides the Postgres settings, e.g. sqlite:///./keys.db for offline benchmarks
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_SERVER}:{DB_PORT}/{DB_NAME}"
 
 # Add new configuration
-ENCRYPTION_METHOD = "X25519"  # Options: "RSA" or "X25519"
\ No newline at end of file
+ENCRYPTION_METHOD = os.getenv("ENCRYPTION_METHOD", "X25519")  # Options: "RSA" or "X25519"
+
+# Where stored key pairs live (services/key_store.py): "sqlalchemy" for the
+# user_keys table above, or "sqlite" for an embedded WAL-mode file at
+# KEY_STORE_PATH read through a KEY_STORE_MMAP_SIZE-byte memory map, for a
+# single on-prem box. KEY_STORE_PRELOAD loads every private key into memory
+# at startup. Copy keys between stores with scripts/export_keys.py
+KEY_STORE = os.getenv("KEY_STORE", "sqlalchemy")
+KEY_STORE_PATH = os.getenv("KEY_STORE_PATH", "keys.sqlite3")
+KEY_STORE_MMAP_SIZE = int(os.getenv("KEY_STORE_MMAP_SIZE", 256 * 1024 * 1024))
+KEY_STORE_PRELOAD = os.getenv("KEY_STORE_PRELOAD", "false").lower() == "true"
+
+# Connection pool of the Postgres engine, sized for the request threadpool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+
+# Private keys kept in memory per worker, each cache this size: parsed stored
+# keys (services.key_management.load_private_key) and derived ones
+KEY_CACHE_SIZE = int(os.getenv("KEY_CACHE_SIZE", 1024))
+
+# Derived keys (services/key_derivation.py): new users get an X25519 key
+# computed with HKDF from a master secret and their email, so registration
+# writes no key row and decryption reads none. Master secrets are files
+# <epoch>.key in KEY_MASTER_SECRET_DIR; new keys use KEY_EPOCH (default: the
+# newest), older epochs stay available for decryption until users are moved
+KEY_DERIVATION_ENABLED = os.getenv("KEY_DERIVATION_ENABLED", "false").lower() == "true"
+KEY_MASTER_SECRET_DIR = os.getenv("KEY_MASTER_SECRET_DIR", "master_secrets")
+KEY_EPOCH = int(os.getenv("KEY_EPOCH")) if os.getenv("KEY_EPOCH") else None
+
+# Most key pairs one /generate-key-pairs call may ask for
+KEYGEN_BATCH_MAX = int(os.getenv("KEYGEN_BATCH_MAX", 1000))
+
+# Seconds between COUNT queries that resync the stored_key_pairs gauge on key generation
+STORED_KEYS_REFRESH_INTERVAL = float(os.getenv("STORED_KEYS_REFRESH_INTERVAL", 30))
+
+# Distributed tracing (core/tracing.py): spans go to a JSON-lines file or,
+# for an http(s) URL, to an OTLP/HTTP collector such as http://localhost:4318/v1/traces
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "traces.jsonl")
+SERVICE_NAME = os.getenv("SERVICE_NAME", "key-server")
+
+# Sampling profiler (core/profiling.py). /debug/profile only exists when
+# PROFILING_ENABLED is set and needs PROFILE_TOKEN in the X-Profile-Token header
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+# Continuous low-rate sampling to PROFILE_DIR, one file per PROFILE_PERIOD seconds
+PROFILE_CONTINUOUS = os.getenv("PROFILE_CONTINUOUS", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.05))
+PROFILE_PERIOD = float(os.getenv("PROFILE_PERIOD", 60))
+
+# uvicorn workers started by `python main.py`. With more than one, metrics
+# are kept per process in PROMETHEUS_MULTIPROC_DIR (emptied at startup) and
+# /metrics aggregates them; set it yourself when running uvicorn --workers
+WORKERS = int(os.getenv("WORKERS", 4))
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "prometheus_multiproc")
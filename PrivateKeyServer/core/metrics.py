@@ -1,15 +1,66 @@
-
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 # Raw Encryption/Decryption Metrics
 RAW_CRYPTO_TIME = Histogram(
     "raw_crypto_operation_duration_seconds",
     "Time spent on raw cryptographic operations",
-    ["operation_type"]  # 'encryption' or 'decryption'
+    ["operation_type"]  # 'key_generation' or 'decryption'
+)
+
+# Crypto time only (no DB), per algorithm
+KEY_GENERATION_TIME = Histogram(
+    "key_generation_duration_seconds",
+    "Time spent generating a key pair",
+    ["algorithm"]
+)
+
+DECRYPTION_TIME = Histogram(
+    "decryption_duration_seconds",
+    "Time spent decrypting one value",
+    ["algorithm", "ciphertext_size"]  # size bucket from ciphertext_size_bucket()
+)
+
+# Key store access (services/key_store.py), separate from the crypto above.
+# Buckets reach down to microseconds for the embedded and preloaded stores
+KEY_DB_TIME = Histogram(
+    "key_db_operation_duration_seconds",
+    "Time spent reading or writing the key store",
+    ["operation"],  # 'key_lookup' or 'key_insert'
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+CRYPTO_ERRORS = Counter(
+    "crypto_errors_total",
+    "Failed key-server operations by failure class",
+    ["operation_type", "error_class"]  # missing_key, bad_ciphertext, auth_tag, internal
 )
 
-# Active Key Pairs Counter
-ACTIVE_KEY_PAIRS = Counter(
+# Private keys fetched for decryption: read from the key table, or derived
+# from a master secret (services/key_derivation.py) without touching it
+KEY_LOOKUPS = Counter(
+    "key_lookups_total",
+    "Private keys fetched for decryption by source",
+    ["source"]  # 'stored' or 'derived'
+)
+
+# Key pairs generated since start (the metric name predates the gauge below)
+KEY_PAIRS_GENERATED = Counter(
     "key_pairs_generated_total",
     "Total number of key pairs generated"
-)
\ No newline at end of file
+)
+
+STORED_KEY_PAIRS = Gauge(
+    "stored_key_pairs",
+    "Number of key pairs stored in the key table",
+    multiprocess_mode="mostrecent"  # Every worker counts the same table
+)
+
+# Upper bounds in bytes of the ciphertext size buckets (decoded, without the version byte)
+CIPHERTEXT_SIZE_BUCKETS = (256, 1024, 4096, 16384)
+
+
+def ciphertext_size_bucket(size: int) -> str:
+    for bound in CIPHERTEXT_SIZE_BUCKETS:
+        if size <= bound:
+            return f"le_{bound}"
+    return f"gt_{CIPHERTEXT_SIZE_BUCKETS[-1]}"
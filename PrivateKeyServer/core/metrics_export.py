@@ -0,0 +1,62 @@
+# Vendored from shared/core/metrics_export.py; edit it there and run `python shared/sync.py`.
+import glob
+import os
+import shutil
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+from starlette.responses import Response
+
+# Set in the environment before any worker imports prometheus_client, so
+# every metric value lives in a per-process file under this directory
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+
+def prepare_multiproc_dir(path: str) -> str:
+    """Empty `path` and point this process and the workers it spawns at it.
+
+    Must run in the parent before uvicorn starts the workers: files left by
+    a previous run would otherwise be summed into the new one.
+    """
+    path = os.path.abspath(path)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.environ[MULTIPROC_DIR_ENV] = path
+    return path
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def cleanup_dead_workers(path: str):
+    """Drop the live-gauge files of workers that have exited.
+
+    Counter and histogram files of dead workers are kept, otherwise totals
+    would go backwards when uvicorn replaces a worker.
+    """
+    pids = set()
+    for db_file in glob.glob(os.path.join(path, "gauge_live*.db")):
+        pid = os.path.basename(db_file)[:-3].rsplit("_", 1)[-1]
+        if pid.isdigit():
+            pids.add(int(pid))
+    for pid in pids:
+        if not _pid_alive(pid):
+            multiprocess.mark_process_dead(pid, path)
+
+
+def metrics_response() -> Response:
+    """Prometheus exposition of all workers when PROMETHEUS_MULTIPROC_DIR
+    is set, of this process otherwise"""
+    path = os.environ.get(MULTIPROC_DIR_ENV)
+    if not path:
+        return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+    cleanup_dead_workers(path)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
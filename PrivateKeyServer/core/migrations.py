@@ -0,0 +1,28 @@
+# Vendored from shared/core/migrations.py; edit it there and run `python shared/sync.py`.
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import MetaData
+
+
+def add_missing_columns(engine: Engine, metadata: MetaData):
+    """ALTER TABLE ... ADD COLUMN for model columns an existing table lacks.
+
+    create_all only creates missing tables. New columns are all nullable and
+    without defaults, so adding them is a catalog-only change that does not
+    rewrite or lock the table for long; the rows are filled in afterwards by
+    the batch migrations in scripts/.
+    """
+    inspector = inspect(engine)
+    # Every uvicorn worker runs this at import; Postgres lets the losers of that race no-op
+    if_not_exists = "IF NOT EXISTS " if engine.dialect.name == "postgresql" else ""
+    tables = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {if_not_exists}{column.name} {column_type}'))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, LargeBinary
 from sqlalchemy.sql import func
 from core.database import Base
 
@@ -6,6 +6,13 @@ class UserKey(Base):
     __tablename__ = "user_keys"
     id = Column(Integer, primary_key=True, index=True)
     user_email = Column(String(255), unique=True, index=True)
-    public_key = Column(Text)
-    private_key = Column(Text)
+    # Raw 32-byte X25519 keys, or DER (SubjectPublicKeyInfo / PKCS8) for RSA
+    public_key_bin = Column(LargeBinary, nullable=True)
+    private_key_bin = Column(LargeBinary, nullable=True)
+    # Key replaced by a re-encryption to another algorithm, still needed for
+    # values the backend has not re-encrypted yet
+    previous_private_key_bin = Column(LargeBinary, nullable=True)
+    # Legacy base64 PEM bundles, NULL once migrated by scripts/migrate_binary_storage.py
+    public_key = Column(Text, nullable=True)
+    private_key = Column(Text, nullable=True)
     created_at = Column(DateTime, default=func.now())
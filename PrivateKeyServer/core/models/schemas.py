@@ -1,14 +1,56 @@
 # app/schemas.py
 from pydantic import BaseModel
+from typing import Dict, List, Literal, Optional
 
 class KeyRequest(BaseModel):
     user_email: str  # Email of the user whose data needs to be decrypted
     data: str  # Encrypted data to be decrypted
     token: str  # JWT token for authentication
+    key_epoch: Optional[int] = None  # Set for derived keys, see services/key_derivation.py
+
+class KeyBatchDecryptRequest(BaseModel):
+    user_email: str
+    data: List[str]  # Encrypted values of this user
+    token: str
+    versioned: bool = False  # Values start with a ciphertext version byte (CIPHERTEXT_*)
+    key_epoch: Optional[int] = None
 
 class KeyResponse(BaseModel):
     encoded_public_key: str  # For public key or decrypted data
+    key_epoch: Optional[int] = None  # Epoch of a derived key, None for a stored one
+
+
+class KeyBatchRequest(BaseModel):
+    user_emails: List[str]
+
+class KeyBatchResponse(BaseModel):
+    encoded_public_keys: Dict[str, str]  # user_email -> public key
+    key_epoch: Optional[int] = None
     
     
 class DataDecryptResponse(BaseModel):
-    decrypted_data: str
\ No newline at end of file
+    decrypted_data: str
+
+class DataBatchDecryptResponse(BaseModel):
+    decrypted_data: List[Optional[str]]  # In request order, None where decryption failed
+    errors: List[Optional[str]]
+
+
+class ReencryptUser(BaseModel):
+    user_email: str
+    data: List[str]  # Versioned ciphertexts
+    key_epoch: Optional[int] = None
+
+class ReencryptBatchRequest(BaseModel):
+    users: List[ReencryptUser]
+    algorithm: Literal["X25519", "RSA"]  # Algorithm to re-encrypt under
+
+class ReencryptResult(BaseModel):
+    user_email: str
+    encoded_public_key: Optional[str] = None
+    key_epoch: Optional[int] = None
+    data: Optional[List[str]] = None  # New ciphertexts in request order
+    error: Optional[str] = None  # Set when the user was left unchanged
+
+class ReencryptBatchResponse(BaseModel):
+    users: List[ReencryptResult]
@@ -1,15 +1,19 @@
 # app/main.py
 from fastapi import FastAPI, Request
-import prometheus_client
 from starlette.middleware.base import BaseHTTPMiddleware 
 from starlette.responses import JSONResponse
 from sqlalchemy.orm import Session
 import ipaddress
-from prometheus_client import REGISTRY
-from fastapi.responses import Response
 
 from core.database import engine, Base
-from routes import key_routes
+from core.migrations import add_missing_columns
+from core.metrics_export import metrics_response, prepare_multiproc_dir
+from core.tracing import TracingMiddleware, trace_engine
+from core.profiling import start_continuous_profiling
+from routes import key_routes, debug_routes
+from services.key_management import refresh_stored_key_pairs
+from services.key_derivation import check_master_secrets
+import config
 from prometheus_fastapi_instrumentator import Instrumentator
 
 
@@ -45,38 +49,63 @@ app = FastAPI(
 )
 
 
+# HTTP metrics from the instrumentator; the one /metrics route below
+# aggregates all uvicorn workers when PROMETHEUS_MULTIPROC_DIR is set
 instrumentator = Instrumentator()
-instrumentator.instrument(app).expose(app)
+instrumentator.instrument(app)
 
 
-@app.get("/metrics")
+@app.get("/metrics", include_in_schema=False)
 async def metrics():
-    return Response(
-        prometheus_client.generate_latest(REGISTRY),
-        media_type="text/plain"
-    )
+    return metrics_response()
 
 # Initialize Prometheus metrics endpoint
 
 
 
+# Spans per request and SQL statement when TRACING_ENABLED is set; added
+# first so requests rejected by the IP allowlist are not traced
+app.add_middleware(TracingMiddleware)
+trace_engine(engine)
+
 # Add the Tailscale middleware
 app.add_middleware(TailscaleMiddleware)
 
-# Create database tables
+# Create database tables, and columns added to existing ones since
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine, Base.metadata)
+
+# Opens the key store, preloading it if configured, now that the schema exists
+refresh_stored_key_pairs()
+check_master_secrets()
 
 # Include routers
 app.include_router(key_routes.router, tags=["Key Management"])
 
+# Opt-in profiling, still behind the IP allowlist; each uvicorn worker samples itself
+if config.PROFILING_ENABLED:
+    app.include_router(debug_routes.router, prefix="/debug", tags=["Debug"])
+
+
+@app.on_event("startup")
+def start_profiling():
+    # In the workers only: `python main.py` also imports this module in the
+    # uvicorn supervisor, which serves no requests worth sampling
+    if config.PROFILE_CONTINUOUS:
+        start_continuous_profiling()
+
+
 if __name__ == "__main__":
     import uvicorn
+    if config.WORKERS > 1:
+        # Before the workers spawn, so they inherit it
+        prepare_multiproc_dir(config.PROMETHEUS_MULTIPROC_DIR)
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8001,
         reload=False,  # Disable reload in production
-        workers=4,     # Multiple workers for better performance
+        workers=config.WORKERS,     # Multiple workers for better performance
         log_level="info",
         limit_concurrency=100,
         proxy_headers=True,  # Trust proxy headers for proper IP handling
@@ -1,39 +1,116 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException
 import time
 
-from core.database import get_db
 from core.models import schemas
-from services.key_management import store_user_key_pair, decrypt_data
-from core.metrics import RAW_CRYPTO_TIME, ACTIVE_KEY_PAIRS
+from services.key_management import (
+    store_user_key_pair, store_user_key_pairs, decrypt_data, decrypt_many, reencrypt_user, error_class
+)
+from services.key_derivation import derive_user_key_pairs
+from config import KEYGEN_BATCH_MAX, KEY_DERIVATION_ENABLED
+from core.metrics import RAW_CRYPTO_TIME, KEY_PAIRS_GENERATED, CRYPTO_ERRORS
 
 router = APIRouter()
 
 @router.post("/generate-key-pair", response_model=schemas.KeyResponse)
-async def generate_key_pair(user_email: str, db: Session = Depends(get_db)):
-    """Generates and stores a new RSA/X25519 key pair for a user and returns the public key."""
+async def generate_key_pair(user_email: str):
+    """Generates and stores a new RSA/X25519 key pair for a user and returns the public key.
+    With KEY_DERIVATION_ENABLED the key is derived instead and nothing is stored."""
     try:
         start_time = time.time()
-        public_key = store_user_key_pair(db, user_email)
+        if KEY_DERIVATION_ENABLED:
+            public_keys, key_epoch = derive_user_key_pairs([user_email])
+            public_key = public_keys[user_email]
+        else:
+            public_key, key_epoch = store_user_key_pair(user_email), None
         RAW_CRYPTO_TIME.labels(operation_type="key_generation").observe(time.time() - start_time)
-        ACTIVE_KEY_PAIRS.inc()
-        return schemas.KeyResponse(encoded_public_key=public_key)
+        KEY_PAIRS_GENERATED.inc()
+        return schemas.KeyResponse(encoded_public_key=public_key, key_epoch=key_epoch)
     except Exception as e:
+        CRYPTO_ERRORS.labels(operation_type="key_generation", error_class=error_class(e)).inc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generate-key-pairs", response_model=schemas.KeyBatchResponse)
+def generate_key_pairs(request: schemas.KeyBatchRequest):
+    """Generates and stores key pairs for many users at once, for bulk imports."""
+    if len(request.user_emails) > KEYGEN_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {KEYGEN_BATCH_MAX} key pairs per request")
+    try:
+        start_time = time.time()
+        if KEY_DERIVATION_ENABLED:
+            public_keys, key_epoch = derive_user_key_pairs(request.user_emails)
+            KEY_PAIRS_GENERATED.inc(len(public_keys))
+        else:
+            public_keys, key_epoch = store_user_key_pairs(request.user_emails), None
+        RAW_CRYPTO_TIME.labels(operation_type="batch_key_generation").observe(time.time() - start_time)
+        return schemas.KeyBatchResponse(encoded_public_keys=public_keys, key_epoch=key_epoch)
+    except Exception as e:
+        CRYPTO_ERRORS.labels(operation_type="batch_key_generation", error_class=error_class(e)).inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/decrypt-data", response_model=schemas.DataDecryptResponse)
-async def decrypt_data_endpoint(request: schemas.KeyRequest, db: Session = Depends(get_db)):
+async def decrypt_data_endpoint(request: schemas.KeyRequest):
     """Decrypts user data using the private key."""
     try:
         start_time = time.time()
         decrypted_data = decrypt_data(
-            db, 
             user_email=request.user_email, 
-            encrypted_data=request.data
+            encrypted_data=request.data,
+            key_epoch=request.key_epoch
         )
         RAW_CRYPTO_TIME.labels(operation_type="decryption").observe(time.time() - start_time)
         return schemas.DataDecryptResponse(decrypted_data=decrypted_data)
     except ValueError as e:
+        CRYPTO_ERRORS.labels(operation_type="decryption", error_class=error_class(e)).inc()
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        CRYPTO_ERRORS.labels(operation_type="decryption", error_class=error_class(e)).inc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/decrypt-data-batch", response_model=schemas.DataBatchDecryptResponse)
+def decrypt_data_batch_endpoint(request: schemas.KeyBatchDecryptRequest):
+    """Decrypts several values of one user with a single key lookup; values
+    that fail come back as null with their error. A plain def, so the key
+    lookup and the crypto run in the threadpool, off the event loop."""
+    try:
+        start_time = time.time()
+        results = decrypt_many(
+            user_email=request.user_email, encrypted_data=request.data, versioned=request.versioned,
+            key_epoch=request.key_epoch
+        )
+        RAW_CRYPTO_TIME.labels(operation_type="batch_decryption").observe(time.time() - start_time)
+    except ValueError as e:
+        CRYPTO_ERRORS.labels(operation_type="decryption", error_class=error_class(e)).inc()
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        CRYPTO_ERRORS.labels(operation_type="decryption", error_class=error_class(e)).inc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    for _, error in results:
+        if error is not None:
+            CRYPTO_ERRORS.labels(operation_type="decryption", error_class=error_class(error)).inc()
+    return schemas.DataBatchDecryptResponse(
+        decrypted_data=[plaintext for plaintext, _ in results],
+        errors=[str(error) if error is not None else None for _, error in results],
+    )
+
+@router.post("/reencrypt-batch", response_model=schemas.ReencryptBatchResponse)
+def reencrypt_batch(request: schemas.ReencryptBatchRequest):
+    """Re-encrypts the values of many users under keys of another algorithm,
+    for the backend's re-encryption job; plaintexts stay on this server.
+    Safe to retry: a user already on a key of that algorithm keeps it."""
+    # Each user may need a new key pair, so the key generation limit applies
+    if len(request.users) > KEYGEN_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {KEYGEN_BATCH_MAX} users per request")
+    start_time = time.time()
+    results = []
+    for user in request.users:
+        try:
+            public_key, key_epoch, data = reencrypt_user(user.user_email, user.data, request.algorithm, user.key_epoch)
+            results.append(schemas.ReencryptResult(
+                user_email=user.user_email, encoded_public_key=public_key, key_epoch=key_epoch, data=data
+            ))
+        except Exception as e:
+            CRYPTO_ERRORS.labels(operation_type="reencryption", error_class=error_class(e)).inc()
+            results.append(schemas.ReencryptResult(user_email=user.user_email, error=str(e)))
+    RAW_CRYPTO_TIME.labels(operation_type="batch_reencryption").observe(time.time() - start_time)
+    return schemas.ReencryptBatchResponse(users=results)
@@ -0,0 +1,47 @@
+"""Copy key pairs from one key store to another.
+
+Streams every key pair of the source store in batches and inserts the ones
+the target does not have yet, so it can be rerun to catch up with keys
+created meanwhile, e.g. once more after stopping the server before
+switching KEY_STORE. Legacy PEM rows are copied as they are and keep
+working; run scripts/migrate_binary_storage.py first to convert them.
+
+Run from the PrivateKeyServer directory:
+    python -m scripts.export_keys --source sqlalchemy --target sqlite [--batch-size 1000]
+"""
+import argparse
+import sys
+import time
+
+from services.key_store import BACKENDS, open_key_store
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", choices=BACKENDS, required=True)
+    parser.add_argument("--target", choices=BACKENDS, required=True)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+    if args.source == args.target:
+        parser.error("--source and --target must differ")
+
+    source, target = open_key_store(args.source), open_key_store(args.target)
+    copied = skipped = 0
+    start = time.monotonic()
+    for rows in source.scan(args.batch_size):
+        existing = target.get_public_keys([row[0] for row in rows])
+        missing = [row for row in rows if row[0] not in existing]
+        if missing:
+            target.add(missing)
+        copied += len(missing)
+        skipped += len(rows) - len(missing)
+        print(f"copied {copied}, already present {skipped}")
+
+    source_count, target_count = source.count(), target.count()
+    print(f"Done in {time.monotonic() - start:.1f}s: {source_count} keys in {args.source}, "
+          f"{target_count} in {args.target}")
+    return 0 if target_count >= source_count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,108 @@
+"""Online migration of user_keys to binary key storage.
+
+Rewrites each legacy row, a base64 PEM bundle (for X25519 with an unused
+Ed25519 signing key), as a raw 32-byte X25519 key or DER RSA key in
+private_key_bin / public_key_bin, and clears the legacy columns. Ciphertexts
+are unaffected: the same key is stored in another encoding.
+
+Rows are converted in id order, one short transaction per batch, so the
+server keeps running: key lookups read either format. Safe to stop and
+rerun; migrated rows are skipped.
+
+Run from the PrivateKeyServer directory, after the server has started once
+so the new columns exist:
+    python -m scripts.migrate_binary_storage [--batch-size 500] [--pause 0.1]
+"""
+import argparse
+import base64
+import sys
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import x25519
+from sqlalchemy import update
+
+from core.database import SessionLocal
+from core.models.models import UserKey
+from services.key_management import load_private_key
+
+
+def binary_key_pair(private_key: str):
+    """(private, public) binary form of a legacy base64 PEM private key bundle"""
+    key = load_private_key.__wrapped__(base64.b64decode(private_key))
+    if isinstance(key, x25519.X25519PrivateKey):
+        return (
+            key.private_bytes(
+                encoding=serialization.Encoding.Raw,
+                format=serialization.PrivateFormat.Raw,
+                encryption_algorithm=serialization.NoEncryption()
+            ),
+            key.public_key().public_bytes(encoding=serialization.Encoding.Raw, format=serialization.PublicFormat.Raw),
+        )
+    return (
+        key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ),
+        key.public_key().public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ),
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    args = parser.parse_args(argv)
+
+    last_id, converted, failed, size_before, size_after = 0, 0, 0, 0, 0
+    start = time.monotonic()
+    while True:
+        with SessionLocal() as db:
+            rows = (
+                db.query(UserKey.id, UserKey.private_key, UserKey.public_key)
+                .filter(UserKey.id > last_id, UserKey.private_key.isnot(None))
+                .order_by(UserKey.id)
+                .limit(args.batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            changes = []
+            for key_id, private_key, public_key in rows:
+                try:
+                    private_key_bin, public_key_bin = binary_key_pair(private_key)
+                except Exception as e:
+                    # Left in the legacy format, which stays readable
+                    failed += 1
+                    print(f"user_keys {key_id}: {e}", file=sys.stderr)
+                    continue
+                changes.append({
+                    "id": key_id,
+                    "private_key_bin": private_key_bin,
+                    "public_key_bin": public_key_bin,
+                    "private_key": None,
+                    "public_key": None,
+                })
+                size_before += len(private_key) + len(public_key or "")
+                size_after += len(private_key_bin) + len(public_key_bin)
+            if changes:
+                # Bulk UPDATE by primary key, one statement per batch
+                db.execute(update(UserKey), changes)
+                db.commit()
+            converted += len(changes)
+            last_id = rows[-1].id
+        print(f"converted {converted} keys (last id {last_id}, {failed} failed)")
+        time.sleep(args.pause)
+
+    print(f"Done in {time.monotonic() - start:.1f}s: {converted} keys converted, {failed} failed")
+    if converted:
+        print(f"Stored keys: {size_before} -> {size_after} bytes ({size_after / size_before:.0%})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,38 @@
+"""Create the master secret of a new key epoch for derived keys.
+
+Writes 32 random bytes to <epoch>.key in KEY_MASTER_SECRET_DIR, readable by
+the owner only, with the epoch one above the newest there. Restart the key
+server (or set KEY_EPOCH) for new users to get keys of that epoch; keep the
+older files until no user is left on their epoch, since their keys can
+only be derived from them. Back the directory up: a lost secret means the
+data of every user on its epoch is lost.
+
+Run from the PrivateKeyServer directory:
+    python -m scripts.new_master_secret
+"""
+import argparse
+import os
+import sys
+
+from config import KEY_MASTER_SECRET_DIR
+from services.key_derivation import MIN_SECRET_BYTES, load_master_secrets
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", default=KEY_MASTER_SECRET_DIR)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.dir, mode=0o700, exist_ok=True)
+    epoch = max(load_master_secrets(args.dir), default=0) + 1
+    path = os.path.join(args.dir, f"{epoch}.key")
+    # O_EXCL: never overwrite a secret that keys may already derive from
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(os.urandom(MIN_SECRET_BYTES))
+    print(f"Created key epoch {epoch}: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
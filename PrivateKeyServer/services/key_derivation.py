@@ -0,0 +1,88 @@
+# app/key_derivation.py
+import base64
+import os
+import re
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import x25519
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from config import KEY_CACHE_SIZE, KEY_DERIVATION_ENABLED, KEY_EPOCH, KEY_MASTER_SECRET_DIR
+from core.metrics import KEY_GENERATION_TIME
+
+# Domain separation, so the master secret can never yield the same bytes
+# for another purpose or key type
+HKDF_INFO_PREFIX = b"vaccine-keyserver/x25519-user-key/v1"
+MIN_SECRET_BYTES = 32
+
+_SECRET_FILE = re.compile(r"^(\d+)\.key$")
+
+
+class UnknownEpochError(ValueError):
+    pass
+
+
+def load_master_secrets(directory: str) -> Dict[int, bytes]:
+    """Master secret per key epoch, from the files <epoch>.key in `directory`"""
+    secrets = {}
+    if not os.path.isdir(directory):
+        return secrets
+    for name in os.listdir(directory):
+        match = _SECRET_FILE.match(name)
+        if not match:
+            continue
+        with open(os.path.join(directory, name), 'rb') as f:
+            secret = f.read()
+        if len(secret) < MIN_SECRET_BYTES:
+            raise RuntimeError(f"Master secret {name} is shorter than {MIN_SECRET_BYTES} bytes")
+        secrets[int(match.group(1))] = secret
+    return secrets
+
+
+MASTER_SECRETS = load_master_secrets(KEY_MASTER_SECRET_DIR)
+CURRENT_EPOCH: Optional[int] = KEY_EPOCH if KEY_EPOCH is not None else max(MASTER_SECRETS, default=None)
+
+
+def check_master_secrets():
+    """Refuse to start deriving keys without the current epoch's secret"""
+    if KEY_DERIVATION_ENABLED and CURRENT_EPOCH not in MASTER_SECRETS:
+        raise RuntimeError(
+            f"KEY_DERIVATION_ENABLED needs the master secret of epoch {CURRENT_EPOCH} in {KEY_MASTER_SECRET_DIR}"
+        )
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def derive_private_key(user_email: str, epoch: int) -> bytes:
+    """Raw X25519 private key of a user at a key epoch.
+
+    HKDF-SHA256 of the epoch's master secret, with the user's email in the
+    info, so every user and epoch gets an independent key and nothing has
+    to be stored.
+    """
+    secret = MASTER_SECRETS.get(epoch)
+    if secret is None:
+        raise UnknownEpochError(f"Unknown key epoch {epoch}")
+    info = b"%s/%d/%s" % (HKDF_INFO_PREFIX, epoch, user_email.encode())
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(secret)
+
+
+def derived_public_key(user_email: str, epoch: int) -> str:
+    """Base64 raw public key of a derived key, as sent to the backend"""
+    private_key = x25519.X25519PrivateKey.from_private_bytes(derive_private_key(user_email, epoch))
+    return base64.b64encode(private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )).decode('utf-8')
+
+
+def derive_user_key_pairs(user_emails: List[str]) -> Tuple[Dict[str, str], int]:
+    """Public keys of the given users at the current epoch, and that epoch"""
+    public_keys = {}
+    for user_email in user_emails:
+        start_time = time.perf_counter()
+        public_keys[user_email] = derived_public_key(user_email, CURRENT_EPOCH)
+        KEY_GENERATION_TIME.labels(algorithm="X25519_HKDF").observe(time.perf_counter() - start_time)
+    return public_keys, CURRENT_EPOCH
@@ -1,16 +1,66 @@
 # app/key_management.py
-from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives import serialization, hashes
 import base64
-from core.models.models import UserKey
-from cryptography.hazmat.primitives.asymmetric import x25519, ed25519
+import binascii
+import time
+from cryptography.hazmat.primitives.asymmetric import x25519
 from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
-from config import ENCRYPTION_METHOD
+from cryptography.exceptions import InvalidTag
+from config import ENCRYPTION_METHOD, KEY_CACHE_SIZE, KEY_DERIVATION_ENABLED, STORED_KEYS_REFRESH_INTERVAL
+from functools import lru_cache
+from core.tracing import traced
+from core.metrics import (
+    KEY_GENERATION_TIME, DECRYPTION_TIME, KEY_DB_TIME, KEY_LOOKUPS, KEY_PAIRS_GENERATED, STORED_KEY_PAIRS,
+    ciphertext_size_bucket
+)
+from services.key_derivation import CURRENT_EPOCH, UnknownEpochError, derive_private_key
+from services.key_store import get_key_store
 import os
 
+
+# Failure classes of crypto_errors_total. All are ValueErrors so the routes
+# keep answering 404 for anything caused by the request rather than the server
+class KeyNotFoundError(ValueError):
+    pass
+
+class BadCiphertextError(ValueError):
+    pass
+
+class AuthTagError(ValueError):
+    pass
+
+class KeyMismatchError(BadCiphertextError):
+    """A versioned value encrypted under another algorithm than the key's"""
+
+# First byte of a versioned (binary) ciphertext, naming the scheme that made it:
+#   0x01  ephemeral X25519 public key (32) | nonce (12) | ChaCha20Poly1305 ciphertext + tag
+#   0x02  RSA-OAEP-SHA256 ciphertext
+CIPHERTEXT_X25519 = 0x01
+CIPHERTEXT_RSA = 0x02
+CIPHERTEXT_VERSIONS = {CIPHERTEXT_X25519: "X25519", CIPHERTEXT_RSA: "RSA"}
+
+def error_class(error: Exception) -> str:
+    """Label value of crypto_errors_total for an exception"""
+    if isinstance(error, KeyNotFoundError):
+        return "missing_key"
+    if isinstance(error, AuthTagError):
+        return "auth_tag"
+    if isinstance(error, BadCiphertextError):
+        return "bad_ciphertext"
+    return "internal"
+
+_stored_keys_refreshed = 0.0
+
+def refresh_stored_key_pairs():
+    """Set the stored_key_pairs gauge from the key store"""
+    global _stored_keys_refreshed
+    STORED_KEY_PAIRS.set(get_key_store().count())
+    _stored_keys_refreshed = time.monotonic()
+
 def generate_rsa_key_pair():
-    """Generate RSA key pair with 2048-bit key size"""
+    """Generate RSA key pair with 2048-bit key size, as DER (PKCS8, SubjectPublicKeyInfo)"""
     private_key = rsa.generate_private_key(
         public_exponent=65537,
         key_size=2048
@@ -18,18 +68,19 @@ def generate_rsa_key_pair():
     public_key = private_key.public_key()
     
     
-    private_key_pem = private_key.private_bytes(  # Serialize keys to PEM format
-        encoding=serialization.Encoding.PEM,
+    private_key_der = private_key.private_bytes(  # Serialize keys to DER format
+        encoding=serialization.Encoding.DER,
         format=serialization.PrivateFormat.PKCS8,
         encryption_algorithm=serialization.NoEncryption()
     )
-    public_key_pem = public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
+    public_key_der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
         format=serialization.PublicFormat.SubjectPublicKeyInfo
     )
     
-    return private_key_pem, public_key_pem
+    return private_key_der, public_key_der
 
+@traced("crypto.key_generation")
 def generate_key_pair():
     """Generate key pair based on configured method"""
     if ENCRYPTION_METHOD == "X25519":
@@ -37,92 +88,276 @@ def generate_key_pair():
     return generate_rsa_key_pair()
 
 def generate_x25519_key_pair():
-    """Generates X25519 key pair with Ed25519 for signatures"""
-    # Generate X25519 keys for encryption
+    """Generates an X25519 key pair as raw 32-byte keys"""
     private_key = x25519.X25519PrivateKey.generate()
-    public_key = private_key.public_key()
-    
-    # Generate Ed25519 keys for signatures
-    signing_key = ed25519.Ed25519PrivateKey.generate()
-    verify_key = signing_key.public_key()
-    
-    # Serialize keys
     private_bytes = private_key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption()
-    )
-    public_bytes = public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    )
-    
-    # Add signature keys to the bundle
-    signing_bytes = signing_key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.PKCS8,
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PrivateFormat.Raw,
         encryption_algorithm=serialization.NoEncryption()
     )
-    verify_bytes = verify_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    public_bytes = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
     )
-    
-    # Combine the keys
-    private_key_bundle = private_bytes + b"\n" + signing_bytes
-    public_key_bundle = public_bytes + b"\n" + verify_bytes
-    
-    return private_key_bundle, public_key_bundle
+    return private_bytes, public_bytes
+
+def encode_public_key(public_key: bytes) -> str:
+    """Public key as sent to the backend; for a legacy row, this is the base64
+    PEM bundle it always got"""
+    return base64.b64encode(public_key).decode('utf-8')
 
-def store_user_key_pair(db: Session, user_email: str):
+def store_user_key_pair(user_email: str):
     """Key generation and storage"""
-    private_key_pem, public_key_pem = generate_key_pair()
-    private_key_encoded = base64.b64encode(private_key_pem).decode('utf-8')
-    public_key_encoded = base64.b64encode(public_key_pem).decode('utf-8')
+    start_time = time.perf_counter()
+    private_key_bin, public_key_bin = generate_key_pair()
+    KEY_GENERATION_TIME.labels(algorithm=ENCRYPTION_METHOD).observe(time.perf_counter() - start_time)
     
-    db_key = UserKey(user_email=user_email, public_key=public_key_encoded, private_key=private_key_encoded)
-    db.add(db_key)
-    db.commit()
-    db.refresh(db_key)
+    start_time = time.perf_counter()
+    get_key_store().add([(user_email, public_key_bin, private_key_bin, None)])
+    KEY_DB_TIME.labels(operation="key_insert").observe(time.perf_counter() - start_time)
+
+    # Other workers insert too, so resync with the table now and then
+    if time.monotonic() - _stored_keys_refreshed > STORED_KEYS_REFRESH_INTERVAL:
+        refresh_stored_key_pairs()
+    else:
+        STORED_KEY_PAIRS.inc()
     
-    return public_key_encoded
+    return encode_public_key(public_key_bin)
 
-def decrypt_data(db: Session, user_email: str, encrypted_data: str) -> str:
-    user_key = db.query(UserKey).filter(UserKey.user_email == user_email).first()
-    if not user_key:
-        raise ValueError("User not found")
+def store_user_key_pairs(user_emails: List[str]) -> Dict[str, str]:
+    """Key generation and storage for many users in one transaction.
 
-    private_key_bundle = base64.b64decode(user_key.private_key)
-    
-    if ENCRYPTION_METHOD == "X25519":
-        return decrypt_x25519(private_key_bundle, encrypted_data)
-    return decrypt_rsa(private_key_bundle, encrypted_data)
+    Users that already have a key pair get their stored public key back,
+    so a bulk import can be retried after a partial failure.
+    """
+    start_time = time.perf_counter()
+    public_keys = {
+        user_email: encode_public_key(public_key)
+        for user_email, public_key in get_key_store().get_public_keys(user_emails).items()
+    }
+    KEY_DB_TIME.labels(operation="key_lookup").observe(time.perf_counter() - start_time)
+
+    rows = []
+    for user_email in dict.fromkeys(user_emails):
+        if user_email in public_keys:
+            continue
+        start_time = time.perf_counter()
+        private_key_bin, public_key_bin = generate_key_pair()
+        KEY_GENERATION_TIME.labels(algorithm=ENCRYPTION_METHOD).observe(time.perf_counter() - start_time)
+        rows.append((user_email, public_key_bin, private_key_bin, None))
+        public_keys[user_email] = encode_public_key(public_key_bin)
+
+    if rows:
+        start_time = time.perf_counter()
+        get_key_store().add(rows)
+        KEY_DB_TIME.labels(operation="key_insert").observe(time.perf_counter() - start_time)
+        STORED_KEY_PAIRS.inc(len(rows))
+        KEY_PAIRS_GENERATED.inc(len(rows))
+
+    return public_keys
+
+def get_private_key(user_email: str, key_epoch: Optional[int] = None) -> bytes:
+    """Private key of a user: derived from the master secret of `key_epoch`
+    when given, without a database read, otherwise the stored key (raw
+    X25519 or DER RSA, or the PEM bundle of a row not yet migrated)"""
+    if key_epoch is not None:
+        KEY_LOOKUPS.labels(source="derived").inc()
+        try:
+            return derive_private_key(user_email, key_epoch)
+        except UnknownEpochError as e:
+            raise KeyNotFoundError(str(e))
+
+    KEY_LOOKUPS.labels(source="stored").inc()
+    start_time = time.perf_counter()
+    private_key = get_key_store().get_private_key(user_email)
+    KEY_DB_TIME.labels(operation="key_lookup").observe(time.perf_counter() - start_time)
+    if private_key is None:
+        raise KeyNotFoundError("User not found")
+    return private_key
+
+def decrypt_with_key(private_key_bytes: bytes, encrypted_data: str, versioned: bool = False) -> str:
+    """Decrypt one base64 value with a stored private key.
+
+    A `versioned` value starts with a CIPHERTEXT_* byte, which must match
+    the key's algorithm; otherwise the key's algorithm is assumed.
+    """
+    private_key = load_private_key(private_key_bytes)
+    algorithm = key_algorithm(private_key)
 
-def decrypt_x25519(private_key_bundle: bytes, encrypted_data: str) -> str:
     try:
-        """Decrypt data using X25519 key pair"""
-        
-        # Split the bundle to get the encryption key
-        private_key_parts = private_key_bundle.split(b"-----BEGIN")
-        private_key_pem = b"-----BEGIN" + private_key_parts[1].split(b"-----BEGIN")[0]
-        
-        # Load the private key
-        private_key = serialization.load_pem_private_key(
-            private_key_pem,
-            password=None
-        )
-        
-        if not isinstance(private_key, x25519.X25519PrivateKey):
-            raise ValueError("Invalid key type. Expected X25519 private key.")
-        
-        # Decode the encrypted data
         encrypted_bytes = base64.b64decode(encrypted_data)
-        
-        # In X25519, we expect the encrypted data to be in format:
-        # [ephemeral_pub_key(32) | nonce(12) | ciphertext | tag(16)]
-        
+    except binascii.Error as e:
+        raise BadCiphertextError(f"Invalid base64: {str(e)}")
+    if versioned:
+        if not encrypted_bytes:
+            raise BadCiphertextError("Empty ciphertext")
+        version = encrypted_bytes[0]
+        if version not in CIPHERTEXT_VERSIONS:
+            raise BadCiphertextError(f"Unknown ciphertext version {version}")
+        if CIPHERTEXT_VERSIONS[version] != algorithm:
+            raise KeyMismatchError(f"Ciphertext version {version} does not match the user's {algorithm} key")
+        encrypted_bytes = encrypted_bytes[1:]
+
+    # Only the crypto: key parsing and cache misses are not part of it
+    start_time = time.perf_counter()
+    if algorithm == "X25519":
+        decrypted_data = decrypt_x25519(private_key, encrypted_bytes)
+    else:
+        decrypted_data = decrypt_rsa(private_key, encrypted_bytes)
+    DECRYPTION_TIME.labels(
+        algorithm=algorithm,
+        ciphertext_size=ciphertext_size_bucket(len(encrypted_bytes)),
+    ).observe(time.perf_counter() - start_time)
+    return decrypted_data
+
+def decrypt_data(user_email: str, encrypted_data: str, key_epoch: Optional[int] = None) -> str:
+    return decrypt_with_key(get_private_key(user_email, key_epoch), encrypted_data)
+
+def decrypt_many(user_email: str, encrypted_data: List[str], versioned: bool = False,
+                 key_epoch: Optional[int] = None) -> List[Tuple[Optional[str], Optional[Exception]]]:
+    """(plaintext, error) per value of one user, with a single key lookup.
+
+    A value that fails to decrypt does not fail the others.
+    """
+    private_key_bytes = get_private_key(user_email, key_epoch)
+    other_keys = None
+    results = []
+    for data in encrypted_data:
+        try:
+            try:
+                results.append((decrypt_with_key(private_key_bytes, data, versioned), None))
+            except KeyMismatchError:
+                # Encrypted under the user's previous algorithm: the backend has
+                # not stored the re-encrypted value yet, or this worker's
+                # preloaded key is older than a re-encryption
+                if other_keys is None:
+                    other_keys = [
+                        key for key in get_key_store().get_private_keys(user_email) if key != private_key_bytes
+                    ]
+                results.append((_decrypt_with_matching_key(other_keys, data), None))
+        except ValueError as e:
+            results.append((None, e))
+    return results
+
+def _decrypt_with_matching_key(private_keys: List[bytes], encrypted_data: str) -> str:
+    for private_key_bytes in private_keys:
+        try:
+            return decrypt_with_key(private_key_bytes, encrypted_data, versioned=True)
+        except KeyMismatchError:
+            continue
+    raise KeyMismatchError("No key of the user matches the ciphertext version")
+
+def key_algorithm(private_key) -> str:
+    return "X25519" if isinstance(private_key, x25519.X25519PrivateKey) else "RSA"
+
+def public_key_bytes(private_key) -> bytes:
+    """Stored form of the public half of a parsed private key"""
+    if isinstance(private_key, x25519.X25519PrivateKey):
+        return private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+    return private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+def encrypt_for_key(private_key_bytes: bytes, plaintext: str) -> str:
+    """Base64 versioned ciphertext for the public half of a private key, as
+    CloudBackend's encrypt_with_public_key writes it"""
+    public_key = load_private_key(private_key_bytes).public_key()
+    if isinstance(public_key, x25519.X25519PublicKey):
+        ephemeral_private = x25519.X25519PrivateKey.generate()
+        nonce = os.urandom(12)
+        ciphertext = ChaCha20Poly1305(ephemeral_private.exchange(public_key)).encrypt(nonce, plaintext.encode(), None)
+        ephemeral_public = ephemeral_private.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        encrypted = bytes([CIPHERTEXT_X25519]) + ephemeral_public + nonce + ciphertext
+    else:
+        encrypted = bytes([CIPHERTEXT_RSA]) + public_key.encrypt(
+            plaintext.encode(),
+            padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+        )
+    return base64.b64encode(encrypted).decode('utf-8')
+
+def _target_key(user_email: str, algorithm: str) -> Tuple[bytes, Optional[int]]:
+    """Private key a user's values are re-encrypted under, and its epoch.
+
+    X25519 keys are derived when KEY_DERIVATION_ENABLED. Otherwise a stored
+    key of the wanted algorithm is reused, so a retried re-encryption does
+    not rotate again; a new one replaces the stored key, which is kept as
+    the previous key until the backend has stored the new ciphertexts.
+    """
+    if algorithm == "X25519" and KEY_DERIVATION_ENABLED:
+        return derive_private_key(user_email, CURRENT_EPOCH), CURRENT_EPOCH
+
+    stored = get_key_store().get_private_keys(user_email)
+    if stored and key_algorithm(load_private_key(stored[0])) == algorithm:
+        return stored[0], None
+
+    start_time = time.perf_counter()
+    private_key_bin, public_key_bin = generate_x25519_key_pair() if algorithm == "X25519" else generate_rsa_key_pair()
+    KEY_GENERATION_TIME.labels(algorithm=algorithm).observe(time.perf_counter() - start_time)
+    start_time = time.perf_counter()
+    if stored:
+        get_key_store().replace_key(user_email, public_key_bin, private_key_bin)
+    else:
+        # A derived-key user moving to a stored key
+        get_key_store().add([(user_email, public_key_bin, private_key_bin, None)])
+        STORED_KEY_PAIRS.inc()
+    KEY_DB_TIME.labels(operation="key_insert").observe(time.perf_counter() - start_time)
+    KEY_PAIRS_GENERATED.inc()
+    return private_key_bin, None
+
+@traced("crypto.reencrypt")
+def reencrypt_user(user_email: str, encrypted_data: List[str], algorithm: str,
+                   key_epoch: Optional[int] = None) -> Tuple[str, Optional[int], List[str]]:
+    """Re-encrypt versioned values of one user under a key of `algorithm`.
+
+    Returns the new public key, its epoch (for a derived key) and the new
+    ciphertexts in order. The plaintexts never leave this server. Nothing
+    changes when a value fails to decrypt.
+    """
+    plaintexts = []
+    for plaintext, error in decrypt_many(user_email, encrypted_data, versioned=True, key_epoch=key_epoch):
+        if error is not None:
+            raise error
+        plaintexts.append(plaintext)
+
+    private_key_bytes, new_epoch = _target_key(user_email, algorithm)
+    public_key = encode_public_key(public_key_bytes(load_private_key(private_key_bytes)))
+    return public_key, new_epoch, [encrypt_for_key(private_key_bytes, plaintext) for plaintext in plaintexts]
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def load_private_key(private_key_bytes: bytes):
+    """Parse a stored private key: 32 raw bytes for X25519, DER for RSA, or
+    the first PEM block of a legacy bundle.
+
+    Cached on the key bytes, so repeat decrypts for the same user skip
+    parsing and a rotated key simply misses the cache.
+    """
+    if len(private_key_bytes) == 32:
+        return x25519.X25519PrivateKey.from_private_bytes(private_key_bytes)
+    if not private_key_bytes.startswith(b"-----BEGIN"):
+        return serialization.load_der_private_key(private_key_bytes, password=None)
+
+    # Split the legacy bundle to get the encryption key
+    private_key_parts = private_key_bytes.split(b"-----BEGIN")
+    private_key_pem = b"-----BEGIN" + private_key_parts[1].split(b"-----BEGIN")[0]
+
+    return serialization.load_pem_private_key(
+        private_key_pem,
+        password=None
+    )
+
+@traced("crypto.decrypt")
+def decrypt_x25519(private_key: x25519.X25519PrivateKey, encrypted_bytes: bytes) -> str:
+    """Decrypt [ephemeral_pub_key(32) | nonce(12) | ciphertext | tag(16)]"""
+    try:
         if len(encrypted_bytes) < 60:  # Minimum length check (32 + 12 + 16)
-            raise ValueError("Encrypted data too short")
+            raise BadCiphertextError("Encrypted data too short")
             
         ephemeral_pub_bytes = encrypted_bytes[:32]
         nonce = encrypted_bytes[32:44]
@@ -132,7 +367,7 @@ def decrypt_x25519(private_key_bundle: bytes, encrypted_data: str) -> str:
         try:
             peer_public_key = x25519.X25519PublicKey.from_public_bytes(ephemeral_pub_bytes)
         except Exception as e:
-            raise ValueError(f"Invalid ephemeral public key: {str(e)}")
+            raise BadCiphertextError(f"Invalid ephemeral public key: {str(e)}")
         
         # Perform key agreement
         shared_key = private_key.exchange(peer_public_key)
@@ -141,29 +376,33 @@ def decrypt_x25519(private_key_bundle: bytes, encrypted_data: str) -> str:
         chacha = ChaCha20Poly1305(shared_key)
         try:
             decrypted_data = chacha.decrypt(nonce, ciphertext_with_tag, None)
-        except Exception as e:
-            raise ValueError(f"Decryption failed: {str(e)}")
+        except InvalidTag:
+            raise AuthTagError("Decryption failed: authentication tag mismatch")
         
-        return decrypted_data.decode('utf-8')
+        try:
+            return decrypted_data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise BadCiphertextError(f"Decrypted data is not UTF-8: {str(e)}")
         
+    except (KeyNotFoundError, BadCiphertextError, AuthTagError):
+        raise
     except Exception as e:
         raise ValueError(f"Decryption error: {str(e)}")
 
-def decrypt_rsa(private_key_pem: bytes, encrypted_data: str) -> str:
+@traced("crypto.decrypt")
+def decrypt_rsa(private_key: rsa.RSAPrivateKey, encrypted_bytes: bytes) -> str:
     """Simple RSA decryption"""
-    private_key = serialization.load_pem_private_key(
-        private_key_pem,
-        password=None
-    )
-    
-    encrypted_data_bytes = base64.b64decode(encrypted_data)
-    decrypted_data = private_key.decrypt(
-        encrypted_data_bytes,
-        padding.OAEP(
-            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None
+    try:
+        decrypted_data = private_key.decrypt(
+            encrypted_bytes,
+            padding.OAEP(
+                mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                algorithm=hashes.SHA256(),
+                label=None
+            )
         )
-    )
-    
-    return decrypted_data.decode("utf-8")
+        return decrypted_data.decode("utf-8")
+    except ValueError as e:
+        # OAEP has no separate integrity check; a wrong key or damaged
+        # ciphertext both fail padding verification
+        raise BadCiphertextError(f"Decryption failed: {str(e)}")
@@ -0,0 +1,334 @@
+# app/key_store.py
+import base64
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+
+from config import KEY_STORE, KEY_STORE_MMAP_SIZE, KEY_STORE_PATH, KEY_STORE_PRELOAD
+from core.database import engine
+from core.models.models import UserKey
+
+# (user_email, public key, private key, previous private key or None). Keys
+# are raw X25519 or DER RSA bytes, or the PEM bundle of a legacy row;
+# load_private_key reads them all.
+KeyRow = Tuple[str, bytes, bytes, Optional[bytes]]
+
+
+class KeyStore(ABC):
+    """Where the stored key pairs live. Derived keys never reach it."""
+
+    name = "base"
+
+    @abstractmethod
+    def get_private_key(self, user_email: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def get_private_keys(self, user_email: str) -> List[bytes]:
+        """Current and, when there is one, previous private key, read from
+        the store itself rather than any cache"""
+
+    @abstractmethod
+    def replace_key(self, user_email: str, public_key: bytes, private_key: bytes):
+        """Make this the user's key pair, keeping the current private key as
+        the previous one"""
+
+    @abstractmethod
+    def get_public_keys(self, user_emails: List[str]) -> Dict[str, bytes]:
+        """Public keys of those of `user_emails` that have a key pair"""
+
+    @abstractmethod
+    def add(self, rows: List[KeyRow]):
+        """Insert new key pairs in one transaction"""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def scan(self, batch_size: int = 1000) -> Iterator[List[KeyRow]]:
+        """Every key pair, in batches"""
+
+
+def _legacy_bytes(value: Optional[str]) -> Optional[bytes]:
+    return base64.b64decode(value) if value is not None else None
+
+
+class SqlAlchemyKeyStore(KeyStore):
+    """The user_keys table of SQLALCHEMY_DATABASE_URL (Postgres). Reads go
+    through Core statements on a pooled connection, without an ORM session."""
+
+    name = "sqlalchemy"
+
+    def __init__(self, bind=engine):
+        self.engine = bind
+
+    def get_private_key(self, user_email: str) -> Optional[bytes]:
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(UserKey.private_key_bin, UserKey.private_key).where(UserKey.user_email == user_email)
+            ).first()
+        if row is None:
+            return None
+        private_key_bin, private_key = row
+        return private_key_bin if private_key_bin is not None else _legacy_bytes(private_key)
+
+    def get_private_keys(self, user_email: str) -> List[bytes]:
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(UserKey.private_key_bin, UserKey.private_key, UserKey.previous_private_key_bin)
+                .where(UserKey.user_email == user_email)
+            ).first()
+        if row is None:
+            return []
+        private_key_bin, private_key, previous = row
+        current = private_key_bin if private_key_bin is not None else _legacy_bytes(private_key)
+        return [current] if previous is None else [current, previous]
+
+    def replace_key(self, user_email: str, public_key: bytes, private_key: bytes):
+        with self.engine.begin() as connection:
+            row = connection.execute(
+                select(UserKey.private_key_bin, UserKey.private_key)
+                .where(UserKey.user_email == user_email)
+                .with_for_update()
+            ).first()
+            if row is None:
+                raise LookupError(f"No key pair for {user_email}")
+            connection.execute(
+                update(UserKey).where(UserKey.user_email == user_email).values(
+                    previous_private_key_bin=row[0] if row[0] is not None else _legacy_bytes(row[1]),
+                    private_key_bin=private_key,
+                    public_key_bin=public_key,
+                    private_key=None,
+                    public_key=None,
+                )
+            )
+
+    def get_public_keys(self, user_emails: List[str]) -> Dict[str, bytes]:
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(UserKey.user_email, UserKey.public_key_bin, UserKey.public_key)
+                .where(UserKey.user_email.in_(user_emails))
+            )
+            return {
+                user_email: public_key_bin if public_key_bin is not None else _legacy_bytes(public_key)
+                for user_email, public_key_bin, public_key in rows
+            }
+
+    def add(self, rows: List[KeyRow]):
+        with self.engine.begin() as connection:
+            connection.execute(insert(UserKey), [
+                {
+                    "user_email": user_email,
+                    "public_key_bin": public_key,
+                    "private_key_bin": private_key,
+                    "previous_private_key_bin": previous,
+                }
+                for user_email, public_key, private_key, previous in rows
+            ])
+
+    def count(self) -> int:
+        with self.engine.connect() as connection:
+            return connection.execute(select(func.count()).select_from(UserKey)).scalar_one()
+
+    def scan(self, batch_size: int = 1000) -> Iterator[List[KeyRow]]:
+        last_id = 0
+        while True:
+            with self.engine.connect() as connection:
+                rows = connection.execute(
+                    select(UserKey.id, UserKey.user_email, UserKey.public_key_bin, UserKey.private_key_bin,
+                           UserKey.public_key, UserKey.private_key, UserKey.previous_private_key_bin)
+                    .where(UserKey.id > last_id)
+                    .order_by(UserKey.id)
+                    .limit(batch_size)
+                ).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            yield [
+                (
+                    row.user_email,
+                    row.public_key_bin if row.public_key_bin is not None else _legacy_bytes(row.public_key),
+                    row.private_key_bin if row.private_key_bin is not None else _legacy_bytes(row.private_key),
+                    row.previous_private_key_bin,
+                )
+                for row in rows
+            ]
+
+
+class SqliteKeyStore(KeyStore):
+    """Embedded key store for a single on-prem box: one SQLite file in WAL
+    mode, read through a memory map, so a lookup is a B-tree walk in this
+    process instead of a network round trip.
+
+    Each thread keeps its own connection. WAL lets the uvicorn workers read
+    while one of them writes.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = KEY_STORE_PATH, mmap_size: int = KEY_STORE_MMAP_SIZE):
+        self.path = path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS user_keys ("
+                "user_email TEXT PRIMARY KEY, public_key BLOB NOT NULL, private_key BLOB NOT NULL, "
+                "previous_private_key BLOB"
+                ") WITHOUT ROWID"
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(user_keys)")}
+            if "previous_private_key" not in columns:
+                connection.execute("ALTER TABLE user_keys ADD COLUMN previous_private_key BLOB")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # Durable across crashes of the process, not of the OS
+            connection.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.connection = connection
+        return connection
+
+    def get_private_key(self, user_email: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT private_key FROM user_keys WHERE user_email = ?", (user_email,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_private_keys(self, user_email: str) -> List[bytes]:
+        row = self._connection().execute(
+            "SELECT private_key, previous_private_key FROM user_keys WHERE user_email = ?", (user_email,)
+        ).fetchone()
+        if row is None:
+            return []
+        return [row[0]] if row[1] is None else list(row)
+
+    def replace_key(self, user_email: str, public_key: bytes, private_key: bytes):
+        with self._connection() as connection:
+            cursor = connection.execute(
+                "UPDATE user_keys SET previous_private_key = private_key, private_key = ?, public_key = ? "
+                "WHERE user_email = ?", (private_key, public_key, user_email)
+            )
+        if cursor.rowcount == 0:
+            raise LookupError(f"No key pair for {user_email}")
+
+    def get_public_keys(self, user_emails: List[str]) -> Dict[str, bytes]:
+        connection = self._connection()
+        public_keys = {}
+        # Within SQLite's default limit of bound parameters per statement
+        for i in range(0, len(user_emails), 500):
+            chunk = user_emails[i:i + 500]
+            public_keys.update(connection.execute(
+                f"SELECT user_email, public_key FROM user_keys WHERE user_email IN ({','.join('?' * len(chunk))})",
+                chunk
+            ))
+        return public_keys
+
+    def add(self, rows: List[KeyRow]):
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT INTO user_keys (user_email, public_key, private_key, previous_private_key) "
+                "VALUES (?, ?, ?, ?)", rows
+            )
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM user_keys").fetchone()[0]
+
+    def scan(self, batch_size: int = 1000) -> Iterator[List[KeyRow]]:
+        last_email = ""
+        while True:
+            rows = self._connection().execute(
+                "SELECT user_email, public_key, private_key, previous_private_key FROM user_keys "
+                "WHERE user_email > ? ORDER BY user_email LIMIT ?", (last_email, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            last_email = rows[-1][0]
+            yield rows
+
+
+class PreloadedKeyStore(KeyStore):
+    """Private keys of another store held in a dict, loaded at startup.
+
+    Keys created later, possibly by another worker, are read through from
+    the backing store on their first miss and then kept too.
+    """
+
+    def __init__(self, backend: KeyStore):
+        self.backend = backend
+        self.name = f"{backend.name}+preload"
+        self._private_keys: Dict[str, bytes] = {}
+        for rows in backend.scan():
+            for user_email, _, private_key, _ in rows:
+                self._private_keys[user_email] = private_key
+
+    def get_private_key(self, user_email: str) -> Optional[bytes]:
+        private_key = self._private_keys.get(user_email)
+        if private_key is None:
+            private_key = self.backend.get_private_key(user_email)
+            if private_key is not None:
+                self._private_keys[user_email] = private_key
+        return private_key
+
+    def get_private_keys(self, user_email: str) -> List[bytes]:
+        # Another worker may have replaced the key since it was loaded here
+        private_keys = self.backend.get_private_keys(user_email)
+        if private_keys:
+            self._private_keys[user_email] = private_keys[0]
+        return private_keys
+
+    def replace_key(self, user_email: str, public_key: bytes, private_key: bytes):
+        self.backend.replace_key(user_email, public_key, private_key)
+        self._private_keys[user_email] = private_key
+
+    def get_public_keys(self, user_emails: List[str]) -> Dict[str, bytes]:
+        return self.backend.get_public_keys(user_emails)
+
+    def add(self, rows: List[KeyRow]):
+        self.backend.add(rows)
+        for user_email, _, private_key, _ in rows:
+            self._private_keys[user_email] = private_key
+
+    def count(self) -> int:
+        return self.backend.count()
+
+    def scan(self, batch_size: int = 1000) -> Iterator[List[KeyRow]]:
+        return self.backend.scan(batch_size)
+
+
+BACKENDS = {
+    SqlAlchemyKeyStore.name: SqlAlchemyKeyStore,
+    SqliteKeyStore.name: SqliteKeyStore,
+}
+
+
+def open_key_store(name: str, preload: bool = False) -> KeyStore:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown key store {name!r}, choose from {', '.join(BACKENDS)}")
+    store = BACKENDS[name]()
+    return PreloadedKeyStore(store) if preload else store
+
+
+_key_store: Optional[KeyStore] = None
+_key_store_lock = threading.Lock()
+
+
+def get_key_store() -> KeyStore:
+    """The store picked by KEY_STORE, opened on first use rather than at
+    import: preloading reads user_keys, which main.py creates and migrates
+    only after the routes are imported."""
+    global _key_store
+    if _key_store is None:
+        with _key_store_lock:
+            if _key_store is None:
+                _key_store = open_key_store(KEY_STORE, KEY_STORE_PRELOAD)
+    return _key_store
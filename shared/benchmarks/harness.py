@@ -0,0 +1,101 @@
+"""Timing loop, payloads and command line shared by the crypto benchmarks.
+
+A benchmark module collects cases as (group, name, params, fn, setup)
+tuples and hands them to main(); fn is None for a skipped case, and setup,
+when given, runs untimed before every call.
+"""
+import argparse
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+
+import cryptography
+
+MEDICAL_CONDITION = {
+    "condition_name": "Asthma",
+    "details": "Mild, seasonal; uses a salbutamol inhaler as needed",
+    "severity": "low",
+    "diagnosed_date": "2015-04-01",
+}
+
+PAYLOADS = {
+    "phone_number": "+8801712345678",
+    "identity_number": "19901234567890123",
+    "medical_conditions_1": json.dumps([MEDICAL_CONDITION]),
+    "medical_conditions_40": json.dumps([MEDICAL_CONDITION] * 40),
+}
+
+# RSA-OAEP with a 2048-bit key and SHA-256 fits at most 256 - 2 * 32 - 2 bytes
+RSA_OAEP_MAX_PLAINTEXT = 190
+
+
+def run_benchmark(fn, setup=None, min_time: float = 0.5, min_rounds: int = 5, max_rounds: int = 100000):
+    """Time single calls of `fn` until `min_time` seconds have been measured.
+
+    `setup` runs before every call and is not timed.
+    """
+    fn()  # Warm up
+    timings = []
+    measured = 0.0
+    while len(timings) < max_rounds and (measured < min_time or len(timings) < min_rounds):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        measured += elapsed
+
+    timings.sort()
+    mean = statistics.fmean(timings)
+    return {
+        "rounds": len(timings),
+        "min": timings[0],
+        "max": timings[-1],
+        "mean": mean,
+        "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "median": statistics.median(timings),
+        "p99": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        "ops": 1 / mean,
+    }
+
+
+def main(description: str, collect_benchmarks, argv=None, width: int = 52):
+    """Run the cases of `collect_benchmarks()`, print a table and, with
+    --json, write pytest-benchmark-style results"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--json", help="Write machine-readable results to this path")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Measured seconds per benchmark")
+    parser.add_argument("-k", dest="filter", help="Only run benchmarks whose name contains this")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'benchmark':<{width}}{'rounds':>8}{'median us':>12}{'p99 us':>12}{'ops/s':>12}")
+    for group, name, params, fn, setup in collect_benchmarks():
+        if args.filter and args.filter not in name:
+            continue
+        if fn is None:
+            print(f"{name:<{width}}  skipped: exceeds RSA-OAEP plaintext limit ({RSA_OAEP_MAX_PLAINTEXT} bytes)")
+            results.append({"group": group, "name": name, "params": params, "skipped": "payload exceeds RSA-OAEP limit"})
+            continue
+        stats = run_benchmark(fn, setup, min_time=args.min_time)
+        print(f"{name:<{width}}{stats['rounds']:>8}{stats['median'] * 1e6:>12.1f}"
+              f"{stats['p99'] * 1e6:>12.1f}{stats['ops']:>12.0f}")
+        results.append({"group": group, "name": name, "params": params, "stats": stats})
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "datetime": datetime.now().isoformat(),
+                "machine_info": {
+                    "node": platform.node(),
+                    "processor": platform.processor(),
+                    "machine": platform.machine(),
+                    "python_version": platform.python_version(),
+                    "cryptography_version": cryptography.__version__,
+                },
+                "benchmarks": results,
+            }, f, indent=2)
+        print(f"\nWrote {args.json}")
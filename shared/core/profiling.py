@@ -0,0 +1,140 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from config import PROFILE_DIR, PROFILE_INTERVAL, PROFILE_PERIOD
+
+# Leaf frames of threads that are blocked waiting rather than running
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+
+
+class StackSampler:
+    """Pure-Python sampling profiler for the current worker process.
+
+    A daemon thread snapshots every other thread's stack with
+    sys._current_frames() each `interval` seconds and counts identical
+    stacks, which is what collapsed-stack flamegraphs and speedscope need.
+    The cost is one stack walk per thread per sample, so it can stay on at
+    a low rate in production.
+    """
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False, exclude=()):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.exclude = set(exclude)
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me or ident in self.exclude:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            self.counts[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "StackSampler":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def take(self) -> Counter:
+        """Return the stacks collected so far and start a fresh window"""
+        counts, self.counts = self.counts, Counter()
+        self.samples = 0
+        return counts
+
+
+def to_collapsed(counts: Counter) -> str:
+    """Brendan Gregg's collapsed format, readable by flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def to_speedscope(counts: Counter, interval: float, name: str) -> Dict:
+    """speedscope sampled-profile JSON (https://www.speedscope.app/file-format-schema.json)"""
+    frames, frame_index = [], {}
+    samples, weights = [], []
+    for stack, count in counts.items():
+        indexes = []
+        for frame in stack.split(";"):
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                frames.append({"name": frame})
+            indexes.append(frame_index[frame])
+        samples.append(indexes)
+        weights.append(count * interval)
+    total = sum(weights)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": total,
+            "samples": samples,
+            "weights": weights,
+        }],
+        "exporter": "vaccine.profiling",
+    }
+
+
+def profile_for(seconds: float, interval: float = 0.005, include_idle: bool = False) -> Counter:
+    """Sample this worker for `seconds` (blocking the calling thread only,
+    which is left out of the profile)"""
+    sampler = StackSampler(interval, include_idle, exclude=[threading.get_ident()]).start()
+    time.sleep(seconds)
+    return sampler.stop().counts
+
+
+def start_continuous_profiling() -> threading.Thread:
+    """Sample at PROFILE_INTERVAL forever, writing one collapsed-stack file
+    per PROFILE_PERIOD seconds to PROFILE_DIR"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    sampler = StackSampler(PROFILE_INTERVAL).start()
+
+    def write_periodically():
+        while True:
+            time.sleep(PROFILE_PERIOD)
+            counts = sampler.take()
+            if not counts:
+                continue
+            path = os.path.join(PROFILE_DIR, f"profile-{os.getpid()}-{time.strftime('%Y%m%d_%H%M%S')}.collapsed")
+            with open(path, 'w') as f:
+                f.write(to_collapsed(counts))
+
+    writer = threading.Thread(target=write_periodically, name="profile-writer", daemon=True)
+    writer.start()
+    sampler.exclude.add(writer.ident)
+    return writer
@@ -0,0 +1,68 @@
+"""Keep the modules shared by CloudBackend and PrivateKeyServer in step.
+
+The one copy to edit lives here, under shared/. Each service carries a
+vendored copy at the same relative path, so it can still be deployed from
+its own directory; the vendored copies read the service's own `config`.
+
+Run from the repository root:
+    python shared/sync.py          # copy the shared modules into both services
+    python shared/sync.py --check  # exit non-zero if a vendored copy differs
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED = os.path.join(ROOT, "shared")
+SERVICES = ("CloudBackend", "PrivateKeyServer")
+
+# Paths relative to shared/ and to each service directory
+FILES = (
+    "core/tracing.py",
+    "core/profiling.py",
+    "routes/debug_routes.py",
+    "core/metrics_export.py",
+    "core/migrations.py",
+    "benchmarks/harness.py",
+)
+
+HEADER = "# Vendored from shared/{path}; edit it there and run `python shared/sync.py`.\n"
+
+
+def vendored(path: str) -> str:
+    """Content a service's copy of `path` must have"""
+    with open(os.path.join(SHARED, path), 'r', encoding='utf-8') as f:
+        return HEADER.format(path=path) + f.read()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="Only report copies that differ")
+    args = parser.parse_args(argv)
+
+    stale = []
+    for path in FILES:
+        content = vendored(path)
+        for service in SERVICES:
+            target = os.path.join(ROOT, service, path)
+            current = None
+            if os.path.exists(target):
+                with open(target, 'r', encoding='utf-8') as f:
+                    current = f.read()
+            if current == content:
+                continue
+            stale.append(f"{service}/{path}")
+            if not args.check:
+                with open(target, 'w', encoding='utf-8') as f:
+                    f.write(content)
+
+    if args.check and stale:
+        print("Out of date with shared/, run `python shared/sync.py`:", *stale, sep="\n  ", file=sys.stderr)
+        return 1
+    if not args.check:
+        print(f"Updated {len(stale)} file(s)" if stale else "Everything up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))